@@ -1,6 +1,12 @@
 import requests
 import os
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from artifact_cache import ArtifactCache
+from part_download import fetch_to_part_file, complete_part_file
+
 
 class DownloadStep:
     def __init__(self, name, step_type, step_config):
@@ -10,27 +16,104 @@ class DownloadStep:
         with open(step_config['config'], 'r') as f:
             self.config_json = json.load(f)
         self.download_dir = step_config['output_dir']
+        self.max_workers = step_config.get('max_workers', 4)  # 同時にダウンロードするファイル数
+        self.retries = step_config.get('retries', 3)  # 失敗時の再試行回数
+        self.backoff = step_config.get('backoff', 1.0)  # 再試行までの待ち時間（秒、再試行ごとに倍）
+        self.timeout = step_config.get('timeout', 60)
+        # ダウンロードしたファイルのキャッシュ（cache_dirに空文字・noを指定すると無効）
+        cache_dir = step_config.get('cache_dir', './.download_cache')
+        self.cache = None
+        if cache_dir:
+            # 0を指定すると上限なし
+            max_size_mb = step_config.get('cache_max_size_mb', 1024)
+            self.cache = ArtifactCache(
+                cache_dir,
+                max_size=max_size_mb * 1024 * 1024 if max_size_mb else None,
+                max_age=step_config.get('cache_max_age', 0),
+                offline=step_config.get('offline', False) or os.environ.get('DOWNLOAD_OFFLINE') == '1',
+            )
         # ダウンロードディレクトリが存在しない場合は作成
         os.makedirs(self.download_dir, exist_ok=True)
+        # 全ファイルで接続プールを共有する
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch_to_part_file(self, url, part_path):
+        """
+        .partファイルにダウンロードし、(ステータスコード, レスポンスヘッダー) を返す（part_download.pyを参照）
+        キャッシュ済みの場合は条件付きリクエストを送り、変更が無ければ304が返る
+        """
+        headers = self.cache.conditional_headers(url) if self.cache is not None else {}
+        return fetch_to_part_file(self.session, url, part_path, headers, self.timeout)
+
+    def is_retryable(self, error):
+        """通信エラー・タイムアウト・5xx・429のみ再試行する（404などは再試行しても変わらない）"""
+        response = getattr(error, 'response', None)
+        if response is None:
+            return True
+        return response.status_code >= 500 or response.status_code == 429
 
-    def download_file(self, url, save_path):
+    def restore_from_cache(self, url, save_path, headers=None):
+        if self.cache.copy_to(url, save_path):
+            self.cache.touch(url, headers)
+            print(f"File restored from cache: {save_path}")
+            return True
+        return False
+
+    def download_file(self, url, save_path, sha256=None):
         """指定されたURLからファイルをダウンロードし、指定されたパスに保存する"""
-        try:
-            response = requests.get(url, stream=True)
-            response.raise_for_status()  # ステータスコードが200以外の場合は例外を発生させる
-            with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            print(f"File downloaded successfully: {save_path}")
-        except requests.RequestException as e:
-            print(f"Failed to download {url}: {e}")
+        if self.cache is not None:
+            if self.cache.is_fresh(url, sha256) and self.restore_from_cache(url, save_path):
+                return True
+            if self.cache.offline:
+                print(f"Failed to download {url}: not in cache (offline mode)")
+                return False
 
-    def execute(self):
-        """ダウンロードステップを実行する"""
+        part_path = save_path + '.part'
+        for attempt in range(self.retries + 1):
+            try:
+                status, headers = self.fetch_to_part_file(url, part_path)
+                if status == 304:
+                    if self.restore_from_cache(url, save_path, headers):
+                        return True
+                    # キャッシュが壊れていた場合は削除済みなので、条件なしで取得し直す
+                    continue
+                complete_part_file(part_path)
+                if self.cache is None:
+                    # 完了したファイルだけが保存先のパスに現れるよう、最後にリネームする
+                    os.replace(part_path, save_path)
+                else:
+                    # キャッシュに移してからコピーする（チェックサムが一致しない場合はValueError）
+                    self.cache.store(url, part_path, headers, sha256)
+                    if not self.cache.copy_to(url, save_path):
+                        continue
+                print(f"File downloaded successfully: {save_path}")
+                return True
+            except ValueError as e:
+                print(f"Failed to download {url}: {e}")
+                return False
+            except requests.RequestException as e:
+                if attempt < self.retries and self.is_retryable(e):
+                    wait = self.backoff * (2 ** attempt)
+                    print(f"Retrying {url} in {wait:.1f}s ({attempt + 1}/{self.retries}): {e}")
+                    time.sleep(wait)
+                else:
+                    print(f"Failed to download {url}: {e}")
+                    return False
+        return False
 
-        for file in self.config_json['files']:
-            url = file['url']
-            filename = file['filename']
-            save_path = os.path.join(self.download_dir, filename)
-            self.download_file(url, save_path)
+    def execute(self):
+        """ダウンロードステップを実行する（max_workers件まで並行してダウンロードする）"""
 
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = []
+            for file in self.config_json['files']:
+                url = file['url']
+                filename = file['filename']
+                save_path = os.path.join(self.download_dir, filename)
+                os.makedirs(os.path.dirname(save_path), exist_ok=True)
+                futures.append(executor.submit(self.download_file, url, save_path, file.get('sha256')))
+            for future in as_completed(futures):
+                future.result()
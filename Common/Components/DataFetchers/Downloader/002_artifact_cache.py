@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+
+class ArtifactCache:
+    """
+    ダウンロードしたファイルのローカルキャッシュ
+
+    ファイルの中身はSHA-256をキーにして cache_dir/objects/ に保存し（同じ内容は1つだけ保持）、
+    URLごとの SHA-256・ETag・Last-Modified・最終利用時刻を cache_dir/index.json に記録する。
+      - max_size（バイト）を超えた場合は、最後に使われた時刻が古いものから削除する（LRU）
+      - max_age（秒）以内に確認済みのURLは、サーバーに問い合わせずにキャッシュを使う
+      - offline=True の場合はネットワークに接続せず、キャッシュのみを使う
+    """
+
+    def __init__(self, cache_dir, max_size=None, max_age=0, offline=False):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.index_file = os.path.join(cache_dir, 'index.json')
+        self.max_size = max_size
+        self.max_age = max_age
+        self.offline = offline
+        self.lock = threading.Lock()
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.index = self.load()
+
+    def load(self):
+        if not os.path.exists(self.index_file):
+            return {}
+        try:
+            with open(self.index_file, 'r') as file:
+                return json.load(file)
+        except (json.JSONDecodeError, OSError):
+            print(f"Warning: ignoring broken cache index {self.index_file}")
+            return {}
+
+    def save(self):
+        with self.lock:
+            tmp_file = f"{self.index_file}.tmp"
+            with open(tmp_file, 'w') as file:
+                json.dump(self.index, file, indent=2)
+            os.replace(tmp_file, self.index_file)
+
+    def blob_path(self, sha256):
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def lookup(self, url):
+        """URLに対応するキャッシュの記録を返す（中身のファイルが無い場合はNone）"""
+        entry = self.index.get(url)
+        if entry is None or not os.path.exists(self.blob_path(entry['sha256'])):
+            return None
+        return entry
+
+    def is_fresh(self, url, sha256=None):
+        """
+        サーバーに問い合わせずにキャッシュを使ってよいかを判定する
+        期待するSHA-256が指定されていれば一致するかどうか、無ければ max_age 以内に確認済みかどうかで判定する
+        """
+        entry = self.lookup(url)
+        if entry is None:
+            return False
+        if sha256:
+            return entry['sha256'] == sha256.lower()
+        return self.offline or time.time() - entry.get('checked', 0) < self.max_age
+
+    def conditional_headers(self, url):
+        """キャッシュ済みのURLの再検証用ヘッダー（If-None-Match / If-Modified-Since）"""
+        entry = self.lookup(url)
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def touch(self, url, headers=None):
+        """キャッシュを利用した（または304で変更なしと確認した）ことを記録する"""
+        with self.lock:
+            entry = self.index.get(url)
+            if entry is None:
+                return
+            now = time.time()
+            entry['last_used'] = now
+            if headers is not None:
+                entry['checked'] = now
+                entry['etag'] = headers.get('ETag', entry.get('etag'))
+                entry['last_modified'] = headers.get('Last-Modified', entry.get('last_modified'))
+        self.save()
+
+    def store(self, url, path, headers=None, sha256=None):
+        """
+        ダウンロードしたファイルをキャッシュに移し、SHA-256を返す
+        期待するSHA-256と一致しない場合はファイルを削除してValueErrorを発生させる
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(65536), b''):
+                digest.update(chunk)
+        actual = digest.hexdigest()
+        if sha256 and actual != sha256.lower():
+            os.remove(path)
+            raise ValueError(f"Checksum mismatch for {url}: expected {sha256}, got {actual}")
+
+        blob = self.blob_path(actual)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if os.path.exists(blob):
+            os.remove(path)
+        else:
+            os.replace(path, blob)
+
+        headers = headers or {}
+        now = time.time()
+        with self.lock:
+            previous = self.index.get(url)
+            self.index[url] = {
+                'sha256': actual,
+                'size': os.path.getsize(blob),
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'checked': now,
+                'last_used': now,
+            }
+            # 内容が変わった場合は、どこからも参照されなくなった前回の中身を削除する
+            if previous is not None and previous['sha256'] != actual:
+                self.remove_blob(previous['sha256'])
+            self.evict(keep=url)
+        self.save()
+        return actual
+
+    def copy_to(self, url, save_path):
+        """
+        キャッシュの中身を save_path にコピーする
+        コピーしながらSHA-256を検証し、壊れていた場合はキャッシュから削除してFalseを返す
+        コピー中に他のスレッドの保存で追い出された場合もFalseを返す（呼び出し元はネットワークから取得し直す）
+        """
+        entry = self.lookup(url)
+        if entry is None:
+            return False
+        blob = self.blob_path(entry['sha256'])
+        tmp_path = save_path + '.tmp'
+        digest = hashlib.sha256()
+        try:
+            with open(blob, 'rb') as src, open(tmp_path, 'wb') as dst:
+                for chunk in iter(lambda: src.read(65536), b''):
+                    digest.update(chunk)
+                    dst.write(chunk)
+        except OSError as e:
+            print(f"Warning: failed to read cached file for {url}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        if digest.hexdigest() != entry['sha256']:
+            print(f"Warning: cached file for {url} is corrupted, discarding it")
+            os.remove(tmp_path)
+            with self.lock:
+                self.index.pop(url, None)
+                self.remove_blob(entry['sha256'])
+            self.save()
+            return False
+        os.replace(tmp_path, save_path)
+        return True
+
+    def remove_blob(self, sha256):
+        """どのURLからも参照されなくなった中身のファイルを削除する（lockを取得した状態で呼ぶ）"""
+        if any(entry['sha256'] == sha256 for entry in self.index.values()):
+            return
+        blob = self.blob_path(sha256)
+        if os.path.exists(blob):
+            os.remove(blob)
+
+    def total_size(self):
+        sizes = {entry['sha256']: entry.get('size', 0) for entry in self.index.values()}
+        return sum(sizes.values())
+
+    def evict(self, keep=None):
+        """max_size を超えている間、最終利用時刻が古いURLから削除する（lockを取得した状態で呼ぶ）"""
+        if not self.max_size:
+            return
+        # 同じ中身を参照しているURLの数と中身の大きさを1回だけ数え、削除のたびに差し引く
+        references = {}
+        sizes = {}
+        for entry in self.index.values():
+            references[entry['sha256']] = references.get(entry['sha256'], 0) + 1
+            sizes[entry['sha256']] = entry.get('size', 0)
+        total = sum(sizes.values())
+        for url, entry in sorted(self.index.items(), key=lambda item: item[1].get('last_used', 0)):
+            if total <= self.max_size:
+                break
+            if url == keep:
+                continue
+            del self.index[url]
+            sha256 = entry['sha256']
+            references[sha256] -= 1
+            if references[sha256] == 0:
+                total -= sizes[sha256]
+                blob = self.blob_path(sha256)
+                if os.path.exists(blob):
+                    os.remove(blob)
+            print(f"Evicted from download cache: {url}")
@@ -0,0 +1,89 @@
+import os
+
+
+# 途中までダウンロードした.partファイルの続きを、Range / If-Rangeリクエストで取得する
+# （DownloadStepとforServiceのfile_downloader.pyで共有する）
+
+
+def part_validator(headers):
+    """If-Rangeに使える検証子（強いETag、無ければLast-Modified）。弱いETagはIf-Rangeに使えない"""
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('Last-Modified')
+
+
+def parse_content_range(value):
+    """Content-Range（bytes 開始-終了/全体 または bytes */全体）から (開始位置, 全体の長さ) を返す（不明な値はNone）"""
+    if not value or not value.startswith('bytes '):
+        return None, None
+    spec, _, total = value[len('bytes '):].partition('/')
+    start = spec.partition('-')[0]
+    return (int(start) if start.isdigit() else None), (int(total) if total.isdigit() else None)
+
+
+def validator_path(part_path):
+    return part_path + '.validator'
+
+
+def remove_part_file(part_path):
+    """.partファイルと、記録した検証子を削除する"""
+    for path in (part_path, validator_path(part_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def complete_part_file(part_path):
+    """取得が完了した.partファイルの検証子を削除する（.partはリネーム・キャッシュへの移動のために残す）"""
+    if os.path.exists(validator_path(part_path)):
+        os.remove(validator_path(part_path))
+
+
+def fetch_to_part_file(session, url, part_path, headers=None, timeout=60):
+    """
+    .partファイルにダウンロードし、(ステータスコード, レスポンスヘッダー) を返す
+
+    途中までダウンロード済みの.partファイルがあれば、Rangeリクエストで続きから取得する。
+    .partを取得したときの検証子をIf-Rangeで送るため、ファイルが更新されていれば200で全体が返り、最初から書き直す。
+    416は.partの長さが `Content-Range: */全体の長さ` と一致する場合だけ取得済みとみなす。
+    headers : 最初から取得する場合に送るヘッダー（キャッシュの条件付きリクエストなど。変更が無ければ304が返る）
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    validator = None
+    if offset and os.path.exists(validator_path(part_path)):
+        with open(validator_path(part_path), 'r', encoding='utf-8') as f:
+            validator = f.read().strip() or None
+    if offset and validator is None:
+        # どの版の途中か分からない.partは続きを取得できないため、最初から取得し直す
+        remove_part_file(part_path)
+        offset = 0
+    request_headers = {'Range': f'bytes={offset}-', 'If-Range': validator} if offset else dict(headers or {})
+    with session.get(url, headers=request_headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            return response.status_code, response.headers
+        if offset and response.status_code == 416:
+            # 416は開始位置が現在の長さ以上という意味のため、長さが.partと一致する場合だけ取得済みとみなす
+            if parse_content_range(response.headers.get('Content-Range'))[1] == offset:
+                return response.status_code, response.headers
+            remove_part_file(part_path)
+            return fetch_to_part_file(session, url, part_path, headers, timeout)
+        response.raise_for_status()  # ステータスコードが200以外の場合は例外を発生させる
+        if response.status_code == 206:
+            if parse_content_range(response.headers.get('Content-Range'))[0] != offset:
+                # 要求と違う位置からの応答は連結できないため、最初から取得し直す
+                remove_part_file(part_path)
+                return fetch_to_part_file(session, url, part_path, headers, timeout)
+            mode = 'ab'
+        else:
+            # Rangeに対応していない・ファイルが更新された（200）場合は最初から取得し直す
+            mode = 'wb'
+            validator = part_validator(response.headers)
+            if validator:
+                with open(validator_path(part_path), 'w', encoding='utf-8') as f:
+                    f.write(validator)
+            elif os.path.exists(validator_path(part_path)):
+                os.remove(validator_path(part_path))
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size=65536):
+                f.write(chunk)
+        return response.status_code, response.headers
@@ -1,4 +1,5 @@
 import requests
+import asyncio
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse, unquote
 import os
@@ -6,9 +7,12 @@ import hashlib
 import time
 import random
 import mimetypes
-import chardet
-import urllib.robotparser
-import json  # Ensure json is imported
+import json
+from robots_cache import RobotsCache
+from url_frontier import UrlFrontier
+from progress_journal import ProgressJournal
+from encoding_detector import detect_encoding
+from collections import Counter
 
 class WebScraperStep:
     def __init__(self, step_config):
@@ -17,33 +21,62 @@ class WebScraperStep:
         self.output_dir = step_config['output_dir']
         self.progress_file = step_config['progress_file']
         self.save_every = step_config['save_every']
-        self.visited = self.load_progress()
-        self.counter = 0
+        # sync: 1ページずつ取得（従来どおり） / async: asyncioで複数ページを並行取得
+        self.crawl_mode = step_config.get('crawl_mode', 'sync')
+        self.concurrency = step_config.get('concurrency', 8)  # 全体の同時接続数
+        self.per_host_concurrency = step_config.get('per_host_concurrency', 2)  # ホストごとの同時接続数
+        self.request_delay = step_config.get('request_delay', 1.0)  # 同一ホストへのリクエスト開始間隔（秒）
+        self.request_timeout = step_config.get('request_timeout', 30)
+        # yes: 前回のクロールが完了していれば、ETag / Last-Modifiedを使った条件付きGETで取得し直す
+        self.recrawl = step_config.get('recrawl', False) == True
+        self.changed_manifest = step_config.get('changed_manifest', os.path.splitext(self.progress_file)[0] + '.changed.json')
+        # robots.txtはホストごとにキャッシュし、進行状況ファイルと並べて保存する
+        robots_file = os.path.splitext(self.progress_file)[0] + '.robots.json'
+        self.robots = RobotsCache(self.user_agent, robots_file, ttl=step_config.get('robots_ttl', 86400))
+        # ページごとの進行状況はジャーナルに1行ずつ追記し、save_everyページごとにprogress.jsonへまとめる
+        self.journal = ProgressJournal(self.progress_file, compact_every=self.save_every)
         progress_data = self.load_progress()
         self.visited = progress_data.get('visited', {})
-        self.to_visit = progress_data.get('to_visit', [self.start_url])
+        self.validators = progress_data.get('validators', {})  # URL -> ETag / Last-Modified / 内容のハッシュ
+        self.changed = progress_data.get('changed', [])  # 今回のクロールで新規・内容が変わったURL
+        self.changed_set = set(self.changed)
+        self.new_pass = self.recrawl and self.visited and not progress_data.get('to_visit')
+        if self.new_pass:
+            # 前回のクロールが完了しているため、開始URLから取得し直す
+            self.visited = {}
+            self.changed = []
+            self.changed_set = set()
+            progress_data['to_visit'] = [self.start_url]
+            progress_data['to_visit_depth'] = []
+        # 未訪問URLのキュー（正規化したURLで重複を除く）
+        self.to_visit = UrlFrontier(prioritize_depth=step_config.get('prioritize_depth', False))
+        for url in self.visited:
+            self.to_visit.mark_seen(url)
+        self.to_visit.load_progress(progress_data.get('to_visit', [self.start_url]), progress_data.get('to_visit_depth'))
+        self.in_progress = {}  # asyncモードで取得中のURL -> 深さ
+        self.encoding_tiers = Counter()  # 文字コードを判定した段階ごとのページ数
 
+    # ジャーナルの内容をまとめてprogress.jsonに書き出す
     def save_progress(self):
+        to_visit, to_visit_depth = self.to_visit.to_progress()
         progress_data = {
             'visited': self.visited,
-            'to_visit': self.to_visit
+            # 取得中のURLは中断時に失われないよう未訪問として保存する
+            'to_visit': list(self.in_progress) + to_visit,
+            'to_visit_depth': list(self.in_progress.values()) + to_visit_depth,
+            'validators': self.validators,
+            'changed': self.changed
         }
-        with open(self.progress_file, 'w') as file:
-            json.dump(progress_data, file, indent=2)
+        self.journal.compact(progress_data)
+        self.robots.save()
 
     # 対象がスクレイピングOKか確認
     def is_allowed_url(self, url):
-        parser = urllib.robotparser.RobotFileParser()
-        parser.set_url(urllib.parse.urljoin(url, '/robots.txt'))
-        parser.read()
-        return parser.can_fetch(self.user_agent, url)
-   
+        return self.robots.can_fetch(url)
+
     # 進行状況を取得
     def load_progress(self):
-        if os.path.exists(self.progress_file):
-            with open(self.progress_file, 'r') as file:
-                return json.load(file)
-        return {}
+        return self.journal.load()
 
     # URLからファイルの拡張子を推定する関数
     def get_extension_from_url(self, url):
@@ -51,71 +84,268 @@ class WebScraperStep:
         _, ext = os.path.splitext(parsed_url.path)
         return ext if ext else '.html'  # デフォルトは .html
 
-    # 
-    def save_page_content(self, url, content, response):
+    # URLに対応する保存先のパス
+    def page_filename(self, url):
         # ファイル拡張子取得
-        content_type = response.headers.get('Content-Type', '')
         extension = self.get_extension_from_url(url)
         # 保存先パスを作成
         url_hash = hashlib.md5(url.encode('utf-8')).hexdigest()
         download_dir = os.getenv('OUTPUT_DIR', './output')
-        filename = f"{download_dir}/{url_hash}{extension}"
-        # 保存
+        return f"{download_dir}/{url_hash}{extension}"
+
+    # ページをファイルに保存する（共有する状態は変更しないため、asyncモードではスレッドで実行する）
+    def write_page_content(self, url, content, body, content_type):
+        filename = self.page_filename(url)
         mode = 'wb' if content_type.startswith('image/') else 'w'
         with open(filename, mode, encoding='utf-8' if mode == 'w' else None) as file:
-            file.write(content if mode == 'w' else response.content)
-        # 完了履歴の追加
-        print(f"Saved {url} as {filename}")
+            file.write(content if mode == 'w' else body)
+        return filename
+
+    def mark_visited(self, url, filename):
         self.visited[url] = filename
-        
-        # counterをインクリメントして、指定された数ごとに進行状況を保存
-        self.counter += 1
-        if self.counter >= self.save_every:
+        self.journal.record_visited(url, filename)
+
+        # ジャーナルが一定件数たまったらprogress.jsonにまとめる
+        if self.journal.needs_compaction():
             self.save_progress()
-            self.counter = 0  # カウンターをリセット
-   
+
     def print_progress(self, completed, total):
         if total > 0:
             progress_percentage = (completed / total) * 100
             print(f"Progress: {completed}/{total} ({progress_percentage:.2f}%) completed.", end='\r')
- 
+
+    # 前回取得時の検証子があれば条件付きGETのヘッダーを返す
+    def conditional_headers(self, url):
+        validator = self.validators.get(url)
+        if not validator or not os.path.exists(self.page_filename(url)):
+            return {}
+        headers = {}
+        if validator.get('etag'):
+            headers['If-None-Match'] = validator['etag']
+        if validator.get('last_modified'):
+            headers['If-Modified-Since'] = validator['last_modified']
+        return headers
+
+    # 304 Not Modifiedの場合は保存済みのファイルをそのまま使う
+    def mark_not_modified(self, url):
+        filename = self.page_filename(url)
+        print(f"Not modified {url} ({filename})")
+        self.mark_visited(url, filename)
+
+    # 保存済みのファイルからリンク抽出に使うテキストを読み込む（asyncモードではスレッドで実行する）
+    def read_page_content(self, url):
+        if self.validators[url].get('content_type', '').startswith('image/'):
+            return ''
+        with open(self.page_filename(url), 'r', encoding='utf-8', errors='replace') as file:
+            return file.read()
+
+    def reuse_page_content(self, url):
+        self.mark_not_modified(url)
+        return self.read_page_content(url)
+
+    # 文字コードを判定してテキストにし、ファイルに保存して (テキスト, 判定方法, 内容のハッシュ) を返す
+    # 判定・デコード・書き込みはページの大きさに比例する処理のため、asyncモードではスレッドで実行する
+    def decode_response(self, url, headers, body):
+        # HTTPヘッダー -> <meta charset> -> 高速な判定ライブラリ -> chardet の順に判定する
+        detected_encoding, tier = detect_encoding(body, headers.get('Content-Type', ''))
+        text = body.decode(detected_encoding or 'utf-8', errors='replace')
+        self.write_page_content(url, text, body, headers.get('Content-Type', ''))
+        return text, tier, hashlib.sha1(body).hexdigest()
+
+    # 保存したレスポンスの検証子・変更の有無・完了履歴を記録する
+    def record_response(self, url, headers, tier, content_hash):
+        self.encoding_tiers[tier] += 1
+        content_type = headers.get('Content-Type', '')
+        previous = self.validators.get(url)
+        if (previous is None or previous.get('content_hash') != content_hash) and url not in self.changed_set:
+            self.changed.append(url)
+            self.changed_set.add(url)
+            self.journal.record_changed(url)
+        self.validators[url] = {
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'content_hash': content_hash,
+            'content_type': content_type
+        }
+        self.journal.record_validators(url, self.validators[url])
+        # 完了履歴の追加
+        filename = self.page_filename(url)
+        print(f"Saved {url} as {filename}")
+        self.mark_visited(url, filename)
+
+    # レスポンスを保存し、リンク抽出に使うテキストを返す（保存対象外のレスポンスはNone）
+    def handle_response(self, url, status, headers, body):
+        if status == 304 and url in self.validators:
+            return self.reuse_page_content(url)
+        if status != 200:
+            return None
+        text, tier, content_hash = self.decode_response(url, headers, body)
+        self.record_response(url, headers, tier, content_hash)
+        return text
+
+    # handle_responseのasyncモード版。ファイルの読み書きと文字コードの判定はスレッドで実行し、
+    # 進行状況などの共有する状態の更新はイベントループ上で行う
+    async def handle_response_async(self, url, status, headers, body):
+        loop = asyncio.get_running_loop()
+        if status == 304 and url in self.validators:
+            self.mark_not_modified(url)
+            return await loop.run_in_executor(None, self.read_page_content, url)
+        if status != 200:
+            return None
+        text, tier, content_hash = await loop.run_in_executor(None, self.decode_response, url, headers, body)
+        self.record_response(url, headers, tier, content_hash)
+        return text
+
+    # 今回のクロールで新規・変更のあったURLと、見つからなくなったURLを書き出す
+    def save_changed_manifest(self):
+        manifest = {
+            'changed': self.changed,
+            'removed': [url for url in self.validators if url not in self.visited]
+        }
+        with open(self.changed_manifest, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, ensure_ascii=False, indent=2)
+
+    # ページ内のリンクのうち、同一ホストのものを返す（既出のURLはUrlFrontier側で除外する）
+    def extract_links(self, current_url, text):
+        soup = BeautifulSoup(text, 'html.parser')
+        start_netloc = urlparse(self.start_url).netloc
+        links = []
+        for link in soup.find_all('a', href=True):
+            absolute_link = urljoin(current_url, link['href'])
+            if urlparse(absolute_link).netloc == start_netloc:
+                links.append(absolute_link)
+        return links
+
+    def enqueue_links(self, links, depth):
+        for link in links:
+            queued_url = self.to_visit.push(link, depth)
+            if queued_url:
+                self.journal.record_queued(queued_url, depth)
+
     def scrape_site(self):
         total_urls = len(self.to_visit) + len(self.visited)  # 最初の総URL数
         completed_urls = len(self.visited)  # 最初の完了URL数
-    
+
         download_dir = os.getenv('OUTPUT_DIR', './output')
         # Ensure the download directory exists
         os.makedirs(download_dir, exist_ok=True)
 
-   
+        # 同一ホストへの接続を使い回す
+        session = requests.Session()
+        session.headers.update({'User-Agent': self.user_agent})
+
         while self.to_visit:
-            current_url = self.to_visit.pop(0)
+            current_url, depth = self.to_visit.pop()
             if not current_url or current_url in self.visited or not self.is_allowed_url(current_url):
                 continue
-    
+
             try:
-                time.sleep(random.uniform(0.5, 1.5))  # Random delay to reduce server load
-                response = requests.get(current_url, headers={'User-Agent': self.user_agent})
-                detected_encoding = chardet.detect(response.content)['encoding']
-                response.encoding = detected_encoding
-
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    self.save_page_content(current_url, response.text, response)
+                # Random delay to reduce server load（robots.txtのCrawl-delayがあればそれ以上あける）
+                time.sleep(max(random.uniform(0.5, 1.5), self.robots.crawl_delay(current_url) or 0))
+                response = session.get(current_url, headers=self.conditional_headers(current_url), timeout=self.request_timeout)
+                text = self.handle_response(current_url, response.status_code, response.headers, response.content)
+
+                if text is not None:
                     completed_urls += 1  # 完了カウントをインクリメント
                     self.print_progress(completed_urls, total_urls)  # 進捗表示の更新
-    
-                    for link in soup.find_all('a', href=True):
-                        absolute_link = urljoin(current_url, link['href'])
-                        if absolute_link not in self.visited and urlparse(absolute_link).netloc == urlparse(self.start_url).netloc:
-                            self.to_visit.append(absolute_link)
-    
+                    self.enqueue_links(self.extract_links(current_url, text), depth + 1)
+
             except Exception as e:
                 print(f"Error scraping {current_url}: {e}")
                 continue
 
-        print("\nScraping completed.")  # 最後に改行を入れて終了メッセージを表示 
-    def execute(self):
-        self.scrape_site()
+        self.save_progress()
+        self.save_changed_manifest()
+        print(f"\nEncoding detected by: {dict(self.encoding_tiers)}")
+        print("Scraping completed.")
+
+    # 同一ホストへのリクエスト開始間隔をrequest_delay秒（Crawl-delayの方が長ければその秒数）以上あける
+    async def wait_for_host(self, current_url):
+        loop = asyncio.get_running_loop()
+        host = urlparse(current_url).netloc
+        delay = max(self.request_delay, self.robots.crawl_delay(current_url) or 0)
+        async with self.host_locks.setdefault(host, asyncio.Lock()):
+            wait = self.host_next_time.get(host, 0) - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.host_next_time[host] = loop.time() + delay
+
+    async def fetch_page(self, session, current_url, depth):
+        loop = asyncio.get_running_loop()
+        # robots.txtの確認は未取得のホストでは通信が発生するためスレッドで実行する
+        if not await loop.run_in_executor(None, self.is_allowed_url, current_url):
+            return
+
+        await self.wait_for_host(current_url)
+        async with session.get(current_url, headers=self.conditional_headers(current_url)) as response:
+            body = await response.read()
+            status, headers = response.status, response.headers
+        text = await self.handle_response_async(current_url, status, headers, body)
+        if text is None:
+            return
 
+        self.completed_urls += 1
+        self.print_progress(self.completed_urls, self.total_urls)
+        # HTMLの解析はCPU処理のため、イベントループを止めないようスレッドで実行する
+        links = await loop.run_in_executor(None, self.extract_links, current_url, text)
+        self.enqueue_links(links, depth + 1)
+
+    async def crawl_worker(self, session, wakeup):
+        while True:
+            if not self.to_visit:
+                # 取得中のページがなければクロール完了
+                if not self.in_progress:
+                    wakeup.set()
+                    return
+                wakeup.clear()
+                await wakeup.wait()
+                continue
+
+            current_url, depth = self.to_visit.pop()
+            if not current_url or current_url in self.visited:
+                continue
+
+            self.in_progress[current_url] = depth
+            try:
+                await self.fetch_page(session, current_url, depth)
+            except Exception as e:
+                print(f"Error scraping {current_url}: {e}")
+            finally:
+                self.in_progress.pop(current_url, None)
+                wakeup.set()
+
+    async def scrape_site_async(self):
+        # aiohttpはasyncモードでのみ使うため、syncモードではインストールされていなくてもよい
+        import aiohttp
+
+        self.total_urls = len(self.to_visit) + len(self.visited)  # 最初の総URL数
+        self.completed_urls = len(self.visited)  # 最初の完了URL数
+        self.host_locks = {}
+        self.host_next_time = {}
+
+        download_dir = os.getenv('OUTPUT_DIR', './output')
+        os.makedirs(download_dir, exist_ok=True)
+
+        # 接続プールを全ワーカーで共有し、全体とホストごとの同時接続数を制限する
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host_concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+        headers = {'User-Agent': self.user_agent}
+        wakeup = asyncio.Event()
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as session:
+            workers = [asyncio.create_task(self.crawl_worker(session, wakeup)) for _ in range(self.concurrency)]
+            await asyncio.gather(*workers)
+
+        self.save_progress()
+        self.save_changed_manifest()
+        print(f"\nEncoding detected by: {dict(self.encoding_tiers)}")
+        print("Scraping completed.")
+
+    def execute(self):
+        if self.new_pass:
+            print("Re-crawling from the start URL with conditional requests")
+            self.save_progress()
+        if self.crawl_mode == 'async':
+            asyncio.run(self.scrape_site_async())
+        else:
+            self.scrape_site()
 
@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import threading
+import requests
+import urllib.robotparser
+from urllib.parse import urljoin, urlparse
+
+
+class RobotsCache:
+    """
+    ホストごとにrobots.txtをキャッシュする
+
+    - 取得したrobots.txtはttl秒間再利用し、期限切れ後に取得し直す
+    - 取得に失敗した場合（5xx・通信エラー）は取得できるまでクロールを控え、error_ttl秒後に再取得する
+    - cache_fileを指定した場合はrobots.txtの本文を保存し、再開時に取得し直さない
+    """
+
+    def __init__(self, user_agent, cache_file=None, ttl=86400, error_ttl=300, timeout=10):
+        self.user_agent = user_agent
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.timeout = timeout
+        self.entries = self.load()  # host -> {'status', 'text', 'fetched_at'}
+        self.parsers = {}  # host -> RobotFileParser
+        self.lock = threading.Lock()
+        self.host_locks = {}
+
+    def load(self):
+        if self.cache_file and os.path.exists(self.cache_file):
+            with open(self.cache_file, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        return {}
+
+    def save(self):
+        if not self.cache_file:
+            return
+        with self.lock:
+            entries = dict(self.entries)
+        with open(self.cache_file, 'w', encoding='utf-8') as file:
+            json.dump(entries, file, ensure_ascii=False, indent=2)
+
+    def is_expired(self, entry):
+        ttl = self.ttl if entry['status'] < 500 else self.error_ttl
+        return time.time() - entry['fetched_at'] > ttl
+
+    def fetch(self, url):
+        robots_url = urljoin(url, '/robots.txt')
+        try:
+            response = requests.get(robots_url, headers={'User-Agent': self.user_agent}, timeout=self.timeout)
+            status = response.status_code
+            text = response.content.decode('utf-8', errors='replace') if status == 200 else ''
+        except requests.RequestException as e:
+            print(f"Failed to fetch {robots_url}: {e}")
+            status, text = 599, ''
+        return {'status': status, 'text': text, 'fetched_at': time.time()}
+
+    # urllib.robotparser.RobotFileParser.read() と同じ基準でステータスを解釈する
+    def build_parser(self, entry):
+        parser = urllib.robotparser.RobotFileParser()
+        status = entry['status']
+        if status in (401, 403):
+            parser.disallow_all = True
+        elif 400 <= status < 500:
+            parser.allow_all = True
+        elif status < 400:
+            parser.parse(entry['text'].splitlines())
+        # 5xx・通信エラーの場合は何も設定しない（can_fetchは常にFalseになる）
+        return parser
+
+    def get_parser(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            host_lock = self.host_locks.setdefault(host, threading.Lock())
+        # 同じホストのrobots.txtを複数スレッドから同時に取得しないようにする
+        with host_lock:
+            with self.lock:
+                entry = self.entries.get(host)
+                parser = self.parsers.get(host)
+            if entry is None or self.is_expired(entry):
+                entry = self.fetch(url)
+                parser = None
+            if parser is None:
+                parser = self.build_parser(entry)
+                with self.lock:
+                    self.entries[host] = entry
+                    self.parsers[host] = parser
+        return parser
+
+    def can_fetch(self, url):
+        return self.get_parser(url).can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url):
+        """robots.txtのCrawl-delay（秒）。指定がなければNone"""
+        delay = self.get_parser(url).crawl_delay(self.user_agent)
+        return float(delay) if delay is not None else None
@@ -0,0 +1,88 @@
+import heapq
+from collections import deque
+from urllib.parse import urldefrag, urlsplit, urlunsplit, parse_qsl, urlencode
+
+
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+
+def normalize_url(url):
+    """
+    重複判定用にURLを正規化する
+    - フラグメント（#以降）を除去
+    - スキーム・ホスト名を小文字にし、既定のポート番号を除去
+    - 末尾のスラッシュを除去（ルートは"/"）
+    - クエリパラメータをキー順に並べ替え
+    """
+    url, _ = urldefrag(url)
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    host, _, port = netloc.rpartition(':')
+    if host and DEFAULT_PORTS.get(scheme) == port:
+        netloc = host
+    path = parts.path.rstrip('/') or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+class UrlFrontier:
+    """
+    クロール対象URLのキュー
+
+    一度キューに入れたURL（正規化後）はseenに記録し、同じURLを二度入れない。
+    これによりキューの長さはリンク数ではなく、ユニークなURL数に比例する。
+    prioritize_depth=Trueの場合は、開始URLからの深さが浅いURLを優先して取り出す。
+    """
+
+    def __init__(self, prioritize_depth=False):
+        self.prioritize_depth = prioritize_depth
+        self.queue = [] if prioritize_depth else deque()
+        self.seen = set()
+        self.counter = 0  # 同じ深さのURLを追加順に取り出すための連番
+
+    def __len__(self):
+        return len(self.queue)
+
+    def __bool__(self):
+        return bool(self.queue)
+
+    def mark_seen(self, url):
+        self.seen.add(normalize_url(url))
+
+    def push(self, url, depth=0):
+        """未登録のURLであればキューに追加し、追加したURLを返す（登録済みの場合はNone）"""
+        if not url:
+            return None
+        key = normalize_url(url)
+        if key in self.seen:
+            return None
+        self.seen.add(key)
+        # 取得時はフラグメントのみ除去した元のURLを使う
+        url, _ = urldefrag(url)
+        if self.prioritize_depth:
+            heapq.heappush(self.queue, (depth, self.counter, url))
+            self.counter += 1
+        else:
+            self.queue.append((url, depth))
+        return url
+
+    def pop(self):
+        """(url, depth) を取り出す"""
+        if self.prioritize_depth:
+            depth, _, url = heapq.heappop(self.queue)
+            return url, depth
+        return self.queue.popleft()
+
+    def to_progress(self):
+        """progress.jsonに保存する形式（URLのリストと深さのリスト）に変換する"""
+        if self.prioritize_depth:
+            items = [(url, depth) for depth, _, url in sorted(self.queue)]
+        else:
+            items = list(self.queue)
+        return [url for url, _ in items], [depth for _, depth in items]
+
+    def load_progress(self, urls, depths=None):
+        depths = depths or []
+        for index, url in enumerate(urls):
+            self.push(url, depths[index] if index < len(depths) else 0)
@@ -0,0 +1,129 @@
+import os
+import json
+
+
+def journal_path(progress_file):
+    return os.path.splitext(progress_file)[0] + '.journal.jsonl'
+
+
+def load_progress(progress_file):
+    """
+    進行状況（progress.json + 追記ジャーナル）を読み込む
+    戻り値は従来のprogress.jsonと同じ {'visited': {...}, 'to_visit': [...], 'to_visit_depth': [...]} 形式
+    （再クロール用の 'validators': {url: {...}}, 'changed': [...] も含む）
+    """
+    path = journal_path(progress_file)
+    if not os.path.exists(progress_file) and not os.path.exists(path):
+        raise FileNotFoundError(f"{progress_file} does not exist.")
+
+    progress_data = {}
+    if os.path.exists(progress_file):
+        with open(progress_file, 'r') as file:
+            progress_data = json.load(file)
+    if not os.path.exists(path):
+        return progress_data
+
+    visited = progress_data.get('visited', {})
+    validators = progress_data.get('validators', {})
+    changed = list(progress_data.get('changed', []))
+    changed_set = set(changed)
+    depths = progress_data.get('to_visit_depth', [])
+    queued = {}  # url -> depth（挿入順を保持）
+    for index, url in enumerate(progress_data.get('to_visit', [])):
+        queued.setdefault(url, depths[index] if index < len(depths) else 0)
+
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 書き込み途中で中断された最終行は無視する
+                continue
+            if 'visited' in record:
+                url, filename = record['visited']
+                visited[url] = filename
+                queued.pop(url, None)
+            elif 'queued' in record:
+                url, depth = record['queued']
+                if url not in visited:
+                    queued.setdefault(url, depth)
+            elif 'validators' in record:
+                url, validator = record['validators']
+                validators[url] = validator
+            elif 'changed' in record:
+                url = record['changed']
+                if url not in changed_set:
+                    changed_set.add(url)
+                    changed.append(url)
+
+    progress_data['visited'] = visited
+    progress_data['to_visit'] = list(queued)
+    progress_data['to_visit_depth'] = list(queued.values())
+    progress_data['validators'] = validators
+    progress_data['changed'] = changed
+    return progress_data
+
+
+class ProgressJournal:
+    """
+    クロールの進行状況を追記型のジャーナル（JSONL）に記録する
+
+    ページごとの記録は1行の追記のみで済み（中断しても失わないよう、追記ごとにflushする）、
+    progress.json全体の書き換えはcompact()の呼び出し時（compact_everyページごと・クロール終了時）にだけ行う。
+    読み込み側はload_progress()でprogress.jsonとジャーナルをまとめて読む。
+    """
+
+    def __init__(self, progress_file, compact_every=10000):
+        self.progress_file = progress_file
+        self.path = journal_path(progress_file)
+        self.compact_every = compact_every
+        self.pages = 0  # 前回のcompact以降に記録した取得済みページの数
+        self.file = None
+
+    def load(self):
+        try:
+            return load_progress(self.progress_file)
+        except FileNotFoundError:
+            return {}
+
+    def open(self):
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8')
+        return self.file
+
+    def append(self, record):
+        file = self.open()
+        file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        file.flush()
+
+    def record_visited(self, url, filename):
+        self.append({'visited': [url, filename]})
+        self.pages += 1
+
+    def record_queued(self, url, depth):
+        self.append({'queued': [url, depth]})
+
+    def record_validators(self, url, validator):
+        self.append({'validators': [url, validator]})
+
+    def record_changed(self, url):
+        self.append({'changed': url})
+
+    def needs_compaction(self):
+        return self.pages >= self.compact_every
+
+    def compact(self, progress_data):
+        """全体をprogress.jsonに書き出し、ジャーナルを空にする"""
+        self.close()
+        tmp_file = f"{self.progress_file}.tmp"
+        with open(tmp_file, 'w') as file:
+            json.dump(progress_data, file, indent=2)
+        os.replace(tmp_file, self.progress_file)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.pages = 0
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
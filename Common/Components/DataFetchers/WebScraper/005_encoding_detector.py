@@ -0,0 +1,118 @@
+import re
+import sys
+import time
+import codecs
+import chardet
+
+# 高速な文字コード判定ライブラリ（インストールされていれば使う）
+try:
+    import cchardet as fast_detector
+except ImportError:
+    try:
+        import charset_normalizer as fast_detector
+    except ImportError:
+        fast_detector = None
+
+
+# <meta charset="..."> / <meta http-equiv="Content-Type" content="...; charset=..."> の判定に使う先頭のバイト数
+SNIFF_BYTES = 4096
+
+HEADER_CHARSET = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# Shift_JISと宣言されたページも機種依存文字（①など）を含むことが多いため、上位互換のcp932で読む
+ALIASES = {
+    'shift_jis': 'cp932',
+    'shift-jis': 'cp932',
+    'sjis': 'cp932',
+    'x-sjis': 'cp932',
+    'windows-31j': 'cp932',
+}
+
+
+def normalize_encoding(name):
+    if not name:
+        return None
+    name = name.strip().lower()
+    name = ALIASES.get(name, name)
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def can_decode(body, encoding):
+    try:
+        body.decode(encoding)
+        return True
+    except (UnicodeDecodeError, LookupError):
+        return False
+
+
+def detect_encoding(body, content_type=''):
+    """
+    レスポンスの文字コードを判定し、(文字コード, 判定した段階) を返す
+
+    段階は速いものから順に試し、宣言された文字コードは実際にデコードできる場合のみ採用する
+      bom    : 先頭のBOM
+      header : HTTPヘッダー（Content-Type）のcharset
+      meta   : 先頭SNIFF_BYTESバイト中の<meta charset>
+      fast   : cchardet / charset_normalizer による判定
+      chardet: chardetによる判定（従来の方法）
+    """
+    for bom, encoding in BOMS:
+        if body.startswith(bom):
+            return encoding, 'bom'
+
+    match = HEADER_CHARSET.search(content_type or '')
+    encoding = normalize_encoding(match.group(1)) if match else None
+    if encoding and can_decode(body, encoding):
+        return encoding, 'header'
+
+    match = META_CHARSET.search(body[:SNIFF_BYTES])
+    encoding = normalize_encoding(match.group(1).decode('ascii', errors='ignore')) if match else None
+    if encoding and can_decode(body, encoding):
+        return encoding, 'meta'
+
+    if fast_detector is not None:
+        encoding = normalize_encoding(fast_detector.detect(body).get('encoding'))
+        if encoding and can_decode(body, encoding):
+            return encoding, 'fast'
+
+    return normalize_encoding(chardet.detect(body)['encoding']), 'chardet'
+
+
+# 保存済みページ（生のバイト列）を対象に、chardetのみの場合との処理時間を比較する
+#   python encoding_detector.py <ページを保存したディレクトリ>
+if __name__ == "__main__":
+    import os
+    from collections import Counter
+
+    paths = [os.path.join(root, name) for root, _, names in os.walk(sys.argv[1]) for name in names]
+    bodies = []
+    for path in paths:
+        with open(path, 'rb') as file:
+            bodies.append(file.read())
+
+    start = time.perf_counter()
+    baseline = [chardet.detect(body)['encoding'] for body in bodies]
+    chardet_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [detect_encoding(body) for body in bodies]
+    tiered_time = time.perf_counter() - start
+
+    tiers = Counter(tier for _, tier in results)
+    mismatches = sum(1 for expected, (encoding, _) in zip(baseline, results)
+                     if normalize_encoding(expected) != encoding)
+    print(f"pages        : {len(bodies)}")
+    print(f"chardet only : {chardet_time:.3f}s")
+    print(f"tiered       : {tiered_time:.3f}s ({chardet_time / max(tiered_time, 1e-9):.1f}x)")
+    print(f"tiers        : {dict(tiers)}")
+    print(f"differs from chardet: {mismatches}")
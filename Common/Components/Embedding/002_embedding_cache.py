@@ -0,0 +1,142 @@
+import os
+import re
+import json
+import hashlib
+import numpy as np
+from vector_store import matrix_digest
+
+
+def text_hash(text):
+    """キャッシュのキーにするテキストのハッシュ値（16進文字列）"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    テキストのハッシュ値をキーに、ベクトル化の結果をディレクトリに保存する
+
+    directory   : キャッシュを保存するディレクトリ（モデルごとに「モデル名.npy」と「モデル名.json」を作る）
+    model_name  : モデル名（EmbeddingEngine.name）。モデルや平均の取り方が違えば別のキャッシュになる
+    retain_runs : この回数の実行で一度も使われなかったベクトルは、save時に削除する（1なら今回使ったものだけを残す）
+    max_mb      : キャッシュの大きさの上限（MB）。超えた場合は最後に使われたのが古いものから削除する
+
+    前回から内容が変わらない概要はキャッシュから返し、新規・変更された概要だけをモデルに通す。
+    """
+
+    def __init__(self, directory, model_name, retain_runs=1, max_mb=None):
+        self.model_name = model_name
+        self.retain_runs = max(1, int(retain_runs))
+        self.max_bytes = int(max_mb * 1024 * 1024) if max_mb else None
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, re.sub(r'[^0-9A-Za-z_.-]', '_', model_name))
+        self.matrix_path = base + '.npy'
+        self.index_path = base + '.json'
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        self.run = 0
+        self.rows = {}  # ハッシュ値 -> 行番号
+        self.last_used = []  # 行ごとに最後に使われた実行回
+        self.matrix = None
+        if not os.path.exists(self.index_path) or not os.path.exists(self.matrix_path):
+            self.new_rows = []
+            return
+        with open(self.index_path, 'r', encoding='utf-8') as file:
+            index = json.load(file)
+        matrix = np.load(self.matrix_path)
+        # 書き込み途中で中断された場合など、索引と行列が別の回に保存されたキャッシュは使わない
+        if (index.get('model') == self.model_name and matrix.ndim == 2 and len(index['keys']) == matrix.shape[0]
+                and index.get('digest') == matrix_digest(matrix)):
+            self.run = index.get('run', 0)
+            self.rows = {key: row for row, key in enumerate(index['keys'])}
+            self.last_used = list(index['last_used'])
+            self.matrix = matrix
+        else:
+            print(f"Warning: embedding cache '{self.index_path}' is inconsistent, ignoring it")
+        self.new_rows = []
+
+    @property
+    def nbytes(self):
+        """保存済みのベクトルと今回追加したベクトルの大きさ（バイト）"""
+        size = self.matrix.nbytes if self.matrix is not None else 0
+        return size + sum(vector.nbytes for vector in self.new_rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def embed(self, texts, engine):
+        """
+        textsをベクトル化した (テキスト数, 次元数) の配列を返す
+        キャッシュに無いテキストだけをengine.embedでまとめてベクトル化し、キャッシュに加える
+        """
+        texts = list(texts)
+        run = self.run + 1
+        keys = [text_hash(text) for text in texts]
+        missing = {}  # ハッシュ値 -> 最初に現れたテキストの位置（同じテキストは1回だけベクトル化する）
+        for i, key in enumerate(keys):
+            if key not in self.rows and key not in missing:
+                missing[key] = i
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            vectors = engine.embed(texts[i] for i in missing.values())
+            saved = self.matrix.shape[0] if self.matrix is not None else 0
+            for key, vector in zip(missing, vectors):
+                self.rows[key] = saved + len(self.new_rows)
+                self.new_rows.append(np.asarray(vector, dtype=np.float32))
+                self.last_used.append(run)
+
+        for key in keys:
+            self.last_used[self.rows[key]] = run
+        if not texts:
+            return engine.embed([])
+        return np.stack([self.vector(self.rows[key]) for key in keys])
+
+    def vector(self, row):
+        saved = self.matrix.shape[0] if self.matrix is not None else 0
+        return self.matrix[row] if row < saved else self.new_rows[row - saved]
+
+    def save(self):
+        """
+        今回の実行を記録してキャッシュを書き出す
+        retain_runs回の実行で使われなかったベクトルと、max_mbを超えた分の古いベクトルは削除する
+        """
+        self.run += 1
+        oldest = self.run - self.retain_runs + 1
+        order = sorted(self.rows.items(), key=lambda item: self.last_used[item[1]], reverse=True)
+        kept = [(key, row) for key, row in order if self.last_used[row] >= oldest]
+        if self.max_bytes is not None and kept:
+            row_bytes = self.vector(kept[0][1]).nbytes
+            kept = kept[:max(0, self.max_bytes // max(row_bytes, 1))]
+        evicted = len(self.rows) - len(kept)
+        # 元の並び（追加した順）を保って書き出す
+        kept.sort(key=lambda item: item[1])
+
+        if kept:
+            matrix = np.stack([self.vector(row) for _, row in kept])
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        index = {
+            'model': self.model_name,
+            'run': self.run,
+            'digest': matrix_digest(matrix),
+            'keys': [key for key, _ in kept],
+            'last_used': [self.last_used[row] for _, row in kept]
+        }
+        # 行列を先に置き換える。索引だけが古い場合は、行列のハッシュ値が合わないためloadで無視する
+        with open(self.matrix_path + '.tmp', 'wb') as file:
+            np.save(file, matrix)
+        os.replace(self.matrix_path + '.tmp', self.matrix_path)
+        with open(self.index_path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(index, file)
+        os.replace(self.index_path + '.tmp', self.index_path)
+
+        self.rows = {key: row for row, (key, _) in enumerate(kept)}
+        self.last_used = index['last_used']
+        self.matrix = matrix
+        self.new_rows = []
+        print(f"embedding cache : {self.hits} hits, {self.misses} embedded, {evicted} evicted, "
+              f"{len(self.rows)} entries ({self.nbytes / 1024 / 1024:.1f} MB)")
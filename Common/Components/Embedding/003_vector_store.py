@@ -0,0 +1,153 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+
+def detect_vector_format(path, vector_format=None):
+    """保存形式（npy / json）を返す。指定がなければ拡張子が.jsonのときだけ従来のjsonにする"""
+    if vector_format:
+        return vector_format
+    return 'json' if path.endswith('.json') else 'npy'
+
+
+def matrix_digest(matrix):
+    """
+    行列の内容のハッシュ値（16進文字列）
+    行列と索引を別々のファイルに置き換えるため、両方に書いておき、読み込み時に組み合わせが正しいか確かめる
+    """
+    return hashlib.blake2b(np.ascontiguousarray(matrix), digest_size=16).hexdigest()
+
+
+def vector_paths(path):
+    """ベクトルの行列（.npy）と、対応するサービス情報（.entries.json）のパス"""
+    base = os.path.splitext(path)[0]
+    return base + '.npy', base + '.entries.json'
+
+
+class VectorStore:
+    """
+    ベクトルの行列と、各行に対応するサービス情報（entries）
+
+    embeddings : (件数, 次元数) の配列。load_vectorsでmmapを指定した場合は読み取り専用のメモリマップ
+    entries    : 行ごとのサービス情報（overview / formal_name / url）のリスト
+    """
+
+    def __init__(self, embeddings, entries):
+        if len(embeddings) != len(entries):
+            raise ValueError(f"embeddings and entries differ in length: {len(embeddings)} / {len(entries)}")
+        self.embeddings = embeddings
+        self.entries = entries
+
+    @property
+    def dim(self):
+        return self.embeddings.shape[1] if self.embeddings.ndim == 2 else 0
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def save_vectors(path, embeddings, entries, vector_format=None, dtype='float32'):
+    """
+    ベクトルとサービス情報を保存する
+
+    vector_format : npy（行列を.npy、サービス情報を.entries.jsonに分けて保存する）または json（従来の1ファイルのJSON）
+                    省略時は拡張子から判断する
+    dtype         : npyの場合の要素の型（float32 / float16）
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if detect_vector_format(path, vector_format) == 'json':
+        data = {
+            'embeddings': np.asarray(embeddings).tolist(),
+            'entries': entries
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        return path
+
+    matrix_path, entries_path = vector_paths(path)
+    matrix = np.ascontiguousarray(embeddings, dtype=dtype)
+    if matrix.ndim != 2:
+        matrix = matrix.reshape(len(entries), -1)
+    # どちらも一時ファイルに書いてから置き換える（別の回に保存したファイルとの組み合わせはload_vectorsで検出する）
+    with open(matrix_path + '.tmp', 'wb') as f:
+        np.save(f, matrix)
+    os.replace(matrix_path + '.tmp', matrix_path)
+    metadata = {
+        'dtype': matrix.dtype.name,
+        'shape': list(matrix.shape),
+        'digest': matrix_digest(matrix),
+        'mtime_ns': os.stat(matrix_path).st_mtime_ns,
+        'entries': entries
+    }
+    with open(entries_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False)
+    os.replace(entries_path + '.tmp', entries_path)
+    return matrix_path
+
+
+def load_vectors(path, mmap=True, verify=False):
+    """
+    save_vectorsで保存したベクトルをVectorStoreとして読み込む
+    npyの場合、mmapがTrueなら行列をコピーせずにメモリマップする
+    別の回に保存した行列と.entries.jsonの組み合わせは、形と.npyの更新時刻で検出する
+    （更新時刻が記録と違う場合（コピーした場合など）だけ、行列のハッシュ値を照合する）
+    verifyがTrueなら、常に行列のハッシュ値を照合する（行列全体を1回読むため、mmapでも読み込みが遅くなる）
+    pathには保存時と同じパス、.npyのパスのいずれも指定できる。従来のJSONファイルも読み込める
+    """
+    matrix_path, entries_path = vector_paths(path)
+    if path.endswith('.json') and not os.path.exists(matrix_path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        embeddings = np.asarray(data['embeddings'], dtype=np.float32)
+        return VectorStore(embeddings.reshape(len(data['entries']), -1), data['entries'])
+
+    with open(entries_path, 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    embeddings = np.load(matrix_path, mmap_mode='r' if mmap else None)
+    if list(embeddings.shape) != metadata['shape']:
+        raise ValueError(f"{matrix_path}: shape {embeddings.shape} does not match {entries_path}")
+    if 'digest' in metadata and (verify or os.stat(matrix_path).st_mtime_ns != metadata.get('mtime_ns'))\
+            and matrix_digest(embeddings) != metadata['digest']:
+        raise ValueError(f"{matrix_path}: contents do not match {entries_path} (saved by a different run)")
+    return VectorStore(embeddings, metadata['entries'])
+
+
+# 同じベクトルを従来のJSONとnpyで保存し、ファイルサイズと読み込み時間を比較する
+#   python vector_store.py [件数（既定: 5000）] [次元数（既定: 768）]
+if __name__ == "__main__":
+    import sys
+    import time
+    import tempfile
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 768
+
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((count, dim)).astype(np.float32)
+    entries = [{'overview': f'概要{i}', 'formal_name': f'サービス{i}', 'url': f'https://example.jp/{i}.html'} for i in range(count)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = []
+        for label, name, vector_format, dtype, mmap in (('json', 'vectors.json', 'json', 'float32', False),
+                                                        ('npy float32', 'vectors32', 'npy', 'float32', True),
+                                                        ('npy float16', 'vectors16', 'npy', 'float16', True)):
+            path = os.path.join(directory, name)
+            start = time.perf_counter()
+            save_vectors(path, embeddings, entries, vector_format, dtype)
+            save_time = time.perf_counter() - start
+            if vector_format == 'json':
+                size = os.path.getsize(path)
+            else:
+                size = sum(os.path.getsize(p) for p in vector_paths(path))
+            start = time.perf_counter()
+            store = load_vectors(path, mmap)
+            load_time = time.perf_counter() - start
+            error = np.abs(np.asarray(store.embeddings, dtype=np.float32) - embeddings).max()
+            results.append((label, size, save_time, load_time, error))
+
+    print(f"vectors     : {count} x {dim}")
+    for label, size, save_time, load_time, error in results:
+        print(f"{label:<12}: {size / 1024 / 1024:.1f} MB, save {save_time:.3f}s, load {load_time * 1000:.1f} ms, max error {error:.1e}")
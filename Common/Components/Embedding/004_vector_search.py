@@ -0,0 +1,206 @@
+import math
+import numpy as np
+from vector_store import load_vectors
+
+
+def normalize(matrix):
+    """行ごとにL2ノルムで割ったfloat32の配列を返す（ノルムが0の行は0のまま）"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+def top_k(scores, k):
+    """
+    (クエリ数, 件数) のスコアから、クエリごとにスコアの高い順にk件の (位置, スコア) を返す
+    argpartitionで上位k件を取り出してから、そのk件だけを並べ替える
+    """
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        empty = np.zeros((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+
+class VectorIndex:
+    """
+    サービスの概要のベクトルに対するコサイン類似度の検索（全件との比較）
+
+    embeddings : (件数, 次元数) の配列（load_vectorsのメモリマップでもよい）
+    entries    : 行ごとのサービス情報。指定した場合は検索結果に位置の代わりに返す
+    batch_size : search_batchで1回に計算するクエリ数（スコアの行列の大きさを抑える）
+
+    生成時に1回だけ正規化するため、検索は行列積とargpartitionだけで済む。
+    """
+
+    def __init__(self, embeddings, entries=None, batch_size=256):
+        self.vectors = normalize(embeddings)
+        self.entries = entries
+        self.batch_size = max(1, int(batch_size))
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    def scores(self, queries):
+        """正規化済みのクエリと全件のコサイン類似度"""
+        return queries @ self.vectors.T
+
+    def search_batch(self, queries, k=10):
+        """
+        複数のクエリをまとめて検索し、(位置, スコア) の配列（どちらも (クエリ数, k)）を返す
+        """
+        queries = normalize(queries)
+        indices, scores = [], []
+        for start in range(0, len(queries), self.batch_size):
+            batch_indices, batch_scores = self.search_normalized(queries[start:start + self.batch_size], k)
+            indices.append(batch_indices)
+            scores.append(batch_scores)
+        if not indices:
+            return top_k(np.zeros((0, len(self)), dtype=np.float32), k)
+        return np.vstack(indices), np.vstack(scores)
+
+    def search_normalized(self, queries, k):
+        return top_k(self.scores(queries), k)
+
+    def search(self, query, k=10):
+        """1件のクエリを検索し、(サービス情報または位置, スコア) のリストをスコアの高い順に返す"""
+        indices, scores = self.search_batch(np.asarray(query).reshape(1, -1), k)
+        return self.results(indices[0], scores[0])
+
+    def search_texts(self, texts, engine, k=10):
+        """テキストをengine（EmbeddingEngine）でベクトル化して検索し、テキストごとの結果のリストを返す"""
+        indices, scores = self.search_batch(engine.embed(texts), k)
+        return [self.results(row_indices, row_scores) for row_indices, row_scores in zip(indices, scores)]
+
+    def results(self, indices, scores):
+        if self.entries is None:
+            return [(int(index), float(score)) for index, score in zip(indices, scores)]
+        return [(self.entries[index], float(score)) for index, score in zip(indices, scores)]
+
+
+class IVFIndex(VectorIndex):
+    """
+    複数の自治体にまたがる大きなカタログ向けの近似検索（転置ファイル索引）
+
+    n_lists : クラスタ数（省略時は件数の平方根）
+    n_probe : 検索時に比較するクラスタ数。大きくするほど全件検索の結果に近づき、遅くなる
+              （比較するクラスタの件数の合計がkに満たない場合は、k件に達するまで次に近いクラスタも比較する）
+
+    ベクトルを球面k-meansでn_listsのクラスタに分けておき、クエリに近いn_probe個のクラスタに
+    属するベクトルとだけ類似度を計算する。
+    """
+
+    def __init__(self, embeddings, entries=None, batch_size=256, n_lists=None, n_probe=8, iterations=10, seed=0):
+        super().__init__(embeddings, entries, batch_size)
+        count = len(self)
+        self.n_lists = max(1, min(count, int(n_lists) if n_lists else int(math.sqrt(count)) or 1))
+        self.n_probe = max(1, min(int(n_probe), self.n_lists))
+        self.centroids = self.train(iterations, seed)
+        assignments = self.assign(self.vectors)
+        # クラスタごとに属する行の位置を並べ、クラスタの境界をoffsetsに持つ
+        self.order = np.argsort(assignments, kind='stable')
+        self.offsets = np.searchsorted(assignments[self.order], np.arange(self.n_lists + 1))
+
+    def train(self, iterations, seed):
+        """球面k-means（内積で割り当て、平均を正規化して重心にする）"""
+        rng = np.random.default_rng(seed)
+        count = len(self)
+        if count == 0:
+            return np.zeros((self.n_lists, self.vectors.shape[1]), dtype=np.float32)
+        # 学習はクラスタあたり最大256件の標本で行う
+        sample = self.vectors
+        if count > self.n_lists * 256:
+            sample = self.vectors[rng.choice(count, self.n_lists * 256, replace=False)]
+        centroids = sample[rng.choice(len(sample), self.n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            empty = ~sums.any(axis=1)
+            # 空のクラスタは、標本から選び直す
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = normalize(sums)
+        return centroids
+
+    def assign(self, vectors):
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), 4096):
+            assignments[start:start + 4096] = np.argmax(vectors[start:start + 4096] @ self.centroids.T, axis=1)
+        return assignments
+
+    def probe_lists(self, ranked_lists, k):
+        """近い順に並べたクラスタから、n_probe個（属する行がk件に満たなければk件に達するまで）を選ぶ"""
+        sizes = np.diff(self.offsets)[ranked_lists]
+        count = max(self.n_probe, int(np.searchsorted(np.cumsum(sizes), k)) + 1)
+        return ranked_lists[:count]
+
+    def search_normalized(self, queries, k):
+        k = min(k, len(self))
+        # クラスタ数は件数の平方根程度のため、全クラスタを近い順に並べておく
+        ranked, _ = top_k(queries @ self.centroids.T, self.n_lists)
+        indices = np.empty((len(queries), k), dtype=np.int64)
+        scores = np.empty((len(queries), k), dtype=np.float32)
+        for i, (query, lists) in enumerate(zip(queries, ranked)):
+            rows = np.concatenate([self.order[self.offsets[list_id]:self.offsets[list_id + 1]]
+                                   for list_id in self.probe_lists(lists, k)])
+            row_indices, row_scores = top_k((self.vectors[rows] @ query).reshape(1, -1), k)
+            indices[i] = rows[row_indices[0]]
+            scores[i] = row_scores[0]
+        return indices, scores
+
+
+def load_index(path, approximate=False, mmap=True, **options):
+    """save_vectorsで保存したベクトルを読み込み、VectorIndex（approximateの場合はIVFIndex）を返す"""
+    store = load_vectors(path, mmap)
+    index_class = IVFIndex if approximate else VectorIndex
+    return index_class(store.embeddings, store.entries, **options)
+
+
+# 件数を変えて、全件検索とIVFの1クエリあたりの検索時間と、IVFの再現率（全件検索の上位k件が含まれる割合）を比較する
+#   python vector_search.py [最大件数（既定: 100000）] [次元数（既定: 768）] [k（既定: 10）]
+if __name__ == "__main__":
+    import sys
+    import time
+
+    max_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 768
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    rng = np.random.default_rng(0)
+    # 概要のベクトルのように、いくつかの話題の周りに集まったデータ
+    topics = rng.standard_normal((256, dim)).astype(np.float32)
+    queries = (topics[rng.integers(0, 256, 200)] + 0.8 * rng.standard_normal((200, dim))).astype(np.float32)
+
+    count = 1000
+    while count <= max_count:
+        embeddings = (topics[rng.integers(0, 256, count)] + 0.8 * rng.standard_normal((count, dim))).astype(np.float32)
+        exact = VectorIndex(embeddings)
+
+        start = time.perf_counter()
+        for query in queries:
+            exact.search(query, k)
+        single_time = (time.perf_counter() - start) / len(queries)
+        start = time.perf_counter()
+        expected, _ = exact.search_batch(queries, k)
+        batch_time = (time.perf_counter() - start) / len(queries)
+
+        start = time.perf_counter()
+        ivf = IVFIndex(embeddings)
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        approximate, _ = ivf.search_batch(queries, k)
+        ivf_time = (time.perf_counter() - start) / len(queries)
+        recall = np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approximate, expected)])
+
+        print(f"{count:>7} vectors : exact {single_time * 1000:.2f} ms/query (batch {batch_time * 1000:.2f} ms/query), "
+              f"ivf {ivf_time * 1000:.2f} ms/query (n_lists {ivf.n_lists}, n_probe {ivf.n_probe}, "
+              f"build {build_time:.1f}s, recall@{k} {recall:.3f})")
+        count *= 10
@@ -0,0 +1,78 @@
+import threading
+import numpy as np
+
+
+# プロセス内で読み込み済みのモデル（モデル名 -> (トークナイザー, モデル)）と、設定ごとのEmbeddingEngine
+# 1回のexecute_pipelineで複数のステップが同じモデルを使う場合も、読み込みは1回で済む
+_models = {}
+_engines = {}
+_lock = threading.Lock()
+
+
+def engine_name(model_name, max_length=512, exclude_special_tokens=False):
+    """EmbeddingEngine.nameと同じ名前（モデルを読み込まずにキャッシュのキーを決めるのに使う）"""
+    return f"{model_name}-{max_length}-{'tokens' if exclude_special_tokens else 'mean'}"
+
+
+def get_model(model_name):
+    """モデル名のトークナイザーとモデルを返す（最初に呼ばれたときに読み込む）"""
+    with _lock:
+        if model_name not in _models:
+            # transformers / torchの読み込みにも時間がかかるため、モデルが必要になるまでimportしない
+            from transformers import BertTokenizer, BertModel
+            print(f"loading model : {model_name}")
+            _models[model_name] = (BertTokenizer.from_pretrained(model_name), BertModel.from_pretrained(model_name))
+        return _models[model_name]
+
+
+def get_engine(model_name, batch_size=32, max_length=512, num_threads=None, exclude_special_tokens=False):
+    """モデル名と設定ごとのEmbeddingEngineを返す（モデルは設定が違っても共有する）"""
+    key = (model_name, batch_size, max_length, num_threads, exclude_special_tokens)
+    engine = _engines.get(key)
+    if engine is None:
+        from embedding_engine import EmbeddingEngine
+        tokenizer, model = get_model(model_name)
+        with _lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = EmbeddingEngine(tokenizer, model, batch_size, max_length, num_threads, exclude_special_tokens)
+                _engines[key] = engine
+    return engine
+
+
+class LazyEmbedder:
+    """
+    最初にベクトル化するテキストが渡されたときに、レジストリからモデルを読み込むEmbeddingEngineの代わり
+
+    ベクトル化するテキストが無い（キャッシュで足りる場合を含む）実行では、モデルもtorchも読み込まない。
+    nameはEmbeddingEngine.nameと同じため、EmbeddingCacheのキーも同じになる。
+    """
+
+    def __init__(self, model_name, batch_size=32, max_length=512, num_threads=None, exclude_special_tokens=False):
+        self.model_name = model_name
+        self.options = (batch_size, max_length, num_threads, exclude_special_tokens)
+        self.name = engine_name(model_name, max_length, exclude_special_tokens)
+
+    def embed(self, texts):
+        """EmbeddingEngine.embedと同じ。テキストが無い場合はモデルを読み込まずに (0, 0) の配列を返す"""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return get_engine(self.model_name, *self.options).embed(texts)
+
+
+def create_embedder(model_name, step_config):
+    """
+    ステップの設定から、ベクトル化に使うオブジェクト（embedメソッドとnameを持つ）を作る
+    embedding_workerを指定した場合は常駐するワーカーに、それ以外はこのプロセスのレジストリのモデルで処理する
+    """
+    model_name = step_config.get('model_name', model_name)
+    options = dict(batch_size=step_config.get('batch_size', 32),
+                   max_length=step_config.get('max_length', 512),
+                   num_threads=step_config.get('num_threads'),
+                   exclude_special_tokens=step_config.get('exclude_special_tokens', False) == True)
+    address = step_config.get('embedding_worker')
+    if address:
+        from embedding_worker import RemoteEmbedder
+        return RemoteEmbedder(address, model_name, **options)
+    return LazyEmbedder(model_name, **options)
@@ -0,0 +1,146 @@
+import os
+import json
+import socket
+import struct
+import threading
+import socketserver
+import numpy as np
+from model_registry import engine_name, get_engine
+
+
+# メッセージは「4バイトの長さ（ビッグエンディアン）+ JSON」。応答はJSONの後にfloat32の行列のバイト列が続く
+HEADER = struct.Struct('>I')
+
+
+def parse_address(address):
+    """「ホスト:ポート」ならTCP、それ以外はUnixドメインソケットのパスとして扱う"""
+    host, _, port = str(address).rpartition(':')
+    if host and port.isdigit():
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, str(address)
+
+
+def send_message(sock, message, payload=b''):
+    data = json.dumps(message, ensure_ascii=False).encode('utf-8')
+    sock.sendall(HEADER.pack(len(data)) + data + payload)
+
+
+def recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("embedding worker closed the connection")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_message(sock):
+    (size,) = HEADER.unpack(recv_exact(sock, HEADER.size))
+    return json.loads(recv_exact(sock, size).decode('utf-8'))
+
+
+class EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    """1つの接続で、{'model': モデル名, 'options': [...], 'texts': [...]} の要求を繰り返し処理する"""
+
+    def handle(self):
+        while True:
+            try:
+                request = recv_message(self.request)
+            except ConnectionError:
+                return
+            try:
+                engine = get_engine(request['model'], *request.get('options', ()))
+                # 同じモデルへの要求は1つずつ処理する（スレッド数はnum_threadsで指定する）
+                with self.server.lock:
+                    embeddings = np.ascontiguousarray(engine.embed(request['texts']), dtype=np.float32)
+            except Exception as e:
+                send_message(self.request, {'error': f"{type(e).__name__}: {e}"})
+                continue
+            send_message(self.request, {'shape': list(embeddings.shape)}, embeddings.tobytes())
+
+
+# 標準ライブラリのサーバークラスの設定を変えないよう、サブクラスで指定する
+# （接続ごとのスレッドは終了を待たず、再起動時は同じアドレスをすぐに使えるようにする）
+class EmbeddingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class EmbeddingUnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+class EmbeddingWorker:
+    """
+    モデルを読み込んだまま常駐し、ローカルのソケットでベクトル化の要求を受け付ける
+    パイプラインを何度実行しても、モデルの読み込みはワーカーの起動時（最初の要求時）の1回で済む
+    """
+
+    def __init__(self, address):
+        family, self.address = parse_address(address)
+        server_class = EmbeddingTCPServer if family == socket.AF_INET else EmbeddingUnixServer
+        if family == socket.AF_UNIX and os.path.exists(self.address):
+            os.remove(self.address)
+        self.server = server_class(self.address, EmbeddingRequestHandler)
+        self.server.lock = threading.Lock()
+
+    def serve_forever(self):
+        print(f"embedding worker : listening on {self.address}")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.remove(self.address)
+
+
+class RemoteEmbedder:
+    """
+    EmbeddingWorkerにベクトル化を依頼するEmbeddingEngineの代わり（embedとnameを持つ）
+    接続は最初のembedで開き、以降の要求に使い回す
+    """
+
+    def __init__(self, address, model_name, batch_size=32, max_length=512, num_threads=None, exclude_special_tokens=False):
+        self.address = address
+        self.model_name = model_name
+        self.options = [batch_size, max_length, num_threads, exclude_special_tokens]
+        self.name = engine_name(model_name, max_length, exclude_special_tokens)
+        self.sock = None
+
+    def connect(self):
+        family, address = parse_address(self.address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(address)
+
+    def embed(self, texts):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self.sock is None:
+            self.connect()
+        send_message(self.sock, {'model': self.model_name, 'options': self.options, 'texts': texts})
+        response = recv_message(self.sock)
+        if 'error' in response:
+            raise RuntimeError(f"embedding worker: {response['error']}")
+        shape = tuple(response['shape'])
+        data = recv_exact(self.sock, int(np.prod(shape)) * 4)
+        return np.frombuffer(data, dtype=np.float32).reshape(shape).copy()
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+# ワーカーを起動する（pipeline.yamlのembedding_workerに同じアドレスを指定する）
+#   python embedding_worker.py [アドレス（既定: 127.0.0.1:8765）] [起動時に読み込むモデル名 ...]
+if __name__ == "__main__":
+    import sys
+
+    address = sys.argv[1] if len(sys.argv) > 1 else '127.0.0.1:8765'
+    for model_name in sys.argv[2:]:
+        get_engine(model_name)
+    EmbeddingWorker(address).serve_forever()
@@ -0,0 +1,212 @@
+import re
+import json
+import hashlib
+from collections import Counter
+import numpy as np
+
+# 高速な非暗号学的ハッシュ（インストールされていれば使う）
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+RE_WHITESPACE = re.compile(r'\s+')
+
+# SimHashのビット数と、特徴量にする文字n-gramの長さ
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+BIT_POSITIONS = np.arange(SIMHASH_BITS, dtype=np.uint64)
+
+
+def new_hasher():
+    """128bitのハッシュオブジェクトを返す（xxhashが無ければblake2bを使う）"""
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def hash64(text):
+    """文字列の64bitハッシュ値（SimHashの特徴量に使う）"""
+    data = text.encode('utf-8')
+    if xxhash is not None:
+        return xxhash.xxh64_intdigest(data)
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+def update_canonical(hasher, value):
+    """
+    入れ子になった辞書・リストを、途中の文字列を作らずに先頭から順にhasherへ渡す
+
+    json.dumps(value, sort_keys=True) で同じ文字列になる値は同じ内容を渡す（辞書はキーの順に並べる）。
+    各要素の前に型と長さを付けるため、区切り位置が違う値が同じバイト列になることはない。
+    """
+    update = hasher.update
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            data = value.encode('utf-8')
+            update(b's%d:%b' % (len(data), data))
+        elif isinstance(value, dict):
+            update(b'd%d:' % len(value))
+            # JSONと同じく、文字列以外のキーは文字列にしたものをキーとして扱う
+            items = sorted(value.items(), key=lambda item: item[0], reverse=True)
+            for key, item in items:
+                stack.append(item)
+                stack.append(key if isinstance(key, str) else json.dumps(key))
+        elif isinstance(value, (list, tuple)):
+            update(b'l%d:' % len(value))
+            stack.extend(reversed(value))
+        elif value is None:
+            update(b'n')
+        elif value is True or value is False:
+            update(b't' if value else b'f')
+        elif isinstance(value, int):
+            update(b'i%d;' % value)
+        elif isinstance(value, float):
+            update(b'r%b;' % repr(value).encode('ascii'))
+        else:
+            # numpyの数値など、JSONの型以外の値は文字列表現で扱う
+            data = str(value).encode('utf-8')
+            update(b'o%d:%b' % (len(data), data))
+
+
+def fingerprint(record):
+    """レコード（detailsやitemsの入れ子構造）の正準形から、128bitのフィンガープリント（16進文字列）を返す"""
+    hasher = new_hasher()
+    update_canonical(hasher, record)
+    return hasher.hexdigest()
+
+
+def iter_texts(record, ignore_keys=()):
+    """レコードに含まれる文字列（辞書のキーは除く）を順に返す。ignore_keysは最上位の辞書で無視するキー"""
+    if isinstance(record, dict):
+        stack = [value for key, value in record.items() if key not in ignore_keys]
+    else:
+        stack = [record]
+    stack.reverse()
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            yield value
+        elif isinstance(value, dict):
+            stack.extend(reversed(list(value.values())))
+        elif isinstance(value, (list, tuple)):
+            stack.extend(reversed(value))
+
+
+def simhash(record, ignore_keys=()):
+    """
+    レコード内の文字列の文字n-gramを特徴量とする64bitのSimHash
+    内容がほぼ同じレコード（CMSが付け足す定型文だけが違うページなど）は、ハミング距離の小さい値になる
+    """
+    shingles = Counter()
+    for text in iter_texts(record, ignore_keys):
+        text = RE_WHITESPACE.sub(' ', text).strip()
+        if len(text) <= SHINGLE_SIZE:
+            if text:
+                shingles[text] += 1
+            continue
+        shingles.update(text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1))
+    if not shingles:
+        return 0
+
+    hashes = np.fromiter((hash64(shingle) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+    weights = np.fromiter(shingles.values(), dtype=np.int64, count=len(shingles))
+    # 各ビットについて、1の特徴量の重みを足し、0の特徴量の重みを引いた値が正ならそのビットを1にする
+    bits = ((hashes[:, None] >> BIT_POSITIONS) & np.uint64(1)).astype(np.int64)
+    scores = weights @ (bits * 2 - 1)
+    return sum(1 << int(position) for position in np.flatnonzero(scores > 0))
+
+
+def record_signature(record, mode='exact', ignore_keys=()):
+    """
+    重複判定に使う値を返す（Deduplicator.addに渡す）
+    exact : フィンガープリント
+    near  : (フィンガープリント, SimHash)。SimHashはignore_keysのキーを除いた内容から求める
+    """
+    if mode == 'near':
+        return fingerprint(record), simhash(record, ignore_keys)
+    return fingerprint(record)
+
+
+class Deduplicator:
+    """
+    レコードの重複を判定する
+
+    mode         : exact（内容が完全に同じレコードを重複とみなす）または near（ほぼ同じレコードも重複とみなす）
+    max_distance : nearの場合に、重複とみなすSimHashのハミング距離の上限
+
+    nearの場合は、SimHashを max_distance + 1 個のブロックに分けて索引を作る。
+    ハミング距離が max_distance 以下の2つの値は、鳩の巣原理により少なくとも1つのブロックが一致するため、
+    ブロックが一致したものだけを比べればよい。
+    """
+
+    def __init__(self, mode='exact', max_distance=3):
+        if mode not in ('exact', 'near'):
+            raise ValueError(f"dedup mode must be 'exact' or 'near': {mode}")
+        self.mode = mode
+        self.max_distance = max(0, int(max_distance))
+        self.fingerprints = set()
+        blocks = min(self.max_distance + 1, SIMHASH_BITS)
+        bounds = [SIMHASH_BITS * i // blocks for i in range(blocks + 1)]
+        self.blocks = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self.tables = [{} for _ in self.blocks]
+
+    def signature(self, record, ignore_keys=()):
+        return record_signature(record, self.mode, ignore_keys)
+
+    def add(self, signature):
+        """新しいレコードであれば登録してTrue、既に登録したレコードと重複していればFalseを返す"""
+        if self.mode == 'exact':
+            if signature in self.fingerprints:
+                return False
+            self.fingerprints.add(signature)
+            return True
+
+        record_fingerprint, record_simhash = signature
+        if record_fingerprint in self.fingerprints:
+            return False
+        keys = [(record_simhash >> start) & mask for start, mask in self.blocks]
+        for table, key in zip(self.tables, keys):
+            for candidate in table.get(key, ()):
+                if bin(candidate ^ record_simhash).count('1') <= self.max_distance:
+                    return False
+        self.fingerprints.add(record_fingerprint)
+        for table, key in zip(self.tables, keys):
+            table.setdefault(key, []).append(record_simhash)
+        return True
+
+    def add_record(self, record, ignore_keys=()):
+        return self.add(self.signature(record, ignore_keys))
+
+
+# 保存済みのサービス情報（JSON配列）を対象に、従来のハッシュ（JSON文字列のSHA-256）との重複判定の件数と処理時間を比較する
+#   python record_fingerprint.py <service_catalog.json> [ハミング距離の上限（既定: 3）]
+if __name__ == "__main__":
+    import sys
+    import time
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as file:
+        records = json.load(file)
+    max_distance = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    start = time.perf_counter()
+    legacy = len({hashlib.sha256(json.dumps(record, sort_keys=True).encode('utf-8')).hexdigest() for record in records})
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    exact = Deduplicator('exact')
+    exact_count = sum(exact.add_record(record) for record in records)
+    exact_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    near = Deduplicator('near', max_distance)
+    near_count = sum(near.add_record(record, ignore_keys=('URL', 'url')) for record in records)
+    near_time = time.perf_counter() - start
+
+    print(f"records     : {len(records)} ({'xxhash' if xxhash is not None else 'blake2b'})")
+    print(f"legacy      : {legacy} unique, {legacy_time:.3f}s")
+    print(f"exact       : {exact_count} unique, {exact_time:.3f}s")
+    print(f"near (<= {max_distance}) : {near_count} unique, {near_time:.3f}s")
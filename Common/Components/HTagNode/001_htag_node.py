@@ -1,18 +1,223 @@
 import os
+import re
 import yaml
 import pandas as pd
-from bs4 import BeautifulSoup
+from itertools import chain, count
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+from bs4 import Tag, NavigableString, CData
+
+# 子ノード・項目・表を持たないノードが共有する空のコンテナ
+# 最初に追加するときにノードごとのリストに置き換える
+EMPTY = ()
+
+# pd.read_html（lxml）と同じ規則でセルの文字列を整える
+RE_WHITESPACE = re.compile(r"[\r\n]+|\s{2,}")
+RE_NOT_EMPTY = re.compile(r".+")
+
+# ノードの追加・項目の追加ごとに進める世代番号。get_contentの保存結果は、保存したときと世代が同じ場合だけ使う
+# （木を作り終えてから読むため、作っている間は祖先をたどって破棄する必要がない）
+GENERATIONS = count(1)
+
+
+def is_display_none(tag):
+    return "display:none" in tag.get('style', '').replace(" ", "")
+
+
+def table_strings(tag, displayed_only=True):
+    """タグ内の文字列を文書順に返す（<br>は改行にし、displayed_onlyの場合は<style>と非表示の要素を除く）"""
+    stack = [tag]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Tag):
+            if displayed_only and node is not tag and (node.name == 'style' or is_display_none(node)):
+                continue
+            if node.name == 'br':
+                yield "\n"
+            stack.extend(reversed(node.contents))
+        elif type(node) in (NavigableString, CData):
+            yield node
+
+
+def expand_rows(rows, remainder, overflow):
+    """
+    <tr>のリストからセルの文字列の行を作る。rowspan / colspanのセルは後続の行・列に複製する
+    （pd.read_htmlの_expand_colspan_rowspanと同じ展開）
+    """
+    all_texts = []
+    for tr in rows:
+        texts = []
+        next_remainder = []
+        index = 0
+        for td in tr.find_all(('td', 'th'), recursive=False):
+            # 前の行から続くセルのうち、このセルより前の列のもの
+            while remainder and remainder[0][0] <= index:
+                prev_i, prev_text, prev_rowspan = remainder.pop(0)
+                texts.append(prev_text)
+                if prev_rowspan > 1:
+                    next_remainder.append((prev_i, prev_text, prev_rowspan - 1))
+                index += 1
+            text = RE_WHITESPACE.sub(" ", ''.join(table_strings(td)).strip())
+            rowspan = int(td.get('rowspan') or 1)
+            colspan = int(td.get('colspan') or 1)
+            for _ in range(colspan):
+                texts.append(text)
+                if rowspan > 1:
+                    next_remainder.append((index, text, rowspan - 1))
+                index += 1
+        for prev_i, prev_text, prev_rowspan in remainder:
+            texts.append(prev_text)
+            if prev_rowspan > 1:
+                next_remainder.append((prev_i, prev_text, prev_rowspan - 1))
+        all_texts.append(texts)
+        remainder = next_remainder
+
+    if not overflow:
+        # rowspanによって追加される行
+        while remainder:
+            next_remainder = []
+            texts = []
+            for prev_i, prev_text, prev_rowspan in remainder:
+                texts.append(prev_text)
+                if prev_rowspan > 1:
+                    next_remainder.append((prev_i, prev_text, prev_rowspan - 1))
+            all_texts.append(texts)
+            remainder = next_remainder
+    return all_texts, remainder
+
+
+def split_rows(table):
+    """
+    <tr>を<thead> / <tbody> / <tfoot>内のものに分ける（<tbody>を省略した行は本体の後ろに加える）
+    pd.read_html（lxml）のxpath（.//thead/tr, .//tbody//tr, ./tr, .//tfoot//tr）と同じ結果を、
+    tableタグ内の検索で求める
+    """
+    head_rows = []
+    for thead in table.find_all('thead'):
+        head_rows.extend(thead.find_all('tr', recursive=False))
+        # <tr>を省略して<th>を直接並べた<thead>は、それ自体を1行として扱う
+        if thead.find(('td', 'th'), recursive=False):
+            head_rows.append(thead)
+
+    tbody_rows, root_rows, foot_rows = [], [], []
+    for tr in table.find_all('tr'):
+        if tr.parent is table:
+            root_rows.append(tr)
+            continue
+        sections = set()
+        for parent in tr.parents:
+            if parent is table:
+                break
+            sections.add(parent.name)
+        if 'tbody' in sections:
+            tbody_rows.append(tr)
+        if 'tfoot' in sections:
+            foot_rows.append(tr)
+    return head_rows, tbody_rows + root_rows, foot_rows
+
+
+class HTagTable:
+    """
+    解析済みの<table>から取り出したセルの文字列の行
+    DataFrameへの変換はto_dataframe（get_tables）で必要になったときに行う
+    """
+    __slots__ = ('head', 'body', 'foot', 'header', 'caption')
+
+    def __init__(self, table, caption="No caption"):
+        self.caption = caption
+
+        # <thead>が無い場合は、先頭の<th>だけの行を見出し行とする
+        head_rows, body_rows, foot_rows = split_rows(table)
+        if not head_rows:
+            while body_rows and all(td.name == 'th' for td in body_rows[0].find_all(('td', 'th'), recursive=False)):
+                head_rows.append(body_rows.pop(0))
+
+        self.head, remainder = expand_rows(head_rows, [], True)
+        self.body, remainder = expand_rows(body_rows, remainder, len(foot_rows) > 0)
+        self.foot, _ = expand_rows(foot_rows, remainder, False)
+
+        # 見出しとする行（pd.read_htmlと同じ推定）
+        self.header = None
+        if self.head:
+            if len(self.head) == 1:
+                self.header = 0
+            else:
+                # 空の見出し行は除く
+                self.header = [i for i, row in enumerate(self.head) if any(text for text in row)]
+        if self.header == []:
+            # pd.read_htmlの変換で発生する例外と同じもの
+            raise IndexError("list index out of range")
+
+    def rows(self):
+        return self.head + self.body + self.foot
+
+    def is_empty(self):
+        # 1列以下で全て空の行は空行とみなされるため、pd.read_htmlの結果に含まれない
+        rows = self.rows()
+        width = max((len(row) for row in rows), default=0)
+        return width <= 1 and not any(row and row[0].strip() for row in rows)
+
+    def to_dataframe(self):
+        body = [list(row) for row in self.rows()]
+        width = max(len(row) for row in body)
+        for row in body:
+            row += [""] * (width - len(row))
+        df = TextParser(body, header=self.header, thousands=',').read()
+        # DataFrameの既存の列の最後にcaption列を追加
+        df['caption'] = self.caption
+        return df
+
+
+def extract_table(table):
+    """
+    解析済みの<table>からHTagTableを作る
+    従来のpd.read_html(str(table))[0]と同じく、table自身と入れ子の<table>のうち最初に表として扱えるものを使い、
+    表が無い場合は同じ例外（ValueError / IndexError）を発生させる
+    """
+    candidates = [t for t in chain((table,), table.find_all('table'))
+                  if not is_display_none(t)
+                  and any(RE_NOT_EMPTY.search(text) for text in table_strings(t, displayed_only=False))]
+    if not candidates:
+        raise ValueError("No tables found")
+
+    caption = table.find('caption')
+    caption_text = caption.get_text(strip=True) if caption else "No caption"
+
+    tables = []
+    for candidate in candidates:
+        htag_table = HTagTable(candidate, caption_text)
+        if isinstance(htag_table.header, list):
+            # 見出しが複数行の表（まれ）は、空行との組み合わせで変換に失敗する場合があるため、ここで変換して確かめる
+            try:
+                htag_table.to_dataframe()
+            except EmptyDataError:
+                continue
+        elif htag_table.is_empty():
+            continue
+        tables.append(htag_table)
+    return tables[0]
+
 
 class HTagNode:
+    # 長い一覧ページではノードが数千個になるため、__dict__を持たない__slots__にする
+    __slots__ = ('title', 'level', 'parent', 'children', 'items', 'htag_tables', 'tables',
+                 'content_cache', 'content_generation')
+
+    # 最後に木が変更されたときの世代番号
+    generation = 0
+
     def __init__(self, title, level, parent=None):
         #print(f'[new node] level = {level}, title = [{title}]')
         self.title = title
         self.level = level
         self.parent = parent # 親ノードへの参照
-        self.children = []
-        self.items = []
-        self.htag_tables = []
-        self.tables = []
+        self.children = EMPTY
+        self.items = EMPTY
+        self.htag_tables = EMPTY
+        self.tables = EMPTY
+        # (th, cut_prefixes) -> (平坦化した内容のリスト, 開始位置, 終了位置)。content_generationの世代でだけ有効
+        self.content_cache = None
+        self.content_generation = 0
 
     def truncate_list_after_keyword(self, lst, keyword):
         if keyword in lst:
@@ -39,16 +244,95 @@ class HTagNode:
         return lst
 
 
-    def get_content(self, th=7):
-        content_list = []
-        child_content_list = []
+    def iter_nodes(self):
+        """自身と子孫のノードを (ノード, 深さ) として前順に返すジェネレータ"""
+        stack = [(self, 0)]
+        while stack:
+            node, depth = stack.pop()
+            yield node, depth
+            stack.extend((child, depth + 1) for child in reversed(node.children))
+
+    def own_content(self, cut_prefixes=()):
+        """
+        自身のtitleとitemsのうち、get_contentに含める要素と、cut_prefixesで打ち切ったかどうかを返す
+        cut_prefixesのいずれかで始まる要素があれば、その要素以降は含めない
+        """
+        content = []
+        for text in chain((self.title,), self.items):
+            if cut_prefixes and text.startswith(cut_prefixes):
+                return content, True
+            if len(text) > 1:
+                content.append(text)
+        return content, False
+
+    def iter_content(self, th=7, cut_prefixes=()):
+        """
+        get_contentの内容を前順に1件ずつ返すジェネレータ
+        レベルがth以上のノードはその子孫も含めて対象外。
+        cut_prefixesのいずれかで始まる要素があれば、そのノードの残りの項目と子孫を打ち切る
+        """
+        cut_prefixes = tuple(cut_prefixes)
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.level >= th:
+                continue
+            content, cut = node.own_content(cut_prefixes)
+            yield from content
+            if not cut:
+                stack.extend(reversed(node.children))
+
+    def get_content(self, th=7, cut_prefixes=()):
+        """
+        レベルがth未満の自身と子孫のタイトル・項目を前順に並べたリスト
+        cut_prefixes : この接頭語で始まる要素以降を打ち切る（フッターの定型文など。サイトごとに呼び出し側で指定する）
+        """
         if self.level >= th:
-            return content_list
-        for child in self.children:
-            child_content_list += child.get_content(th)
-        content_list = [self.title] + self.items + child_content_list
-        content_list = self.truncate_list_from_prefix(content_list, "このページは荒尾市独自の基準に基づいたアクセシビリティチェックを実施しています。")
-        return [s for s in content_list if len(s) > 1]
+            return []
+        cut_prefixes = tuple(cut_prefixes)
+        if not self.children:
+            # 子ノードの無いノード（大半を占める）は保存せずに求める
+            return self.own_content(cut_prefixes)[0]
+        key = (th, cut_prefixes)
+        if self.content_generation != HTagNode.generation or key not in self.content_cache:
+            self.build_content_cache(*key)
+        flat, start, end = self.content_cache[key]
+        return flat[start:end]
+
+    def build_content_cache(self, th, cut_prefixes=()):
+        """
+        自身のget_content(th, cut_prefixes)を前順に1つのリストに平坦化し、
+        含まれる子孫のうち子ノードを持つものには、その中の自身の内容の範囲（開始位置, 終了位置）を保存する
+        部分木の内容は前順のリストの中で連続するため、ノードごとに内容をコピーして持たない
+        """
+        key = (th, cut_prefixes)
+        generation = HTagNode.generation
+        flat = []
+        # (ノード, 開始位置)。開始位置がNoneのものは行きがけ、それ以外は帰りがけ（子孫を処理し終えた）
+        stack = [(self, None)]
+        while stack:
+            node, start = stack.pop()
+            if start is None:
+                start = len(flat)
+                if node.level < th:
+                    content, cut = node.own_content(cut_prefixes)
+                    flat.extend(content)
+                    if not cut and node.children:
+                        stack.append((node, start))
+                        stack.extend((child, None) for child in reversed(node.children))
+                        continue
+            if not node.children and node is not self:
+                continue
+            if node.content_generation != generation:
+                node.content_cache = {}
+                node.content_generation = generation
+            node.content_cache[key] = (flat, start, len(flat))
+
+    def clear_content_cache(self):
+        """自身と子孫のget_contentの保存結果を破棄する（木を読み終えた後にメモリを解放する）"""
+        for node, _ in self.iter_nodes():
+            node.content_cache = None
+            node.content_generation = 0
 
     def add_child(self, child):
         # 新しい子ノードが追加される際、適切な親を見つける
@@ -56,11 +340,17 @@ class HTagNode:
         while current_node.level >= child.level and current_node.parent is not None:
             current_node = current_node.parent
         # 適切な親ノードに子を追加
+        if current_node.children is EMPTY:
+            current_node.children = []
         current_node.children.append(child)
         child.parent = current_node
+        HTagNode.generation = next(GENERATIONS)
 
     def add_item(self, item):
+        if self.items is EMPTY:
+            self.items = []
         self.items.append(item)
+        HTagNode.generation = next(GENERATIONS)
 
     def matches_keywords(self, keywords):
         # タイトルが指定されたキーワードのいずれかにマッチするか確認
@@ -71,20 +361,18 @@ class HTagNode:
         return any(keyword in self.title for keyword in keywords)
 
     def add_table(self, table):
-        # BeautifulSoupを使用してtableタグを解析
-        soup = BeautifulSoup(str(table), 'html.parser')
-        # captionを見つける
-        caption = soup.find('caption')
-        caption_text = caption.get_text(strip=True) if caption else "No caption"
-        
-        # tableをDataFrameに変換
-        df = pd.read_html(str(table))[0]
-        # DataFrameの既存の列の最後にcaption列を追加
-        df['caption'] = caption_text
-        #print(f'add table (title = {self.title}, caption = {caption_text}, level={self.level})')
+        # 解析済みのtableタグからセルの文字列を取り出す（DataFrameはget_tablesで作る）
+        htag_table = extract_table(table)
+        #print(f'add table (title = {self.title}, caption = {htag_table.caption}, level={self.level})')
 
-        # 変換したDataFrameをtablesリストに追加
-        self.tables.append(df)
+        if self.tables is EMPTY:
+            self.tables = []
+        self.tables.append(htag_table)
+
+    def add_htag_table(self, df):
+        if self.htag_tables is EMPTY:
+            self.htag_tables = []
+        self.htag_tables.append(df)
 
     def get_htag_tables(self):
         if not self.htag_tables:
@@ -92,15 +380,149 @@ class HTagNode:
         else:
             return pd.concat(self.htag_tables, ignore_index=True, sort=False).to_dict(orient='records')
 
+    def get_table_frames(self):
+        return [table.to_dataframe() for table in self.tables]
+
     def get_tables(self):
         if not self.tables:
             return {}
         else:
-            return pd.concat(self.tables, ignore_index=True, sort=False).to_dict(orient='records')
+            return pd.concat(self.get_table_frames(), ignore_index=True, sort=False).to_dict(orient='records')
 
     def __repr__(self):
-        return f"HTagNode(title='{self.title}', level={self.level}, items='{self.items[:3]}...', htag_tables='{self.get_htag_tables()}', tag_tables='{self.get_tables()}' \n)"
+        return f"HTagNode(title='{self.title}', level={self.level}, items='{list(self.items[:3])}...', htag_tables='{self.get_htag_tables()}', tag_tables='{self.get_tables()}' \n)"
         #return f"Node(title='{self.title}', level={self.level}, items='{self.items[:3]}...'\n)"
         #return f"Node(title='{self.title}', level={self.level}, items='{self.items[:30]}...', tables='{self.get_tables()}', children={self.children}\n)"
 
 
+
+
+# 大きなページ（数千件の<li>を持つ条例一覧など）を模した木で、従来の実装（__dict__を持つノード、
+# 再帰的にリストを連結するget_content）とメモリ使用量・処理時間・結果を比較する
+#   python 001_htag_node.py [セクション数（既定: 200）] [セクションあたりの項目数（既定: 50）]
+if __name__ == "__main__":
+    import sys
+    import time
+    import tracemalloc
+
+    NOTICE = "このページは独自の基準に基づいたアクセシビリティチェックを実施しています。"
+
+    class LegacyNode:
+        def __init__(self, title, level, parent=None):
+            self.title = title
+            self.level = level
+            self.parent = parent
+            self.children = []
+            self.items = []
+            self.htag_tables = []
+            self.tables = []
+
+        def add_child(self, child):
+            current_node = self
+            while current_node.level >= child.level and current_node.parent is not None:
+                current_node = current_node.parent
+            current_node.children.append(child)
+            child.parent = current_node
+
+        def add_item(self, item):
+            self.items.append(item)
+
+        def get_content(self, th=7, cut_prefixes=()):
+            content_list = []
+            child_content_list = []
+            if self.level >= th:
+                return content_list
+            for child in self.children:
+                child_content_list += child.get_content(th)
+            content_list = [self.title] + self.items + child_content_list
+            content_list = self.truncate_list_from_prefix(content_list, NOTICE)
+            return [s for s in content_list if len(s) > 1]
+
+        truncate_list_from_prefix = HTagNode.truncate_list_from_prefix
+
+    def build(node_class, sections, items):
+        # h2 > h3 > h4 の入れ子に、セクションごとに<li>の項目を持たせる
+        root = node_class('Root', 0)
+        for i in range(sections):
+            h2 = node_class(f'第{i}章', 2)
+            root.add_child(h2)
+            for j in range(5):
+                h3 = node_class(f'第{i}章 第{j}節', 3)
+                h2.add_child(h3)
+                for k in range(items):
+                    h3.add_item(f'第{i}章 第{j}節 第{k}条 条例の本文')
+                for k in range(3):
+                    h3.add_child(node_class(f'第{i}章 第{j}節 附則{k}', 4))
+        root.add_item(NOTICE + '（フッター）')
+        return root
+
+    def measure(node_class, sections, items):
+        tracemalloc.start()
+        start = time.perf_counter()
+        root = build(node_class, sections, items)
+        build_time = time.perf_counter() - start
+        tree_size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        # collect_data_from_nodes / create_titleと同じく、各ノードについて閾値を変えて取得する
+        content = []
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            content.append(node.get_content(cut_prefixes=(NOTICE,)))
+            content.append(node.get_content(th=4, cut_prefixes=(NOTICE,)))
+            stack.extend(node.children)
+        content.append(root.get_content(cut_prefixes=(NOTICE,)))
+        content_time = time.perf_counter() - start
+        content_peak = tracemalloc.get_traced_memory()[1] - tree_size
+        tracemalloc.stop()
+        return content, build_time, tree_size, content_time, content_peak
+
+    sections = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    items = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    legacy = measure(LegacyNode, sections, items)
+    compact = measure(HTagNode, sections, items)
+
+    print(f"nodes        : {1 + sections * 5 * 4}, items: {sections * 5 * items}")
+    for label, (_, build_time, tree_size, content_time, content_peak) in (('legacy', legacy), ('compact', compact)):
+        print(f"{label:<8} tree : {tree_size / 1024:.0f} KiB ({build_time:.3f}s), "
+              f"get_content : {content_time:.3f}s, peak {content_peak / 1024:.0f} KiB")
+    print(f"same content : {legacy[0] == compact[0]}")
+
+    # 表の多いページ（料金表・施設一覧）を模したHTMLで、従来のadd_table（tableタグの再解析と
+    # pd.read_htmlによる変換）とHTagTableへの取り出しを比較する
+    from io import StringIO
+    from bs4 import BeautifulSoup
+
+    def legacy_add_table(table):
+        soup = BeautifulSoup(str(table), 'html.parser')
+        caption = soup.find('caption')
+        caption_text = caption.get_text(strip=True) if caption else "No caption"
+        df = pd.read_html(StringIO(str(table)))[0]
+        df['caption'] = caption_text
+        return df
+
+    rows = ''.join(f'<tr><th>施設{i}</th><td>{i * 100:,}円</td><td rowspan="2">午前</td><td>{i}</td></tr>'
+                   f'<tr><th>施設{i}（休日）</th><td colspan="2">休館</td></tr>' for i in range(20))
+    page = '<html><body>' + ''.join(f'<h3>料金表{i}</h3><table><caption>料金表{i}</caption>'
+                                    f'<tr><th>施設</th><th>料金</th><th>時間</th><th>定員</th></tr>{rows}</table>'
+                                    for i in range(sections)) + '</body></html>'
+    tables = BeautifulSoup(page, 'html.parser').find_all('table')
+
+    start = time.perf_counter()
+    legacy_frames = [legacy_add_table(table) for table in tables]
+    legacy_time = time.perf_counter() - start
+
+    node = HTagNode('料金表', 3)
+    start = time.perf_counter()
+    for table in tables:
+        node.add_table(table)
+    extract_time = time.perf_counter() - start
+    start = time.perf_counter()
+    frames = node.get_table_frames()
+    frame_time = time.perf_counter() - start
+
+    print(f"tables       : {len(tables)}")
+    print(f"legacy   add_table : {legacy_time:.3f}s")
+    print(f"HTagTable add_table : {extract_time:.3f}s (+ get_tables {frame_time:.3f}s when the tables are read)")
+    print(f"same tables  : {all(a.equals(b) for a, b in zip(legacy_frames, frames))}")
@@ -1,12 +1,15 @@
 import os
 import yaml
 import pandas as pd
+from keyword_matcher import KeywordMatcher
 
 class ColumnManager:
     def __init__(self, yaml_path):
         self.column_config = {}
         self.special_columns = {'名称': None}  # 特殊カラムの初期設定
         self.load_yaml(yaml_path)
+        # 列名ごとのキーワードを1つのオートマトンにまとめておく
+        self.column_matcher = KeywordMatcher(self.column_config)
 
     def load_yaml(self, yaml_path):
         try:
@@ -21,14 +24,15 @@ class ColumnManager:
     def get_column_config(self):
         return self.column_config
 
+    def get_column_matcher(self):
+        return self.column_matcher
+
     def is_column(self, text):
         return any(text in values for values in self.column_config.values())
 
     def get_column_name(self, text):
-        for column, identifiers in self.column_config.items():
-            if any(identifier in text for identifier in identifiers):
-                return column
-        return None
+        # キーワードが部分一致した列のうち、columns.yamlで先に定義された列を返す
+        return self.column_matcher.first(text)
 
     def validate_table(self, table):
         found_columns = set(table.keys())
@@ -57,6 +61,6 @@ class ColumnManager:
         for child in node.children:
             service[child.title] = "  ".join(child.items)
         print(f'find table : title = {service["名称"]}, summary = {service["概要"]}')
-        node.htag_tables.append(pd.DataFrame([service]))
+        node.add_htag_table(pd.DataFrame([service]))
             
 
@@ -0,0 +1,19 @@
+from bs4 import BeautifulSoup, FeatureNotFound
+
+
+# 既定のパーサー。自治体サイトのCMSが出力するページではhtml.parserと同じ結果になり、速い
+# （閉じタグの欠けた<p>や<li>は、html.parserのように後ろの要素を入れ子にせず、その場で閉じる）
+DEFAULT_PARSER = 'lxml'
+# lxmlがインストールされていない場合に使うパーサー（標準ライブラリ）
+FALLBACK_PARSER = 'html.parser'
+
+
+def select_parser(html_parser=None):
+    """BeautifulSoupのパーサー（lxml, html.parser, html5lib）を選ぶ。使えない場合はhtml.parserにする"""
+    html_parser = html_parser or DEFAULT_PARSER
+    try:
+        BeautifulSoup('', html_parser)
+        return html_parser
+    except FeatureNotFound:
+        print(f"Warning: HTML parser '{html_parser}' is not installed, using '{FALLBACK_PARSER}'")
+        return FALLBACK_PARSER
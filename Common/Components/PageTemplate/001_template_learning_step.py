@@ -0,0 +1,55 @@
+import random
+from collections import defaultdict
+from urllib.parse import urlparse
+from bs4 import BeautifulSoup
+from parser_selector import select_parser
+from progress_journal import load_progress
+from page_template import TemplateLearner
+
+
+class TemplateLearningStep:
+    """
+    クロール済みのページの一部から、サイト共通のブロック（ヘッダー・ナビゲーション・フッターなど）を学習し、
+    テンプレートファイルに保存する。html2htaglayer_stepでtemplate_fileに指定すると、そのブロックを除いてから木を作る
+    """
+
+    def __init__(self, step_config):
+        self.progress_file = step_config['progress_file']
+        self.template_file = step_config['template_file']
+        self.sample_size = step_config.get('sample_size', 200)  # ホストごとに学習に使うページ数
+        self.min_ratio = step_config.get('min_ratio', 0.5)  # この割合以上のページに現れたブロックをテンプレートにする
+        self.min_pages = step_config.get('min_pages', 3)
+        self.seed = step_config.get('seed', 0)
+        self.html_parser = select_parser(step_config.get('html_parser'))
+
+    def sample_pages(self):
+        """取得済みのhtmlページを、ホストごとにsample_size件まで無作為に選ぶ"""
+        visited = load_progress(self.progress_file).get('visited', {})
+        pages = defaultdict(list)
+        for url, filepath in visited.items():
+            if filepath.endswith('.html'):
+                pages[urlparse(url).netloc].append((url, filepath))
+        rng = random.Random(self.seed)
+        samples = []
+        for host in sorted(pages):
+            host_pages = pages[host]
+            if len(host_pages) > self.sample_size:
+                host_pages = rng.sample(host_pages, self.sample_size)
+            samples.extend(host_pages)
+        return samples
+
+    def execute(self):
+        learner = TemplateLearner(self.min_ratio, self.min_pages)
+        for url, filepath in self.sample_pages():
+            try:
+                with open(filepath, 'r', encoding='utf-8') as file:
+                    soup = BeautifulSoup(file.read(), self.html_parser)
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Failed to read {filepath}: {e}")
+                continue
+            learner.add_page(url, soup)
+
+        templates = learner.build()
+        templates.save(self.template_file)
+        for host, template in sorted(templates.templates.items()):
+            print(f"template : {host} ({learner.pages[host]} pages, {len(template.blocks)} blocks)")
@@ -0,0 +1,150 @@
+import os
+import json
+import math
+import hashlib
+from collections import Counter, defaultdict
+from urllib.parse import urlparse
+from bs4 import Tag, NavigableString, CData
+
+# テンプレートの候補にするブロック要素（見出し・段落・項目などは、どのページにもある見出しを消さないよう対象外にする）
+BLOCK_TAGS = frozenset(('header', 'footer', 'nav', 'aside', 'div', 'section', 'ul', 'ol', 'dl', 'table', 'form'))
+# 内容がページごとに変わりやすく、木の作成にも使わない要素（タグ名だけをハッシュに含める）
+OPAQUE_TAGS = frozenset(('script', 'style', 'noscript', 'iframe'))
+
+
+def block_locator(tag):
+    """ブロックの位置を大まかに表す文字列（タグ名#id.class...）。ハッシュを計算するブロックを絞り込むのに使う"""
+    locator = tag.name
+    element_id = tag.get('id')
+    if element_id:
+        locator += '#' + element_id
+    classes = tag.get('class')
+    if classes:
+        if isinstance(classes, str):
+            classes = classes.split()
+        locator += ''.join('.' + name for name in sorted(classes))
+    return locator
+
+
+def subtree_hash(tag, memo):
+    """
+    部分木（タグ名・入れ子構造・空白をまとめた文字列）のハッシュ値（16進文字列、文字列を含まない部分木はNone）
+    属性は含めない（表示中のメニュー項目にだけclassが付くなど、ページごとに変わることが多いため）。
+    memoに要素ごとの結果を保存し、1ページ内で同じ要素を2回計算しないようにする
+    """
+    key = id(tag)
+    if key in memo:
+        return memo[key]
+    # 帰りがけ順に、子要素の結果を先に求める
+    stack = [(tag, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if id(node) in memo:
+            continue
+        if not expanded and node.name not in OPAQUE_TAGS:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.contents if isinstance(child, Tag) and id(child) not in memo)
+            continue
+        digest = hashlib.blake2b(node.name.encode('utf-8'), digest_size=8)
+        has_text = False
+        if node.name not in OPAQUE_TAGS:
+            for child in node.contents:
+                if isinstance(child, Tag):
+                    child_hash = memo[id(child)]
+                    digest.update(b'<' + (child_hash or node.name).encode('ascii', 'replace') + b'>')
+                    has_text = has_text or child_hash is not None
+                elif type(child) is NavigableString or type(child) is CData:
+                    text = ' '.join(child.split())
+                    if text:
+                        digest.update(b'"' + text.encode('utf-8') + b'"')
+                        has_text = True
+        memo[id(node)] = digest.hexdigest() if has_text else None
+    return memo[key]
+
+
+class PageTemplate:
+    """
+    サイト内の多くのページに同じ内容で現れるブロック（ヘッダー・ナビゲーション・サイドバー・フッターなど）
+
+    locators : テンプレートのブロックのblock_locator
+    blocks   : テンプレートのブロックのsubtree_hash
+    locatorが一致したブロックだけハッシュを計算するため、本文の部分はハッシュを計算せずに済む
+    """
+
+    def __init__(self, locators=(), blocks=()):
+        self.locators = frozenset(locators)
+        self.blocks = frozenset(blocks)
+
+    def is_template_block(self, tag, memo):
+        if tag.name not in BLOCK_TAGS or block_locator(tag) not in self.locators:
+            return False
+        return subtree_hash(tag, memo) in self.blocks
+
+    def to_dict(self):
+        return {'locators': sorted(self.locators), 'blocks': sorted(self.blocks)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('locators', ()), data.get('blocks', ()))
+
+
+class TemplateSet:
+    """ホスト名ごとのPageTemplate（テンプレートファイルの内容）"""
+
+    def __init__(self, templates=None):
+        self.templates = templates or {}
+
+    def get(self, url):
+        """urlのホストのテンプレート（学習していないホストの場合はNone）"""
+        return self.templates.get(urlparse(url).netloc)
+
+    def save(self, path):
+        data = {host: template.to_dict() for host, template in sorted(self.templates.items())}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        return cls({host: PageTemplate.from_dict(template) for host, template in data.items()})
+
+
+class TemplateLearner:
+    """
+    サンプルのページから、ホストごとに多くのページで同じ内容のブロックを集めてテンプレートにする
+
+    min_ratio : サンプルのページのうち、この割合以上のページに現れたブロックをテンプレートにする
+    min_pages : 現れたページ数がこれより少ないブロックはテンプレートにしない（ページ数の少ないホスト向け）
+    """
+
+    def __init__(self, min_ratio=0.5, min_pages=3):
+        self.min_ratio = min_ratio
+        self.min_pages = min_pages
+        self.pages = Counter()
+        self.counts = defaultdict(Counter)
+
+    def add_page(self, url, soup):
+        host = urlparse(url).netloc
+        root = soup.body or soup
+        memo = {}
+        subtree_hash(root, memo)
+        # 同じページに何度も現れるブロック（メニューの項目など）は1回として数える
+        found = set()
+        for tag in root.find_all(BLOCK_TAGS):
+            block_hash = memo.get(id(tag))
+            if block_hash is not None:
+                found.add((block_locator(tag), block_hash))
+        self.counts[host].update(found)
+        self.pages[host] += 1
+
+    def build(self):
+        templates = {}
+        for host, pages in self.pages.items():
+            threshold = max(self.min_pages, math.ceil(self.min_ratio * pages))
+            blocks = [key for key, count in self.counts[host].items() if count >= threshold]
+            templates[host] = PageTemplate((locator for locator, _ in blocks), (block_hash for _, block_hash in blocks))
+        return TemplateSet(templates)
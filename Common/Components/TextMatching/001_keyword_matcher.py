@@ -0,0 +1,169 @@
+import re
+from collections import deque
+
+
+class KeywordMatcher:
+    """
+    複数のキーワードをまとめて照合するAho–Corasickオートマトン
+
+    patterns : キーワードのリスト、または {ラベル: [キーワード, ...]} の辞書（columns.yamlのcolumnsと同じ形）
+               リストの場合は、キーワード自身をラベルとして扱う
+
+    オートマトンは生成時に1回だけ作るため、同じキーワードで多数のテキストを照合する場合に使う。
+    部分一致（search / contains_any）はテキストを1回走査するだけで、キーワード数によらずテキスト長に比例した時間で終わる。
+    前方一致（match_prefix）はテキストの先頭からトライをたどるだけで、最長のキーワード長で打ち切られる。
+    結果のラベルは、patternsに登録した順に並べて返す。
+    """
+
+    def __init__(self, patterns=()):
+        if isinstance(patterns, dict):
+            items = patterns.items()
+        else:
+            items = ((keyword, (keyword,)) for keyword in patterns)
+
+        self.labels = []
+        label_ids = {}
+        # 最長のキーワードの文字数（テキストを分けて照合する場合に、境界をまたぐ範囲の計算に使う）
+        self.max_length = 0
+        # goto[状態][文字] -> 次の状態（状態0が根）
+        self.goto = [{}]
+        terminal = [set()]
+        for label, keywords in items:
+            label_id = label_ids.setdefault(label, len(self.labels))
+            if label_id == len(self.labels):
+                self.labels.append(label)
+            for keyword in keywords or ():
+                self.max_length = max(self.max_length, len(keyword))
+                state = 0
+                for ch in keyword:
+                    next_state = self.goto[state].get(ch)
+                    if next_state is None:
+                        next_state = len(self.goto)
+                        self.goto[state][ch] = next_state
+                        self.goto.append({})
+                        terminal.append(set())
+                    state = next_state
+                terminal[state].add(label_id)
+
+        # 失敗リンクを幅優先で張り、失敗リンク先で確定するラベルも各状態の出力にまとめておく
+        self.fail = [0] * len(self.goto)
+        output = [set(labels) for labels in terminal]
+        # 空文字のキーワードはどのテキストにもマッチするため、根の出力は走査とは別に扱う
+        output[0] = set()
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self.goto[state].items():
+                fail = self.fail[state]
+                while fail and ch not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(ch, 0)
+                output[next_state] |= output[self.fail[next_state]]
+                queue.append(next_state)
+
+        self.output = [tuple(sorted(labels)) for labels in output]
+        self.terminal = [tuple(sorted(labels)) for labels in terminal]
+        # 根にいる間は、キーワードの先頭文字が現れる位置まで正規表現で読み飛ばす
+        first_chars = ''.join(re.escape(ch) for ch in self.goto[0])
+        self.first_chars = re.compile(f'[{first_chars}]') if first_chars else None
+
+    def scan(self, text):
+        """textに部分一致したキーワードのラベル番号を、マッチした位置の順に返すジェネレータ"""
+        yield from self.terminal[0]
+        if self.first_chars is None:
+            return
+        goto, fail, output, first_chars = self.goto, self.fail, self.output, self.first_chars
+        state = 0
+        pos = 0
+        length = len(text)
+        while pos < length:
+            if state == 0:
+                match = first_chars.search(text, pos)
+                if match is None:
+                    return
+                pos = match.start()
+            ch = text[pos]
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                yield from output[state]
+            pos += 1
+
+    def search(self, text):
+        """textに部分一致したキーワードのラベルを登録順に返す"""
+        found = set()
+        for label_id in self.scan(text):
+            found.add(label_id)
+            if len(found) == len(self.labels):
+                break
+        return [self.labels[label_id] for label_id in sorted(found)]
+
+    def contains_any(self, text):
+        """textにいずれかのキーワードが部分一致すればTrue（最初にマッチした時点で走査を打ち切る）"""
+        for _ in self.scan(text):
+            return True
+        return False
+
+    def first(self, text):
+        """textに部分一致したキーワードのうち、最初に登録されたラベルを返す（マッチしなければNone）"""
+        labels = self.search(text)
+        return labels[0] if labels else None
+
+    def match_prefix(self, text):
+        """textの先頭に一致したキーワードのラベルを登録順に返す"""
+        goto, terminal = self.goto, self.terminal
+        found = set(terminal[0])
+        state = 0
+        for ch in text:
+            state = goto[state].get(ch)
+            if state is None:
+                break
+            found.update(terminal[state])
+        return [self.labels[label_id] for label_id in sorted(found)]
+
+
+# キーワード数・テキスト長を変えて、従来の線形走査（キーワードごとの in / startswith）と処理時間・結果を比較する
+#   python keyword_matcher.py [キーワード数（既定: 200）] [テキスト長（既定: 20000）]
+if __name__ == "__main__":
+    import sys
+    import time
+    import random
+
+    keyword_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    text_length = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    random.seed(0)
+    # 漢字2000字からキーワードを作り、本文はそれにひらがな・句読点を混ぜて日本語のページに近い文字の分布にする
+    kanji = [chr(code) for code in range(0x4e00, 0x4e00 + 2000)]
+    alphabet = kanji + list('のにはをがでとしたすあいうえお、。') * 60
+    keywords = [''.join(random.choices(kanji, k=random.randint(2, 6))) for _ in range(keyword_count)]
+    texts = [''.join(random.choices(alphabet, k=text_length)) for _ in range(20)]
+    titles = [random.choice(keywords) + ''.join(random.choices(alphabet, k=random.randint(0, 8))) for _ in range(20000)]
+    columns = {f'column{i}': keywords[i::10] for i in range(10)}
+
+    start = time.perf_counter()
+    matcher = KeywordMatcher(keywords)
+    column_matcher = KeywordMatcher(columns)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    baseline = [[keyword for keyword in dict.fromkeys(keywords) if keyword in text] for text in texts]
+    legacy_search = time.perf_counter() - start
+    start = time.perf_counter()
+    results = [matcher.search(text) for text in texts]
+    matcher_search = time.perf_counter() - start
+    mismatches = sum(1 for expected, actual in zip(baseline, results) if expected != actual)
+
+    start = time.perf_counter()
+    baseline = [[key for key, values in columns.items() if any(title.startswith(value) for value in values)] for title in titles]
+    legacy_prefix = time.perf_counter() - start
+    start = time.perf_counter()
+    results = [column_matcher.match_prefix(title) for title in titles]
+    matcher_prefix = time.perf_counter() - start
+    mismatches += sum(1 for expected, actual in zip(baseline, results) if expected != actual)
+
+    print(f"keywords    : {keyword_count} (build {build_time * 1000:.1f} ms)")
+    print(f"substring   : legacy {legacy_search:.3f}s / matcher {matcher_search:.3f}s ({len(texts)} texts x {text_length} chars)")
+    print(f"prefix      : legacy {legacy_prefix:.3f}s / matcher {matcher_prefix:.3f}s ({len(titles)} titles)")
+    print(f"differs from legacy: {mismatches}")
@@ -0,0 +1,151 @@
+import os
+import re
+import json
+
+
+WHITESPACE = ' \t\r\n'
+NUMBER_CHARS = re.compile(r'[0-9.eE+-]*')
+
+
+def detect_format(path, output_format=None):
+    """出力形式（json / jsonl）を返す。指定がなければ拡張子が.jsonlのときだけjsonlにする"""
+    if output_format:
+        return output_format
+    return 'jsonl' if path.endswith('.jsonl') else 'json'
+
+
+class RecordWriter:
+    """
+    レコード（辞書やリスト）を1件ずつファイルに書き出す
+
+    output_format : json（JSON配列）または jsonl（1行1レコード）。省略時は拡張子から判断する
+    indent        : JSON配列で書き出す場合のインデント（4なら従来の json.dump(records, f, indent=4) と同じ内容になる）
+    echo          : Trueの場合、書き出したレコードを標準出力にも表示する（デバッグ用）
+
+    書き出し中は「ファイル名.tmp」に書き、closeで置き換えるため、途中で失敗しても前回の出力は残る。
+    全レコードをメモリに持たないため、使用メモリはレコード1件分で済む。
+    """
+
+    def __init__(self, path, output_format=None, indent=4, echo=False):
+        self.path = path
+        self.output_format = detect_format(path, output_format)
+        self.indent = indent
+        self.echo = echo
+        self.count = 0
+        self.tmp_path = f"{path}.tmp"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.tmp_path, 'w', encoding='utf-8')
+
+    def write(self, record):
+        if self.output_format == 'jsonl':
+            text = json.dumps(record, ensure_ascii=False)
+            self.file.write(text + '\n')
+        else:
+            text = json.dumps(record, ensure_ascii=False, indent=self.indent)
+            if self.indent is None:
+                self.file.write(', ' if self.count else '[')
+                self.file.write(text)
+            else:
+                # 配列の要素として1段深くインデントする（JSONの文字列は改行を含まないため、行単位で字下げできる）
+                prefix = ' ' * self.indent if isinstance(self.indent, int) else self.indent
+                self.file.write(',\n' if self.count else '[\n')
+                self.file.write('\n'.join(prefix + line for line in text.split('\n')))
+        self.count += 1
+        if self.echo:
+            print(text)
+
+    def close(self):
+        if self.file is None:
+            return
+        if self.output_format != 'jsonl':
+            if self.count == 0:
+                self.file.write('[]')
+            else:
+                self.file.write(']' if self.indent is None else '\n]')
+        self.file.close()
+        self.file = None
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """書き出しを中止し、書きかけのファイルを削除する（前回の出力はそのまま残る）"""
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def iter_records(path, input_format=None, chunk_size=1 << 16):
+    """
+    JSON配列またはJSONLのファイルから、レコードを1件ずつ読み込むジェネレータ
+    ファイル全体をjson.loadせずに、先頭から順に復号する（形式の判断はRecordWriterと同じ）
+    """
+    in_array = detect_format(path, input_format) != 'jsonl'
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as file:
+        buffer = ''
+        pos = 0
+        eof = False
+
+        def read_more(size):
+            # 未処理の部分を残したまま読み足す（ファイルの終わりならFalse）
+            nonlocal buffer, pos, eof
+            chunk = file.read(size) if not eof else ''
+            if not chunk:
+                eof = True
+                return False
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            return True
+
+        def skip(chars):
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in chars:
+                    pos += 1
+                if pos < len(buffer) or not read_more(chunk_size):
+                    return
+
+        if in_array:
+            skip(WHITESPACE)
+            if pos >= len(buffer) or buffer[pos] != '[':
+                raise ValueError(f"{path}: JSON配列ではありません")
+            pos += 1
+        separators = WHITESPACE + ',' if in_array else WHITESPACE
+        size = chunk_size
+        while True:
+            skip(separators)
+            if pos >= len(buffer):
+                if in_array:
+                    raise ValueError(f"{path}: JSON配列が閉じられていません")
+                return
+            if in_array and buffer[pos] == ']':
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # レコードが読み込んだ範囲の外まで続いている場合は、読み足してから復号し直す
+                if not read_more(size):
+                    raise
+                size *= 2
+                continue
+            # 数値は途中で切れていても復号できてしまうため、読み込んだ範囲の末尾まで続いている場合は読み足す
+            if (not eof and isinstance(record, (int, float)) and not isinstance(record, bool)
+                    and NUMBER_CHARS.match(buffer, end).end() == len(buffer)):
+                if read_more(size):
+                    continue
+            yield record
+            pos = end
+            size = chunk_size
@@ -5,6 +5,13 @@ class StepFactory:
     def register_step(cls, step_type, step_class):
         cls._steps[step_type] = step_class
 
+    @classmethod
+    def get_step_class(cls, step_type):
+        step_class = cls._steps.get(step_type)
+        if step_class is None:
+            raise ValueError(f"Step type {step_type} not registered")
+        return step_class
+
     @classmethod
     def create_step(cls, step_type, *args, **kwargs):
         step_class = cls._steps.get(step_type)
@@ -0,0 +1,168 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from step_factory import StepFactory
+
+
+# ワーカー（スレッド／プロセス）上でステップを生成して実行する
+# ProcessPoolExecutorでpickleできるよう、モジュールのトップレベルに定義する
+# spawn / forkserverで起動した子プロセスではStepFactoryへの登録が空のため、
+# ステップのクラスは親プロセスで解決して渡す（クラスはモジュール名とクラス名で送られ、子プロセスでimportされる）
+def run_step(step_class, step_config):
+    step = step_class(step_config)
+    step.execute()
+    return step_config['name']
+
+
+def to_list(value):
+    """yamlの値（文字列 / リスト / None）をリストに揃える"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(",") if v.strip()]
+    return list(value)
+
+
+class StepScheduler:
+    """
+    pipeline.yamlのステップをDAGとして実行するスケジューラ
+
+    ステップの依存関係は以下で宣言する（いずれも任意）
+      depends_on : 先に完了している必要があるステップ名のリスト
+      inputs     : ステップが読み込むファイル / ディレクトリのリスト
+      outputs    : ステップが書き出すファイル / ディレクトリのリスト
+    あるステップのinputsが別のステップのoutputsに含まれる場合、依存関係として扱う。
+    depends_on / inputs / outputs のいずれも宣言していないステップは、
+    従来どおりyaml上でそれより前にある全ステップの完了を待ってから実行する。
+    """
+
+    def __init__(self, step_configs, max_workers=1, executor='thread', cache=None):
+        self.max_workers = max(1, int(max_workers))
+        self.executor = executor
+        # StepCacheを渡した場合、変更のないステップは実行を省略する
+        self.cache = cache
+        # skip_flgが設定されたステップはグラフから除外する（依存は満たされたものとみなす）
+        self.steps = []
+        for step_config in step_configs:
+            if step_config.get('skip_flg', False) == True:
+                print(f"Skipping step: {step_config['name']}")
+                continue
+            self.steps.append(step_config)
+        self.skipped = set(s['name'] for s in step_configs) - set(s['name'] for s in self.steps)
+        self.dependencies = self.build_graph()
+
+    def is_declared(self, step_config):
+        return any(key in step_config for key in ('depends_on', 'inputs', 'outputs'))
+
+    def build_graph(self):
+        """ステップ名 -> 依存するステップ名の集合 を作成する"""
+        names = [s['name'] for s in self.steps]
+        if len(names) != len(set(names)):
+            raise ValueError("Step names must be unique when running a pipeline as a DAG")
+
+        # 出力パス -> そのパスを書き出すステップ名
+        producers = {}
+        for step_config in self.steps:
+            for path in to_list(step_config.get('outputs')):
+                producers[os.path.normpath(path)] = step_config['name']
+
+        dependencies = {}
+        for index, step_config in enumerate(self.steps):
+            name = step_config['name']
+            if not self.is_declared(step_config):
+                dependencies[name] = set(names[:index])
+                continue
+
+            deps = set()
+            for dep in to_list(step_config.get('depends_on')):
+                if dep in self.skipped:
+                    continue
+                if dep not in names:
+                    raise ValueError(f"Step {name} depends on unknown step {dep}")
+                deps.add(dep)
+            for path in to_list(step_config.get('inputs')):
+                producer = producers.get(os.path.normpath(path))
+                if producer is not None and producer != name:
+                    deps.add(producer)
+            dependencies[name] = deps
+
+        self.check_cycle(dependencies)
+        return dependencies
+
+    def check_cycle(self, dependencies):
+        remaining = {name: set(deps) for name, deps in dependencies.items()}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Dependency cycle detected among steps: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+    def step_by_name(self, name):
+        return next(s for s in self.steps if s['name'] == name)
+
+    def is_cached(self, step_config, fingerprints):
+        """キャッシュが有効なステップのフィンガープリントを計算し、再実行が不要ならTrueを返す"""
+        if self.cache is None or not self.cache.is_cacheable(step_config):
+            return False
+        fingerprint = self.cache.fingerprint(step_config)
+        if self.cache.is_fresh(step_config, fingerprint):
+            return True
+        fingerprints[step_config['name']] = fingerprint
+        return False
+
+    def create_executor(self):
+        if self.executor == 'process':
+            return ProcessPoolExecutor(max_workers=self.max_workers)
+        return ThreadPoolExecutor(max_workers=self.max_workers)
+
+    def run(self):
+        """依存関係が満たされたステップから順に、ワーカー数の範囲で並列に実行する"""
+        pending = {s['name']: s for s in self.steps}
+        done = set()
+        running = {}
+        fingerprints = {}
+        error = None
+
+        with self.create_executor() as pool:
+            while pending or running:
+                # 依存関係がすべて完了したステップを投入する（yaml上の順序を優先）
+                if error is None:
+                    for name in list(pending):
+                        if not self.dependencies[name] <= done:
+                            continue
+                        step_config = pending.pop(name)
+                        if self.is_cached(step_config, fingerprints):
+                            print(f"Skipping step (unchanged): {name}")
+                            done.add(name)
+                            continue
+                        print(f"Starting step: {name}")
+                        step_class = StepFactory.get_step_class(step_config['type'])
+                        running[pool.submit(run_step, step_class, step_config)] = name
+                    # キャッシュによるスキップで新たに実行可能になったステップを投入する
+                    if not running and pending:
+                        continue
+                else:
+                    pending.clear()
+
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"Step {name} failed: {e}")
+                        if error is None:
+                            error = e
+                        continue
+                    print(f"Finished step: {name}")
+                    done.add(name)
+                    if name in fingerprints:
+                        self.cache.record(self.step_by_name(name), fingerprints[name])
+
+        if error is not None:
+            raise error
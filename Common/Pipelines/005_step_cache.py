@@ -0,0 +1,152 @@
+import os
+import sys
+import ast
+import json
+import hashlib
+import sysconfig
+import importlib.util
+from step_factory import StepFactory
+from step_scheduler import to_list
+
+
+# フィンガープリントに含めないキー（実行制御用で、処理結果に影響しないもの）
+IGNORED_KEYS = ('skip_flg', 'cache')
+
+# 標準ライブラリとインストール済みパッケージの場所（これらのモジュールのソースはフィンガープリントに含めない）
+LIBRARY_PATHS = tuple(sorted({os.path.normcase(os.path.realpath(path)) for name, path in sysconfig.get_paths().items()
+                              if name in ('stdlib', 'platstdlib', 'purelib', 'platlib')}))
+
+
+def module_path(name):
+    """モジュールのソースファイルのパス（importせずに探す。見つからない場合はNone）"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return getattr(module, '__file__', None)
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return None
+    return spec.origin if spec is not None and spec.has_location else None
+
+
+def is_project_path(path):
+    """パイプラインのディレクトリに置かれたソース（ステップ本体と、ダウンロードした共通部品）ならTrue"""
+    if not path or not path.endswith('.py'):
+        return False
+    path = os.path.normcase(os.path.realpath(path))
+    return not any(path.startswith(library + os.sep) for library in LIBRARY_PATHS)
+
+
+def imported_names(source):
+    """ソース中のimport文（関数内で遅延importするものを含む）が読み込むモジュール名"""
+    names = set()
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.add(node.module)
+            # from lib import htag_node のように、サブモジュールを読み込む場合
+            names.update(f"{node.module}.{alias.name}" for alias in node.names)
+    return names
+
+
+def project_sources(module_name):
+    """
+    module_nameと、そこからimportしているパイプラインのモジュールを再帰的にたどり、
+    (モジュール名, ソースファイルのパス) を名前順に返す（標準ライブラリとインストール済みパッケージは含めない）
+    """
+    found = {}
+    stack = [module_name]
+    while stack:
+        name = stack.pop()
+        path = module_path(name)
+        if name in found or not is_project_path(path):
+            continue
+        found[name] = path
+        with open(path, 'r', encoding='utf-8') as file:
+            source = file.read()
+        stack.extend(imported_names(source) - set(found))
+    return sorted(found.items())
+
+
+class StepCache:
+    """
+    ステップのフィンガープリントを記録し、変更のないステップの再実行を省略する
+
+    フィンガープリントは以下から計算する
+      - ステップの設定（pipeline.yamlのdict）
+      - ステップクラスを定義しているモジュールと、そこからimportしている共通部品（htag_nodeなど）のソースコード
+      - inputsで宣言されたファイル／ディレクトリの内容のハッシュ
+    前回の実行時とフィンガープリントが一致し、outputsがすべて存在する場合はスキップする。
+    outputsを宣言していないステップ、および cache: no のステップは常に実行する。
+    """
+
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.fingerprints = self.load()
+
+    def load(self):
+        if os.path.exists(self.cache_file):
+            with open(self.cache_file, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        return {}
+
+    def save(self):
+        tmp_file = f"{self.cache_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as file:
+            json.dump(self.fingerprints, file, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.cache_file)
+
+    def is_cacheable(self, step_config):
+        if step_config.get('cache', True) == False:
+            return False
+        return bool(to_list(step_config.get('outputs')))
+
+    def hash_file(self, path, digest):
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                digest.update(chunk)
+
+    def hash_path(self, path, digest):
+        digest.update(os.path.normpath(path).encode('utf-8'))
+        if os.path.isfile(path):
+            self.hash_file(path, digest)
+        elif os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for filename in sorted(files):
+                    file_path = os.path.join(root, filename)
+                    digest.update(os.path.relpath(file_path, path).encode('utf-8'))
+                    self.hash_file(file_path, digest)
+        else:
+            digest.update(b'<missing>')
+
+    def step_source(self, step_type):
+        step_class = StepFactory.get_step_class(step_type)
+        sources = project_sources(step_class.__module__)
+        if not sources:
+            return step_class.__qualname__
+        contents = []
+        for name, path in sources:
+            with open(path, 'r', encoding='utf-8') as file:
+                contents.append(f"# {name}\n{file.read()}")
+        return '\n'.join(contents)
+
+    def fingerprint(self, step_config):
+        digest = hashlib.sha256()
+        config = {k: v for k, v in step_config.items() if k not in IGNORED_KEYS}
+        digest.update(json.dumps(config, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+        digest.update(self.step_source(step_config['type']).encode('utf-8'))
+        for path in to_list(step_config.get('inputs')):
+            self.hash_path(path, digest)
+        return digest.hexdigest()
+
+    def is_fresh(self, step_config, fingerprint):
+        """前回と同じフィンガープリントで、出力がすべて残っていればTrue"""
+        if self.fingerprints.get(step_config['name']) != fingerprint:
+            return False
+        return all(os.path.exists(path) for path in to_list(step_config.get('outputs')))
+
+    def record(self, step_config, fingerprint):
+        self.fingerprints[step_config['name']] = fingerprint
+        self.save()
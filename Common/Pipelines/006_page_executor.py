@@ -0,0 +1,59 @@
+import io
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+
+
+# ワーカープロセスごとに1回だけ受け取るページ処理関数
+# ProcessPoolExecutorでpickleできるよう、モジュールのトップレベルに定義する
+_page_func = None
+
+
+def init_worker(page_func):
+    global _page_func
+    _page_func = page_func
+
+
+def run_chunk(chunk):
+    """チャンク内のページを順に処理し、(結果, 標準出力の内容) のリストを返す"""
+    results = []
+    for args in chunk:
+        buffer = io.StringIO()
+        with redirect_stdout(buffer):
+            result = _page_func(*args)
+        results.append((result, buffer.getvalue()))
+    return results
+
+
+class PageExecutor:
+    """
+    ページ単位で独立した処理（読み込み → 解析 → 変換）をプロセスプールで実行する
+
+    workers    : ワーカープロセス数（1以下の場合は従来どおり1ページずつ順に処理する）
+    chunk_size : 1回のやり取りでワーカーに渡すページ数
+
+    page_funcはpickle可能な呼び出し可能オブジェクト（トップレベルの関数、またはそのインスタンス）で、
+    ワーカーの起動時に1回だけ渡される。
+    結果は入力と同じ順序で返し、各ページの処理中の標準出力も同じ順序で親プロセスから出力するため、
+    重複除去などの集約を呼び出し側で順に行えば、順次実行と同じ結果になる。
+    """
+
+    def __init__(self, workers=1, chunk_size=32):
+        self.workers = max(1, int(workers))
+        self.chunk_size = max(1, int(chunk_size))
+
+    def map(self, page_func, items):
+        """itemsの各要素（引数のタプル）にpage_funcを適用し、結果を入力順に返すジェネレータ"""
+        if self.workers == 1:
+            for args in items:
+                yield page_func(*args)
+            return
+
+        items = list(items)
+        chunks = [items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker, initargs=(page_func,)) as pool:
+            # Executor.mapは投入した順に結果を返す
+            for results in pool.map(run_chunk, chunks):
+                for result, output in results:
+                    if output:
+                        print(output, end='')
+                    yield result
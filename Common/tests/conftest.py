@@ -0,0 +1,64 @@
+import os
+import sys
+import importlib.abc
+import importlib.util
+
+
+# 共通部品は番号付きのファイル名（001_htag_node.pyなど）で置かれ、各パイプラインには
+# pipeline_download.jsonのfilename（htag_node.pyなど）としてダウンロードされる。
+# テストではダウンロードせずに、ダウンロード後のモジュール名でCommon内のファイルをimportする
+#   python -m pytest Common/tests
+COMMON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMPONENTS = {
+    'step_factory': 'Pipelines/002_step_factory.py',
+    'step_scheduler': 'Pipelines/004_step_scheduler.py',
+    'step_cache': 'Pipelines/005_step_cache.py',
+    'page_executor': 'Pipelines/006_page_executor.py',
+    'download_step': 'Components/DataFetchers/Downloader/001_download_step.py',
+    'artifact_cache': 'Components/DataFetchers/Downloader/002_artifact_cache.py',
+    'part_download': 'Components/DataFetchers/Downloader/003_part_download.py',
+    'web_scraper_step': 'Components/DataFetchers/WebScraper/001_web_scraper_step.py',
+    'robots_cache': 'Components/DataFetchers/WebScraper/002_robots_cache.py',
+    'url_frontier': 'Components/DataFetchers/WebScraper/003_url_frontier.py',
+    'progress_journal': 'Components/DataFetchers/WebScraper/004_progress_journal.py',
+    'encoding_detector': 'Components/DataFetchers/WebScraper/005_encoding_detector.py',
+    'embedding_engine': 'Components/Embedding/001_embedding_engine.py',
+    'embedding_cache': 'Components/Embedding/002_embedding_cache.py',
+    'vector_store': 'Components/Embedding/003_vector_store.py',
+    'vector_search': 'Components/Embedding/004_vector_search.py',
+    'model_registry': 'Components/Embedding/005_model_registry.py',
+    'embedding_worker': 'Components/Embedding/006_embedding_worker.py',
+    'record_fingerprint': 'Components/Fingerprint/001_record_fingerprint.py',
+    'htag_node': 'Components/HTagNode/001_htag_node.py',
+    'column_manager': 'Components/HTagNode/002_column_manager.py',
+    'parser_selector': 'Components/HtmlParser/001_parser_selector.py',
+    'template_learning_step': 'Components/PageTemplate/001_template_learning_step.py',
+    'page_template': 'Components/PageTemplate/002_page_template.py',
+    'keyword_matcher': 'Components/TextMatching/001_keyword_matcher.py',
+    'record_writer': 'Components/Writers/001_record_writer.py',
+    # HTagNodeはlibパッケージとしてダウンロードされる
+    'lib': 'Components/HTagNode/__init__.py',
+    'lib.htag_node': 'Components/HTagNode/001_htag_node.py',
+    'lib.column_manager': 'Components/HTagNode/002_column_manager.py',
+    # 共通部品を組み合わせて使うパイプラインのステップ（荒尾市）
+    'html2htaglayer_step': '../LocalGovData/432041_city_arao/ServiceCatalogCreator/pipeline/html2htaglayer_step.py',
+    # 江戸川区
+    'web_data2csv_step': '../LocalGovData/13123_city_edogawa/ServiceCatalogCreator/pipeline/web_data2csv_step.py',
+}
+PACKAGES = ('lib',)
+
+
+class ComponentFinder(importlib.abc.MetaPathFinder):
+    """COMPONENTSのモジュール名を、Common内の番号付きのファイルから読み込む"""
+
+    def find_spec(self, name, path=None, target=None):
+        if name not in COMPONENTS:
+            return None
+        path = os.path.normpath(os.path.join(COMMON_DIR, COMPONENTS[name]))
+        if name in PACKAGES:
+            return importlib.util.spec_from_file_location(name, path, submodule_search_locations=[])
+        return importlib.util.spec_from_file_location(name, path)
+
+
+sys.meta_path.insert(0, ComponentFinder())
@@ -0,0 +1,93 @@
+import os
+import hashlib
+import pytest
+from artifact_cache import ArtifactCache
+
+
+def write(path, body):
+    with open(path, 'wb') as file:
+        file.write(body)
+    return str(path)
+
+
+def read(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ArtifactCache(str(tmp_path / 'cache'), max_age=3600)
+
+
+def test_store_and_copy(cache, tmp_path):
+    sha256 = cache.store('u', write(tmp_path / 'a.part', b'abc'), {'ETag': '"1"'})
+    assert sha256 == hashlib.sha256(b'abc').hexdigest()
+    assert not os.path.exists(tmp_path / 'a.part')
+    assert cache.copy_to('u', str(tmp_path / 'a.csv'))
+    assert read(tmp_path / 'a.csv') == b'abc'
+    assert cache.is_fresh('u')
+    assert cache.is_fresh('u', sha256.upper())
+    assert not cache.is_fresh('u', '0' * 64)
+    assert cache.conditional_headers('u') == {'If-None-Match': '"1"'}
+
+
+def test_index_survives_restart(cache, tmp_path):
+    cache.store('u', write(tmp_path / 'a.part', b'abc'), {'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+    restarted = ArtifactCache(cache.cache_dir)
+    assert restarted.conditional_headers('u') == {'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'}
+    assert not restarted.is_fresh('u')  # max_age=0
+    assert ArtifactCache(cache.cache_dir, offline=True).is_fresh('u')
+
+
+def test_checksum_mismatch_raises(cache, tmp_path):
+    with pytest.raises(ValueError):
+        cache.store('u', write(tmp_path / 'a.part', b'abc'), sha256='0' * 64)
+    assert cache.lookup('u') is None
+    assert not os.path.exists(tmp_path / 'a.part')
+
+
+def test_same_content_is_stored_once(cache, tmp_path):
+    cache.store('u1', write(tmp_path / 'a.part', b'same'))
+    cache.store('u2', write(tmp_path / 'b.part', b'same'))
+    assert cache.total_size() == 4
+    # 内容が変わっても、他のURLが参照している中身は消さない
+    cache.store('u1', write(tmp_path / 'c.part', b'new'))
+    assert cache.copy_to('u2', str(tmp_path / 'b.csv'))
+    assert read(tmp_path / 'b.csv') == b'same'
+
+
+def test_lru_eviction(tmp_path, monkeypatch):
+    cache = ArtifactCache(str(tmp_path / 'cache'), max_size=10)
+    clock = iter(range(100))
+    monkeypatch.setattr('artifact_cache.time.time', lambda: next(clock))
+    cache.store('old', write(tmp_path / 'a.part', b'aaaa'))
+    cache.store('used', write(tmp_path / 'b.part', b'bbbb'))
+    cache.touch('old')
+    cache.store('new', write(tmp_path / 'c.part', b'cccc'))
+    assert cache.lookup('used') is None
+    assert cache.lookup('old') is not None and cache.lookup('new') is not None
+    assert cache.total_size() <= 10
+
+
+def test_corrupted_blob_is_discarded(cache, tmp_path):
+    sha256 = cache.store('u', write(tmp_path / 'a.part', b'abc'))
+    write(cache.blob_path(sha256), b'xyz')
+    assert not cache.copy_to('u', str(tmp_path / 'a.csv'))
+    assert cache.lookup('u') is None
+    assert not os.path.exists(tmp_path / 'a.csv')
+
+
+def test_blob_evicted_during_copy_returns_false(cache, tmp_path, monkeypatch):
+    sha256 = cache.store('u', write(tmp_path / 'a.part', b'abc'))
+    lookup = cache.lookup
+
+    def evicted_after_lookup(url):
+        # lookupの後、コピーを始める前に他のスレッドの保存で追い出された場合
+        entry = lookup(url)
+        os.remove(cache.blob_path(sha256))
+        return entry
+
+    monkeypatch.setattr(cache, 'lookup', evicted_after_lookup)
+    assert not cache.copy_to('u', str(tmp_path / 'a.csv'))
+    assert not os.path.exists(tmp_path / 'a.csv.tmp')
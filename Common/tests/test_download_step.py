@@ -0,0 +1,124 @@
+import json
+import hashlib
+import threading
+import pytest
+
+requests = pytest.importorskip('requests')
+import download_step
+from download_step import DownloadStep
+
+
+FILES = {f'https://example.jp/data{i}.csv': f'id,name\n{i},施設{i}\n'.encode('utf-8') for i in range(6)}
+
+
+class Response:
+    def __init__(self, status_code, headers=None, body=b''):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}", response=self)
+
+    def iter_content(self, chunk_size):
+        yield self.body
+
+
+class Server:
+    """URLごとに、failuresで指定した回数だけ指定のステータスを返してから本文を返す"""
+
+    def __init__(self, files, failures=None):
+        self.files = files
+        self.failures = dict(failures or {})
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        with self.lock:
+            self.sent.append((url, dict(headers or {})))
+            failure = self.failures.get(url)
+            if failure and failure[1] > 0:
+                self.failures[url] = (failure[0], failure[1] - 1)
+                return Response(failure[0])
+        if url not in self.files:
+            return Response(404)
+        etag = '"' + hashlib.sha256(self.files[url]).hexdigest()[:8] + '"'
+        if (headers or {}).get('If-None-Match') == etag:
+            return Response(304, {'ETag': etag})
+        return Response(200, {'ETag': etag}, self.files[url])
+
+
+@pytest.fixture
+def make_step(tmp_path, monkeypatch):
+    monkeypatch.setattr(download_step.time, 'sleep', lambda seconds: None)
+
+    def make(server, files, **options):
+        config_file = tmp_path / 'download.json'
+        config_file.write_text(json.dumps({'files': [dict(url=url, filename=url.rsplit('/', 1)[1], **extra)
+                                                     for url, extra in files.items()]}))
+        options.setdefault('cache_dir', str(tmp_path / 'cache'))
+        step = DownloadStep('download', 'download_step',
+                            dict(config=str(config_file), output_dir=str(tmp_path / 'data'), max_workers=4, **options))
+        step.session = server
+        return step
+
+    return make
+
+
+def downloaded(tmp_path):
+    return {path.name: path.read_bytes() for path in (tmp_path / 'data').iterdir()}
+
+
+def test_parallel_download_saves_every_file(make_step, tmp_path):
+    server = Server(FILES)
+    make_step(server, {url: {} for url in FILES}).execute()
+    assert downloaded(tmp_path) == {url.rsplit('/', 1)[1]: body for url, body in FILES.items()}
+    assert sorted(url for url, _ in server.sent) == sorted(FILES)
+
+
+def test_retries_only_retryable_errors(make_step, tmp_path):
+    retry_url, missing_url = 'https://example.jp/data0.csv', 'https://example.jp/missing.csv'
+    server = Server(FILES, {retry_url: (503, 2)})
+    make_step(server, {retry_url: {}, missing_url: {}}, retries=3, cache_dir='').execute()
+    assert downloaded(tmp_path) == {'data0.csv': FILES[retry_url]}
+    assert [url for url, _ in server.sent].count(retry_url) == 3
+    # 404は再試行しない
+    assert [url for url, _ in server.sent].count(missing_url) == 1
+
+
+def test_checksum_mismatch_is_not_saved(make_step, tmp_path):
+    url = 'https://example.jp/data1.csv'
+    make_step(Server(FILES), {url: {'sha256': '0' * 64}}).execute()
+    assert downloaded(tmp_path) == {}
+
+
+def test_unchanged_file_is_revalidated_and_restored_from_cache(make_step, tmp_path):
+    url = 'https://example.jp/data2.csv'
+    make_step(Server(FILES), {url: {}}).execute()
+    (tmp_path / 'data' / 'data2.csv').unlink()
+    server = Server(FILES)
+    make_step(server, {url: {}}).execute()
+    assert downloaded(tmp_path) == {'data2.csv': FILES[url]}
+    assert 'If-None-Match' in server.sent[0][1]
+
+
+def test_offline_mode_uses_only_the_cache(make_step, tmp_path):
+    cached, uncached = 'https://example.jp/data3.csv', 'https://example.jp/data4.csv'
+    make_step(Server(FILES), {cached: {}}).execute()
+    (tmp_path / 'data' / 'data3.csv').unlink()
+    server = Server(FILES)
+    make_step(server, {cached: {}, uncached: {}}, offline=True).execute()
+    assert downloaded(tmp_path) == {'data3.csv': FILES[cached]}
+    assert server.sent == []
+
+
+def test_cache_is_bounded_by_default(make_step):
+    assert make_step(Server(FILES), {}).cache.max_size == 1024 * 1024 * 1024
+    assert make_step(Server(FILES), {}, cache_max_size_mb=0).cache.max_size is None
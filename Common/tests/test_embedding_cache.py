@@ -0,0 +1,109 @@
+import hashlib
+import numpy as np
+import pytest
+from embedding_cache import EmbeddingCache
+
+
+class FakeEngine:
+    """テキストのハッシュ値から決まるベクトルを返し、ベクトル化したテキストを記録する"""
+
+    name = 'fake-512-mean'
+
+    def __init__(self, dim=4):
+        self.dim = dim
+        self.embedded = []
+
+    def vector(self, text):
+        digest = hashlib.sha256(text.encode('utf-8')).digest()
+        return np.resize(np.frombuffer(digest, dtype=np.uint8), self.dim).astype(np.float32)
+
+    def embed(self, texts):
+        texts = list(texts)
+        self.embedded.extend(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([self.vector(text) for text in texts])
+
+
+TEXTS = ['児童手当の概要', '粗大ごみの出し方', '児童手当の概要', '保育園の入園申請']
+
+
+def test_hits_and_misses_across_runs(tmp_path):
+    engine = FakeEngine()
+    cache = EmbeddingCache(str(tmp_path), engine.name)
+    vectors = cache.embed(TEXTS, engine)
+    np.testing.assert_array_equal(vectors, np.stack([engine.vector(text) for text in TEXTS]))
+    # 同じテキストは1回だけベクトル化する
+    assert engine.embedded == ['児童手当の概要', '粗大ごみの出し方', '保育園の入園申請']
+    assert (cache.hits, cache.misses) == (1, 3)
+    cache.save()
+
+    engine = FakeEngine()
+    cache = EmbeddingCache(str(tmp_path), engine.name)
+    texts = TEXTS + ['内容が変わった概要']
+    vectors = cache.embed(texts, engine)
+    np.testing.assert_array_equal(vectors, np.stack([engine.vector(text) for text in texts]))
+    assert engine.embedded == ['内容が変わった概要']
+    assert (cache.hits, cache.misses) == (4, 1)
+
+
+def test_unused_vectors_are_evicted(tmp_path):
+    engine = FakeEngine()
+    cache = EmbeddingCache(str(tmp_path), engine.name, retain_runs=2)
+    cache.embed(['a', 'b'], engine)
+    cache.save()
+    cache.embed(['b'], engine)
+    cache.save()
+    assert len(cache) == 2
+    cache.embed(['c'], engine)
+    cache.save()
+    # 'a'は直近2回の実行で使われていない
+    assert len(EmbeddingCache(str(tmp_path), engine.name)) == 2
+    engine.embedded.clear()
+    EmbeddingCache(str(tmp_path), engine.name).embed(['a', 'b', 'c'], engine)
+    assert engine.embedded == ['a']
+
+
+def test_max_mb_keeps_recently_used(tmp_path):
+    engine = FakeEngine(dim=1024)  # 1行4KB
+    cache = EmbeddingCache(str(tmp_path), engine.name, retain_runs=10, max_mb=8 / 1024)
+    cache.embed([str(i) for i in range(4)], engine)
+    cache.save()
+    cache.embed(['4', '5'], engine)
+    cache.save()
+    assert len(cache) == 2
+    engine.embedded.clear()
+    EmbeddingCache(str(tmp_path), engine.name).embed(['4', '5'], engine)
+    assert engine.embedded == []
+
+
+def test_inconsistent_cache_is_ignored(tmp_path, capsys):
+    engine = FakeEngine()
+    cache = EmbeddingCache(str(tmp_path), engine.name)
+    cache.embed(TEXTS, engine)
+    cache.save()
+    # 索引を書き込む前に中断し、行列だけが別の内容に置き換わった場合
+    np.save(cache.matrix_path, np.zeros((3, 4), dtype=np.float32))
+    cache = EmbeddingCache(str(tmp_path), engine.name)
+    assert 'inconsistent' in capsys.readouterr().out
+    assert len(cache) == 0
+    np.testing.assert_array_equal(cache.embed(TEXTS, engine), np.stack([engine.vector(text) for text in TEXTS]))
+
+
+def test_model_name_separates_caches(tmp_path):
+    engine = FakeEngine()
+    cache = EmbeddingCache(str(tmp_path), engine.name)
+    cache.embed(TEXTS, engine)
+    cache.save()
+    assert len(EmbeddingCache(str(tmp_path), 'cl-tohoku/bert-base-japanese-v3-512-tokens')) == 0
+    assert len(EmbeddingCache(str(tmp_path), engine.name)) == 3
+
+
+@pytest.mark.parametrize('saved', [False, True])
+def test_empty_input(tmp_path, saved):
+    engine = FakeEngine()
+    cache = EmbeddingCache(str(tmp_path), engine.name)
+    if saved:
+        cache.save()
+        cache = EmbeddingCache(str(tmp_path), engine.name)
+    assert cache.embed([], engine).shape == (0, 0)
@@ -0,0 +1,92 @@
+import random
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+from embedding_engine import EmbeddingEngine
+
+
+CLS, SEP, PAD = 1, 2, 0
+
+
+class FakeTokenizer:
+    """1文字を1トークンとし、先頭に[CLS]、末尾に[SEP]を付ける（BertTokenizerのうちEmbeddingEngineが使う部分）"""
+
+    def encode(self, text, max_length):
+        return [CLS] + [3 + ord(ch) % 50 for ch in text][:max_length - 2] + [SEP]
+
+    def __call__(self, texts, max_length=512, truncation=True, return_special_tokens_mask=False):
+        input_ids = [self.encode(text, max_length) for text in texts]
+        encoded = {'input_ids': input_ids, 'attention_mask': [[1] * len(ids) for ids in input_ids]}
+        if return_special_tokens_mask:
+            encoded['special_tokens_mask'] = [[1] + [0] * (len(ids) - 2) + [1] for ids in input_ids]
+        return encoded
+
+    def pad(self, encoded, return_tensors='pt'):
+        width = max(len(ids) for ids in encoded['input_ids'])
+        return {key: torch.tensor([values + [PAD] * (width - len(values)) for values in rows])
+                for key, rows in encoded.items()}
+
+
+class FakeConfig:
+    hidden_size = 8
+    name_or_path = 'fake-bert'
+
+
+class FakeOutput:
+    def __init__(self, last_hidden_state):
+        self.last_hidden_state = last_hidden_state
+
+
+class FakeModel(torch.nn.Module):
+    """トークンごとの埋め込みに線形変換をかけるだけのモデル（トークン間で値が混ざらない）"""
+
+    config = FakeConfig()
+
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+        self.embedding = torch.nn.Embedding(60, FakeConfig.hidden_size)
+        self.linear = torch.nn.Linear(FakeConfig.hidden_size, FakeConfig.hidden_size)
+        self.calls = 0
+
+    def forward(self, input_ids, attention_mask):
+        self.calls += 1
+        return FakeOutput(self.linear(self.embedding(input_ids)))
+
+
+def legacy_embed(tokenizer, model, text, max_length=512, exclude_special_tokens=False):
+    """従来の方法（1件ずつパディングなしでモデルに通し、全トークンの平均をとる）"""
+    ids = tokenizer.encode(text, max_length)
+    with torch.no_grad():
+        states = model(torch.tensor([ids]), torch.ones(1, len(ids))).last_hidden_state[0]
+    if exclude_special_tokens:
+        states = states[1:-1]
+    return states.mean(dim=0).numpy()
+
+
+@pytest.fixture(scope='module')
+def texts():
+    rng = random.Random(0)
+    words = ['児童手当', 'の', '申請', 'は', '窓口', 'で', '受け付け', 'ます', '。']
+    return [''.join(rng.choices(words, k=rng.randint(1, 40))) for _ in range(50)]
+
+
+@pytest.mark.parametrize('exclude_special_tokens', [False, True])
+@pytest.mark.parametrize('batch_size', [1, 7, 64])
+def test_batched_matches_one_by_one(texts, batch_size, exclude_special_tokens):
+    tokenizer, model = FakeTokenizer(), FakeModel()
+    engine = EmbeddingEngine(tokenizer, model, batch_size=batch_size, max_length=32,
+                             exclude_special_tokens=exclude_special_tokens)
+    embeddings = engine.embed(texts)
+    assert embeddings.shape == (len(texts), FakeConfig.hidden_size) and embeddings.dtype == np.float32
+    expected = np.array([legacy_embed(tokenizer, model, text, 32, exclude_special_tokens) for text in texts])
+    np.testing.assert_allclose(embeddings, expected, rtol=1e-5, atol=1e-6)
+    assert model.calls == -(-len(texts) // batch_size) + len(texts)
+
+
+def test_empty_input_and_name():
+    engine = EmbeddingEngine(FakeTokenizer(), FakeModel())
+    assert engine.embed([]).shape == (0, 0)
+    assert engine.name == 'fake-bert-512-mean'
+    assert not engine.model.training
@@ -0,0 +1,44 @@
+import codecs
+import pytest
+
+pytest.importorskip('chardet')
+import encoding_detector
+from encoding_detector import detect_encoding, normalize_encoding
+
+
+PAGE = '<html><head>{meta}</head><body><p>子育て支援の申請窓口①</p></body></html>'
+
+
+def test_normalize_encoding_aliases():
+    assert normalize_encoding('Shift_JIS') == 'cp932'
+    assert normalize_encoding(' UTF-8 ') == 'utf-8'
+    assert normalize_encoding('no-such-charset') is None
+    assert normalize_encoding(None) is None
+
+
+def test_bom_wins():
+    body = codecs.BOM_UTF8 + PAGE.format(meta='').encode('utf-8')
+    assert detect_encoding(body, 'text/html; charset=shift_jis') == ('utf-8-sig', 'bom')
+
+
+def test_header_charset():
+    body = PAGE.format(meta='').encode('cp932')
+    assert detect_encoding(body, 'text/html; charset="Shift_JIS"') == ('cp932', 'header')
+
+
+def test_meta_charset_when_header_is_wrong():
+    body = PAGE.format(meta='<meta charset="shift_jis">').encode('cp932')
+    # ヘッダーのutf-8ではデコードできないため、<meta>の宣言を使う
+    assert detect_encoding(body, 'text/html; charset=utf-8') == ('cp932', 'meta')
+    # EUC-JPには①が無いため除く
+    page = PAGE.format(meta='<meta http-equiv="Content-Type" content="text/html; charset=EUC-JP">')
+    body = page.replace('①', '').encode('euc_jp')
+    assert detect_encoding(body, 'text/html') == ('euc_jp', 'meta')
+
+
+def test_falls_back_to_chardet_without_declaration(monkeypatch):
+    monkeypatch.setattr(encoding_detector, 'fast_detector', None)
+    body = PAGE.format(meta='').encode('utf-8') * 20
+    encoding, tier = detect_encoding(body, 'text/html')
+    assert tier == 'chardet'
+    assert body.decode(encoding) == PAGE.format(meta='') * 20
@@ -0,0 +1,153 @@
+import pytest
+from htag_node import HTagNode
+
+
+NOTICE = "このページは独自の基準に基づいたアクセシビリティチェックを実施しています。"
+
+
+class LegacyNode:
+    """従来の実装（再帰的にリストを連結するget_content）"""
+
+    def __init__(self, title, level, parent=None):
+        self.title = title
+        self.level = level
+        self.parent = parent
+        self.children = []
+        self.items = []
+
+    def add_child(self, child):
+        current_node = self
+        while current_node.level >= child.level and current_node.parent is not None:
+            current_node = current_node.parent
+        current_node.children.append(child)
+        child.parent = current_node
+
+    def add_item(self, item):
+        self.items.append(item)
+
+    def get_content(self, th=7, cut_prefixes=()):
+        if self.level >= th:
+            return []
+        child_content_list = []
+        for child in self.children:
+            child_content_list += child.get_content(th, cut_prefixes)
+        content_list = [self.title] + self.items + child_content_list
+        for i, item in enumerate(content_list):
+            if cut_prefixes and item.startswith(tuple(cut_prefixes)):
+                content_list = content_list[:i]
+                break
+        return [s for s in content_list if len(s) > 1]
+
+
+def build(node_class, sections=4, items=3):
+    """h2 > h3 > h4 の入れ子に項目を持たせ、最後にフッターの定型文を加えた木"""
+    root = node_class('Root', 0)
+    current = root
+    for i in range(sections):
+        h2 = node_class(f'第{i}章', 2)
+        current.add_child(h2)
+        for j in range(2):
+            h3 = node_class(f'第{i}章 第{j}節', 3)
+            h2.add_child(h3)
+            for k in range(items):
+                h3.add_item(f'第{i}章 第{j}節 第{k}条')
+            h3.add_item('x')  # 1文字の項目は含めない
+            h4 = node_class(f'附則{i}-{j}', 4)
+            h3.add_child(h4)
+            current = h4
+    current.add_item(NOTICE + '（フッター）')
+    current.add_item('フッターの後の項目')
+    return root
+
+
+def nodes(root):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.children))
+
+
+def test_slots_and_shared_empty_containers():
+    node = HTagNode('見出し', 2)
+    assert not hasattr(node, '__dict__')
+    assert HTagNode('他の見出し', 2).items is node.items
+    node.add_item('項目')
+    assert list(node.items) == ['項目'] and not HTagNode('別', 2).items
+
+
+def test_add_child_finds_parent_by_level():
+    root = build(HTagNode)
+    assert [child.title for child in root.children] == [f'第{i}章' for i in range(4)]
+    h4 = root.children[0].children[0].children[0]
+    assert h4.parent.title == '第0章 第0節'
+
+
+def test_iter_nodes_is_preorder_with_depth():
+    root = build(HTagNode, sections=1)
+    assert [(node.title, depth) for node, depth in root.iter_nodes()] == [
+        ('Root', 0), ('第0章', 1), ('第0章 第0節', 2), ('附則0-0', 3), ('第0章 第1節', 2), ('附則0-1', 3)]
+
+
+def test_iter_content_matches_legacy():
+    root, legacy = build(HTagNode), build(LegacyNode)
+    for node, legacy_node in zip(nodes(root), nodes(legacy)):
+        for th in (7, 4, 3):
+            assert list(node.iter_content(th, (NOTICE,))) == legacy_node.get_content(th, (NOTICE,))
+
+
+def test_deep_tree_does_not_recurse():
+    root = HTagNode('Root', 0)
+    node = root
+    for i in range(5000):
+        child = HTagNode(f'項目{i}', 1)
+        node.children = [child]
+        child.parent = node
+        node = child
+    assert len(list(root.iter_nodes())) == 5001
+    assert len(list(root.iter_content())) == 5001
+
+
+@pytest.mark.parametrize('th', [7, 3])
+def test_get_content_without_cut_prefixes(th):
+    root, legacy = build(HTagNode), build(LegacyNode)
+    for node, legacy_node in zip(nodes(root), nodes(legacy)):
+        assert node.get_content(th) == legacy_node.get_content(th)
+
+
+def test_get_content_cache_matches_legacy_and_is_shared():
+    root, legacy = build(HTagNode), build(LegacyNode)
+    for _ in range(2):  # 2回目は保存結果から返す
+        for node, legacy_node in zip(nodes(root), nodes(legacy)):
+            for th in (7, 3):
+                assert node.get_content(th, (NOTICE,)) == legacy_node.get_content(th, (NOTICE,))
+    # 子孫は根の平坦化したリストの範囲を保存し、内容をコピーして持たない
+    flat = root.content_cache[(7, (NOTICE,))][0]
+    assert root.children[1].content_cache[(7, (NOTICE,))][0] is flat
+    # 子ノードの無いノードは保存しない
+    leaf = root.children[0].children[0].children[0]
+    assert not leaf.content_cache
+
+
+def test_mutation_invalidates_cache():
+    root, legacy = build(HTagNode), build(LegacyNode)
+    root.get_content()
+    section = root.children[2].children[0]
+    section.add_item('追加した項目')
+    legacy_section = legacy.children[2].children[0]
+    legacy_section.add_item('追加した項目')
+    assert root.get_content() == legacy.get_content()
+    assert section.get_content() == legacy_section.get_content()
+
+    section.add_child(HTagNode('追加した見出し', 4))
+    legacy_section.add_child(LegacyNode('追加した見出し', 4))
+    assert root.get_content() == legacy.get_content()
+    assert root.children[2].get_content() == legacy.children[2].get_content()
+
+
+def test_clear_content_cache():
+    root, legacy = build(HTagNode), build(LegacyNode)
+    root.get_content()
+    root.clear_content_cache()
+    assert all(not node.content_cache for node, _ in root.iter_nodes())
+    assert root.children[0].get_content() == legacy.children[0].get_content()
@@ -0,0 +1,72 @@
+from io import StringIO
+import pytest
+import pandas as pd
+from bs4 import BeautifulSoup
+from htag_node import HTagNode
+
+pytest.importorskip('lxml')
+
+
+def legacy_add_table(table):
+    """従来の方法（tableタグを文字列に戻してpd.read_htmlで読み直す）"""
+    caption = table.find('caption')
+    df = pd.read_html(StringIO(str(table)))[0]
+    df['caption'] = caption.get_text(strip=True) if caption else "No caption"
+    return df
+
+
+TABLES = {
+    'rowspan_colspan': '<table><caption>料金表</caption><tr><th>施設</th><th>料金</th><th>時間</th></tr>'
+                       '<tr><th>体育館</th><td>1,000円</td><td rowspan="2">午前</td></tr>'
+                       '<tr><th>体育館（休日）</th><td>2,000円</td></tr>'
+                       '<tr><th>プール</th><td colspan="2">休館</td></tr></table>',
+    'thead_tfoot': '<table><thead><tr><th>区分</th><th>人数</th></tr></thead>'
+                   '<tbody><tr><td>大人</td><td>10</td></tr><tr><td>子ども</td><td>5</td></tr></tbody>'
+                   '<tfoot><tr><td>合計</td><td>15</td></tr></tfoot></table>',
+    'no_header': '<table><tr><td>住所</td><td>荒尾市宮内出目390</td></tr>'
+                 '<tr><td>電話<br>FAX</td><td>0968-63-1111</td></tr></table>',
+    'multi_row_header': '<table><thead><tr><th colspan="2">期間</th></tr><tr><th>開始</th><th>終了</th></tr></thead>'
+                        '<tr><td>4月</td><td>9月</td></tr></table>',
+    'hidden_cells': '<table><tr><th>項目</th><th>内容</th></tr>'
+                    '<tr><td>受付<span style="display: none">非表示</span></td><td>窓口<style>p{}</style></td></tr></table>',
+    'nested_empty_outer': '<table><tr><td><table><tr><th>名称</th></tr><tr><td>公園</td></tr></table></td></tr></table>',
+}
+
+
+def parse(html):
+    return BeautifulSoup(html, 'html.parser').find('table')
+
+
+@pytest.mark.parametrize('name', sorted(TABLES))
+def test_add_table_matches_read_html(name):
+    table = parse(TABLES[name])
+    node = HTagNode('表', 3)
+    node.add_table(table)
+    expected = legacy_add_table(table)
+    frame, = node.get_table_frames()
+    pd.testing.assert_frame_equal(frame, expected)
+    assert node.get_tables() == expected.to_dict(orient='records')
+
+
+def test_table_without_text_raises_like_read_html():
+    table = parse('<table><tr><td></td></tr></table>')
+    with pytest.raises(ValueError):
+        legacy_add_table(table)
+    with pytest.raises(ValueError):
+        HTagNode('表', 3).add_table(table)
+
+
+def test_dataframe_is_built_lazily(monkeypatch):
+    node = HTagNode('表', 3)
+    calls = []
+    text_parser = pd.io.parsers.TextParser
+
+    def counting_text_parser(*args, **kwargs):
+        calls.append(args)
+        return text_parser(*args, **kwargs)
+
+    monkeypatch.setattr('htag_node.TextParser', counting_text_parser)
+    node.add_table(parse(TABLES['rowspan_colspan']))
+    assert not calls
+    node.get_table_frames()
+    assert len(calls) == 1
@@ -0,0 +1,71 @@
+import pytest
+from bs4 import BeautifulSoup
+import parser_selector
+from parser_selector import select_parser
+from keyword_matcher import KeywordMatcher
+from html2htaglayer_step import HEADING_TAGS, HtmlConverter, scan_page
+
+
+# CMSが出力するページ（閉じタグが揃っている）
+WELL_FORMED = '''<html><body>
+<div id="nav"><ul><li><a href="/">トップ</a></li><li><a href="/k">暮らし</a></li></ul></div>
+<div id="contents">
+<h1>児童手当</h1><p>児童を養育している方に手当を支給します。</p>
+<h2>対象</h2><ul><li>中学生までの児童を養育している方</li><li>市内に住所がある方</li></ul>
+<h2>支給額</h2>
+<table><caption>月額</caption><tr><th>年齢</th><th>金額</th></tr><tr><td>3歳未満</td><td>15,000円</td></tr></table>
+<h3>申請窓口</h3><p><span>子育て支援課</span></p>
+</div>
+<div id="footer"><p>荒尾市役所</p></div>
+</body></html>'''
+
+# 閉じタグの欠けた<p>・<li>と、本文の無いページ
+MALFORMED = '<html><body><div id="contents"><h2>相談</h2><p>窓口<br>電話<h3>予約</h3><ul><li>来所<li>電話</ul></div></body></html>'
+NO_MAIN = '<html><body><h2>お知らせ</h2><p>本文</p></body></html>'
+
+
+def dump_tree(node):
+    return [(child.level, child.title, list(child.items), [frame.to_dict() for frame in child.get_table_frames()])
+            for child, _ in node.iter_nodes()]
+
+
+def legacy(html, parser):
+    """従来の方法（should_processとparse_html_to_treeのそれぞれでfind_allする）"""
+    soup = BeautifulSoup(html, parser)
+    main_div = soup.find('div', id='contents')
+    headers = main_div.find_all(list(HEADING_TAGS)) if main_div else None
+    relevant_content = ' '.join(tag.get_text() for tag in headers) if headers is not None else None
+    return relevant_content, dump_tree(HtmlConverter(soup, None, KeywordMatcher()).root)
+
+
+def single_pass(html, parser):
+    soup = BeautifulSoup(html, parser)
+    headers, tags = scan_page(soup)
+    relevant_content = ' '.join(tag.get_text() for tag in headers) if headers is not None else None
+    return relevant_content, dump_tree(HtmlConverter(soup, None, KeywordMatcher(), tags).root)
+
+
+def test_select_parser_falls_back_to_html_parser(capsys):
+    assert select_parser() == parser_selector.DEFAULT_PARSER
+    assert select_parser('html.parser') == 'html.parser'
+    assert select_parser('no-such-parser') == parser_selector.FALLBACK_PARSER
+    assert 'not installed' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('parser', ['html.parser', 'lxml'])
+@pytest.mark.parametrize('html', [WELL_FORMED, MALFORMED, NO_MAIN])
+def test_single_pass_matches_legacy(html, parser):
+    if parser == 'lxml':
+        pytest.importorskip('lxml')
+    assert single_pass(html, parser) == legacy(html, parser)
+
+
+def test_headers_are_taken_from_main_div_only():
+    headers, tags = scan_page(BeautifulSoup(WELL_FORMED, 'html.parser'))
+    assert [tag.get_text() for tag in headers] == ['児童手当', '対象', '支給額', '申請窓口']
+    assert scan_page(BeautifulSoup(NO_MAIN, 'html.parser'))[0] is None
+
+
+def test_lxml_matches_html_parser_on_well_formed_pages():
+    pytest.importorskip('lxml')
+    assert single_pass(WELL_FORMED, 'lxml') == single_pass(WELL_FORMED, 'html.parser')
@@ -0,0 +1,59 @@
+import random
+import pytest
+from keyword_matcher import KeywordMatcher
+
+
+def naive_search(keywords, text):
+    """従来の方法（キーワードごとに in で調べる）"""
+    return [keyword for keyword in dict.fromkeys(keywords) if keyword in text]
+
+
+def naive_prefix(columns, text):
+    return [label for label, values in columns.items() if any(text.startswith(value) for value in values)]
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    random.seed(0)
+    # 少ない文字種で作り、キーワード同士の重なり（接頭辞・接尾辞・部分文字列）を多くする
+    alphabet = list('市民税課の手当と申請')
+    keywords = [''.join(random.choices(alphabet, k=random.randint(1, 5))) for _ in range(80)]
+    texts = [''.join(random.choices(alphabet, k=random.randint(0, 60))) for _ in range(300)]
+    return keywords, texts
+
+
+def test_search_matches_naive(corpus):
+    keywords, texts = corpus
+    matcher = KeywordMatcher(keywords)
+    for text in texts:
+        assert matcher.search(text) == naive_search(keywords, text)
+        assert matcher.contains_any(text) == bool(naive_search(keywords, text))
+
+
+def test_match_prefix_matches_naive(corpus):
+    keywords, texts = corpus
+    columns = {f'column{i}': keywords[i::7] for i in range(7)}
+    matcher = KeywordMatcher(columns)
+    for text in texts:
+        assert matcher.match_prefix(text) == naive_prefix(columns, text)
+
+
+def test_labels_in_registration_order():
+    matcher = KeywordMatcher({'料金': ['使用料', '料金'], '窓口': ['担当課', '問い合わせ'], '空': []})
+    assert matcher.search('問い合わせ先は担当課、使用料は無料') == ['料金', '窓口']
+    assert matcher.first('担当課に問い合わせ') == '窓口'
+    assert matcher.first('なし') is None
+    assert matcher.labels == ['料金', '窓口', '空']
+
+
+def test_empty_keyword_and_empty_matcher():
+    assert KeywordMatcher(['', '税']).search('手当') == ['']
+    assert KeywordMatcher(['', '税']).match_prefix('手当') == ['']
+    assert KeywordMatcher().search('手当') == []
+    assert not KeywordMatcher().contains_any('手当')
+
+
+def test_regex_metacharacters_are_literal():
+    matcher = KeywordMatcher(['a.b', '[注]', '^'])
+    assert matcher.search('axb') == []
+    assert matcher.search('^ a.b [注]') == ['a.b', '[注]', '^']
@@ -0,0 +1,92 @@
+import sys
+import types
+import threading
+import numpy as np
+import pytest
+import model_registry
+from model_registry import LazyEmbedder, create_embedder, engine_name, get_engine
+from embedding_worker import EmbeddingWorker, RemoteEmbedder
+
+
+class FakeEngine:
+    """EmbeddingEngineの代わり（torchを使わずに、テキストの長さと設定からベクトルを作る）"""
+
+    def __init__(self, tokenizer, model, batch_size=32, max_length=512, num_threads=None, exclude_special_tokens=False):
+        self.model = model
+        self.batch_size = batch_size
+        self.name = engine_name(model.name, max_length, exclude_special_tokens)
+
+    def embed(self, texts):
+        texts = list(texts)
+        if 'エラー' in texts:
+            raise ValueError('bad text')
+        return np.array([[len(text), self.batch_size] for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """モデルの読み込みを記録する、transformers / embedding_engineの代わりのモジュールを使う"""
+    loaded = []
+
+    class FakeModel:
+        def __init__(self, name):
+            self.name = name
+
+        @classmethod
+        def from_pretrained(cls, name):
+            loaded.append(name)
+            return cls(name)
+
+    monkeypatch.setitem(sys.modules, 'transformers', types.SimpleNamespace(BertTokenizer=FakeModel, BertModel=FakeModel))
+    monkeypatch.setitem(sys.modules, 'embedding_engine', types.SimpleNamespace(EmbeddingEngine=FakeEngine))
+    monkeypatch.setattr(model_registry, '_models', {})
+    monkeypatch.setattr(model_registry, '_engines', {})
+    return loaded
+
+
+def test_model_is_loaded_once_and_shared(loads):
+    engine = get_engine('bert', batch_size=8)
+    assert get_engine('bert', batch_size=8) is engine
+    other = get_engine('bert', batch_size=16)
+    assert other is not engine and other.model is engine.model
+    # トークナイザーとモデルを1回ずつ読み込む
+    assert loads == ['bert', 'bert']
+
+
+def test_lazy_embedder_loads_on_first_text(loads):
+    embedder = LazyEmbedder('bert', batch_size=8, max_length=128, exclude_special_tokens=True)
+    assert embedder.name == 'bert-128-tokens'
+    assert embedder.embed([]).shape == (0, 0)
+    assert loads == []
+    np.testing.assert_array_equal(embedder.embed(['児童手当', '申請']), [[4, 8], [2, 8]])
+    assert embedder.name == get_engine('bert', 8, 128, None, True).name
+    assert len(loads) == 2
+
+
+def test_create_embedder(loads):
+    embedder = create_embedder('bert', {'batch_size': 4, 'exclude_special_tokens': True})
+    assert isinstance(embedder, LazyEmbedder) and embedder.name == 'bert-512-tokens'
+    remote = create_embedder('bert', {'model_name': 'other', 'embedding_worker': '127.0.0.1:8765'})
+    assert isinstance(remote, RemoteEmbedder) and remote.name == 'other-512-mean'
+    assert loads == []
+
+
+def test_worker_round_trip(loads):
+    worker = EmbeddingWorker('127.0.0.1:0')
+    host, port = worker.server.server_address
+    thread = threading.Thread(target=worker.serve_forever, daemon=True)
+    thread.start()
+    embedder = RemoteEmbedder(f'{host}:{port}', 'bert', batch_size=8)
+    try:
+        assert embedder.embed([]).shape == (0, 0)
+        assert loads == []
+        np.testing.assert_array_equal(embedder.embed(['児童手当', '申請']), [[4, 8], [2, 8]])
+        # 接続を使い回し、ワーカーの例外は呼び出し側の例外になる
+        with pytest.raises(RuntimeError, match='bad text'):
+            embedder.embed(['エラー'])
+        np.testing.assert_array_equal(embedder.embed(['窓口']), [[2, 8]])
+        assert loads == ['bert', 'bert']
+    finally:
+        embedder.close()
+        worker.server.shutdown()
+        thread.join()
@@ -0,0 +1,24 @@
+import os
+from page_executor import PageExecutor
+
+
+def process_page(index, text):
+    print(f"page {index}")
+    return index, text.upper(), os.getpid()
+
+
+PAGES = [(i, f'page-{i}') for i in range(25)]
+
+
+def test_sequential_when_one_worker():
+    results = list(PageExecutor(workers=1).map(process_page, PAGES))
+    assert [result[:2] for result in results] == [(i, f'PAGE-{i}') for i in range(25)]
+    assert {result[2] for result in results} == {os.getpid()}
+
+
+def test_process_pool_keeps_input_order_and_output(capsys):
+    results = list(PageExecutor(workers=2, chunk_size=4).map(process_page, PAGES))
+    assert [result[:2] for result in results] == [(i, f'PAGE-{i}') for i in range(25)]
+    assert os.getpid() not in {result[2] for result in results}
+    # 各ページの標準出力も入力と同じ順序で出力される
+    assert capsys.readouterr().out == ''.join(f"page {i}\n" for i in range(25))
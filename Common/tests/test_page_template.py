@@ -0,0 +1,79 @@
+from bs4 import BeautifulSoup
+from page_template import PageTemplate, TemplateLearner, TemplateSet, subtree_hash
+from html2htaglayer_step import scan_page
+
+
+def page(title, body, current=0, main_id='contents', footer='荒尾市役所 〒864-8686'):
+    # 表示中のメニュー項目にだけclassが付く（属性はテンプレートの判定に含めない）
+    menu = ''.join(f'<li{" class=current" if i == current else ""}><a href="/{i}">メニュー{i}</a></li>' for i in range(3))
+    return BeautifulSoup(f'''<html><body>
+<div id="header"><h1>荒尾市</h1><p>文字サイズ</p></div>
+<div id="nav"><ul>{menu}</ul></div>
+<div id="{main_id}"><h2>{title}</h2><p>{body}</p><ul><li>{title}の詳細</li></ul></div>
+<div id="footer"><p>{footer}</p><p>このページは独自の基準に基づいたアクセシビリティチェックを実施しています。</p></div>
+</body></html>''', 'html.parser')
+
+
+def learn(pages, host='www.city.arao.lg.jp'):
+    learner = TemplateLearner(min_ratio=0.5, min_pages=3)
+    for index, soup in enumerate(pages):
+        learner.add_page(f'https://{host}/{index}.html', soup)
+    return learner.build()
+
+
+def texts(tags):
+    return [tag.get_text(strip=True) for tag in tags]
+
+
+SAMPLES = [page(f'手続き{i}', f'本文{i}', current=i % 3) for i in range(5)]
+
+
+def test_shared_blocks_are_learned_and_skipped():
+    template = learn(SAMPLES).get('https://www.city.arao.lg.jp/new.html')
+    soup = page('児童手当', '手当を支給します。', current=1)
+    headers, tags = scan_page(soup, template)
+    assert texts(headers) == ['児童手当']
+    assert texts(tags) == ['児童手当', '手当を支給します。', '児童手当の詳細']
+
+    # テンプレートを使わなければ、ヘッダー・メニュー・フッターも対象になる
+    headers, tags = scan_page(soup)
+    assert texts(headers) == ['児童手当']
+    assert '荒尾市' in texts(tags) and 'メニュー0' in texts(tags)
+
+
+def test_changed_block_is_kept():
+    template = learn(SAMPLES).get('https://www.city.arao.lg.jp/new.html')
+    _, tags = scan_page(page('児童手当', '本文', footer='荒尾市役所 臨時休庁のお知らせ'), template)
+    assert '荒尾市役所 臨時休庁のお知らせ' in texts(tags)
+    assert '荒尾市' not in texts(tags)
+
+
+def test_headers_outside_template_without_main_div():
+    template = learn(SAMPLES).get('https://www.city.arao.lg.jp/new.html')
+    headers, tags = scan_page(page('児童手当', '本文', main_id='main'), template)
+    assert texts(headers) == ['児童手当']
+    assert scan_page(page('児童手当', '本文', main_id='main'))[0] is None
+
+
+def test_hosts_and_min_pages():
+    templates = learn(SAMPLES[:2])
+    assert not templates.get('https://www.city.arao.lg.jp/').blocks  # min_pages未満
+    assert templates.get('https://other.example.jp/') is None
+
+
+def test_subtree_hash_ignores_attributes_and_whitespace():
+    a = BeautifulSoup('<div id="a"><p class="x">本文  です</p><script>var t = 1;</script></div>', 'html.parser').div
+    b = BeautifulSoup('<div id="b"><p>本文\nです</p><script>var t = 2;</script></div>', 'html.parser').div
+    c = BeautifulSoup('<div id="a"><p>本文です</p></div>', 'html.parser').div
+    assert subtree_hash(a, {}) == subtree_hash(b, {}) != subtree_hash(c, {})
+    assert subtree_hash(BeautifulSoup('<div><p> </p></div>', 'html.parser').div, {}) is None
+
+
+def test_save_and_load(tmp_path):
+    templates = learn(SAMPLES)
+    path = str(tmp_path / 'template' / 'templates.json')
+    templates.save(path)
+    loaded = TemplateSet.load(path).get('https://www.city.arao.lg.jp/')
+    template = templates.get('https://www.city.arao.lg.jp/')
+    assert loaded.to_dict() == template.to_dict()
+    assert PageTemplate.from_dict({}).to_dict() == {'locators': [], 'blocks': []}
@@ -0,0 +1,135 @@
+import os
+import pytest
+from part_download import fetch_to_part_file, parse_content_range, part_validator, validator_path
+
+
+BODY = b'0123456789' * 10
+
+
+class Response:
+    def __init__(self, status_code, headers, body=b''):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+
+class Session:
+    """Range / If-Rangeに対応したサーバー。If-RangeがETagと一致しない場合は全体（200）を返す"""
+
+    def __init__(self, etag='"v1"', body=BODY):
+        self.etag = etag
+        self.body = body
+        self.sent = []
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        self.sent.append(dict(headers))
+        ranged = headers.get('Range')
+        if ranged and headers.get('If-Range') == self.etag:
+            offset = int(ranged[len('bytes='):-1])
+            if offset >= len(self.body):
+                return Response(416, {'Content-Range': f'bytes */{len(self.body)}'})
+            return Response(206, {'Content-Range': f'bytes {offset}-{len(self.body) - 1}/{len(self.body)}',
+                                  'ETag': self.etag}, self.body[offset:])
+        return Response(200, {'ETag': self.etag}, self.body)
+
+
+@pytest.fixture
+def part_path(tmp_path):
+    return str(tmp_path / 'data.csv.part')
+
+
+def write_part(part_path, body, validator=None):
+    with open(part_path, 'wb') as file:
+        file.write(body)
+    if validator is not None:
+        with open(validator_path(part_path), 'w') as file:
+            file.write(validator)
+
+
+def read(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def test_helpers():
+    assert part_validator({'ETag': '"abc"', 'Last-Modified': 'x'}) == '"abc"'
+    assert part_validator({'ETag': 'W/"abc"', 'Last-Modified': 'x'}) == 'x'
+    assert parse_content_range('bytes 10-99/100') == (10, 100)
+    assert parse_content_range('bytes */100') == (None, 100)
+    assert parse_content_range(None) == (None, None)
+
+
+def test_fresh_download_records_validator(part_path):
+    session = Session()
+    status, _ = fetch_to_part_file(session, 'u', part_path, {'If-None-Match': '"old"'})
+    assert status == 200
+    assert read(part_path) == BODY
+    assert read(validator_path(part_path)) == b'"v1"'
+    assert session.sent == [{'If-None-Match': '"old"'}]
+
+
+def test_resume_with_range(part_path):
+    write_part(part_path, BODY[:30], '"v1"')
+    session = Session()
+    status, _ = fetch_to_part_file(session, 'u', part_path)
+    assert status == 206
+    assert read(part_path) == BODY
+    assert session.sent == [{'Range': 'bytes=30-', 'If-Range': '"v1"'}]
+
+
+def test_changed_file_restarts_from_scratch(part_path):
+    write_part(part_path, b'x' * 30, '"v0"')
+    status, _ = fetch_to_part_file(Session(), 'u', part_path)
+    assert status == 200
+    assert read(part_path) == BODY
+
+
+def test_part_without_validator_is_discarded(part_path):
+    write_part(part_path, b'x' * 30)
+    session = Session()
+    fetch_to_part_file(session, 'u', part_path)
+    assert read(part_path) == BODY
+    assert session.sent == [{}]
+
+
+def test_416_completes_only_when_length_matches(part_path):
+    write_part(part_path, BODY, '"v1"')
+    status, _ = fetch_to_part_file(Session(), 'u', part_path)
+    assert status == 416
+    assert read(part_path) == BODY
+
+    # .partが全体より長い場合は取得し直す
+    write_part(part_path, BODY + b'zz', '"v1"')
+    session = Session()
+    status, _ = fetch_to_part_file(session, 'u', part_path)
+    assert status == 200
+    assert read(part_path) == BODY
+    assert len(session.sent) == 2
+
+
+def test_range_at_wrong_offset_restarts(part_path):
+    class WrongOffsetSession(Session):
+        def get(self, url, headers=None, stream=False, timeout=None):
+            if headers.get('Range'):
+                self.sent.append(dict(headers))
+                return Response(206, {'Content-Range': 'bytes 0-99/100', 'ETag': self.etag}, self.body)
+            return super().get(url, headers, stream, timeout)
+
+    write_part(part_path, BODY[:30], '"v1"')
+    fetch_to_part_file(WrongOffsetSession(), 'u', part_path)
+    assert read(part_path) == BODY
+    assert os.path.exists(validator_path(part_path))
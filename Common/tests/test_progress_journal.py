@@ -0,0 +1,62 @@
+import os
+import json
+import pytest
+from progress_journal import ProgressJournal, load_progress, journal_path
+
+
+def test_missing_progress_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_progress(str(tmp_path / 'progress.json'))
+    assert ProgressJournal(str(tmp_path / 'progress.json')).load() == {}
+
+
+def test_journal_is_replayed_without_close(tmp_path):
+    progress_file = str(tmp_path / 'progress.json')
+    journal = ProgressJournal(progress_file)
+    journal.record_queued('https://example.jp/', 0)
+    journal.record_queued('https://example.jp/a', 1)
+    journal.record_visited('https://example.jp/', 'output/top.html')
+    journal.record_validators('https://example.jp/', {'etag': '"1"'})
+    journal.record_changed('https://example.jp/')
+    # 中断された場合と同じく、closeせずに読み込む（追記ごとにflushされている）
+    assert load_progress(progress_file) == {
+        'visited': {'https://example.jp/': 'output/top.html'},
+        'to_visit': ['https://example.jp/a'],
+        'to_visit_depth': [1],
+        'validators': {'https://example.jp/': {'etag': '"1"'}},
+        'changed': ['https://example.jp/'],
+    }
+    journal.close()
+
+
+def test_journal_is_applied_on_top_of_progress_json(tmp_path):
+    progress_file = str(tmp_path / 'progress.json')
+    with open(progress_file, 'w') as file:
+        json.dump({'visited': {'https://example.jp/': 'top.html'},
+                   'to_visit': ['https://example.jp/a', 'https://example.jp/b'], 'to_visit_depth': [1, 1]}, file)
+    journal = ProgressJournal(progress_file)
+    journal.record_visited('https://example.jp/a', 'a.html')
+    journal.record_queued('https://example.jp/', 2)  # 取得済みのURLは再びキューに入れない
+    journal.close()
+    # 書き込み途中で中断された最終行は無視する
+    with open(journal_path(progress_file), 'a') as file:
+        file.write('{"visited": ["https://example.jp/b"')
+    progress = load_progress(progress_file)
+    assert progress['visited'] == {'https://example.jp/': 'top.html', 'https://example.jp/a': 'a.html'}
+    assert progress['to_visit'] == ['https://example.jp/b']
+
+
+def test_compaction_every_n_pages(tmp_path):
+    progress_file = str(tmp_path / 'progress.json')
+    journal = ProgressJournal(progress_file, compact_every=2)
+    journal.record_queued('https://example.jp/a', 1)
+    journal.record_visited('https://example.jp/', 'top.html')
+    # キューへの追加はページ数に数えない
+    assert not journal.needs_compaction()
+    journal.record_visited('https://example.jp/a', 'a.html')
+    assert journal.needs_compaction()
+    journal.compact(load_progress(progress_file))
+    assert not journal.needs_compaction()
+    assert not os.path.exists(journal_path(progress_file))
+    assert load_progress(progress_file)['visited'] == {'https://example.jp/': 'top.html',
+                                                      'https://example.jp/a': 'a.html'}
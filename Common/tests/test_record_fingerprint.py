@@ -0,0 +1,71 @@
+import json
+import random
+import pytest
+from record_fingerprint import Deduplicator, fingerprint, record_signature, simhash
+
+
+VALUES = [
+    {'a': 1, 'b': [1, 2]}, {'b': [1, 2], 'a': 1}, {'a': 1, 'b': [2, 1]},
+    ['ab'], ['a', 'b'], ['a,b'], 'ab',
+    1, 1.0, True, '1', None, 'null', [], {}, [[]], [{}],
+    {'1': 'x'}, {1: 'x'}, {'a': {'b': 'c'}}, {'a': 'b', 'c': None}, {'ab': 'c'},
+    {'サービス名': '児童手当', '詳細': [{'窓口': '子育て支援課'}]},
+]
+
+
+def distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def test_fingerprint_matches_canonical_json():
+    # json.dumps(sort_keys=True)が同じ値だけが同じフィンガープリントになる
+    for a in VALUES:
+        for b in VALUES:
+            same_json = json.dumps(a, sort_keys=True) == json.dumps(b, sort_keys=True)
+            assert (fingerprint(a) == fingerprint(b)) == same_json, (a, b)
+    assert len(fingerprint(VALUES[0])) == 32
+
+
+def test_exact_dedup():
+    dedup = Deduplicator()
+    assert [dedup.add_record(value) for value in VALUES[:3]] == [True, False, True]
+
+
+def test_near_dedup_index_matches_brute_force():
+    rng = random.Random(0)
+    max_distance = 3
+    dedup = Deduplicator('near', max_distance)
+    kept = []
+    base = [rng.getrandbits(64) for _ in range(20)]
+    for i in range(500):
+        value = rng.choice(base)
+        for _ in range(rng.randint(0, 6)):
+            value ^= 1 << rng.randrange(64)
+        expected = all(distance(value, other) > max_distance for other in kept)
+        assert dedup.add((f'fp{i}', value)) == expected
+        if expected:
+            kept.append(value)
+
+
+def test_near_duplicate_records():
+    text = '児童手当は、中学校修了前の児童を養育している方に支給します。申請は子育て支援課の窓口で受け付けます。' * 3
+    record = {'サービス名': '児童手当', '概要': text, 'url': 'https://example.jp/a.html'}
+    edited = dict(record, 概要=text + '（更新）', url='https://example.jp/b.html')
+    other = {'サービス名': '粗大ごみ', '概要': '粗大ごみの収集は電話かインターネットで予約してください。' * 3}
+    assert distance(simhash(record, ('url',)), simhash(edited, ('url',))) < distance(simhash(record), simhash(other))
+
+    dedup = Deduplicator('near', 6)
+    assert dedup.add(dedup.signature(record, ('url',)))
+    assert not dedup.add(dedup.signature(record, ('url',)))
+    assert not dedup.add(dedup.signature(dict(record, url='https://example.jp/c.html'), ('url',)))
+    assert dedup.add(dedup.signature(other))
+
+
+def test_signature_and_mode():
+    record = {'サービス名': '児童手当', 'url': 'a'}
+    assert record_signature(record) == fingerprint(record)
+    fp, value = record_signature(record, 'near', ('url',))
+    assert fp == fingerprint(record) and value == simhash({'サービス名': '児童手当'})
+    assert simhash({}) == 0
+    with pytest.raises(ValueError):
+        Deduplicator('fuzzy')
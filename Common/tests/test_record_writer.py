@@ -0,0 +1,72 @@
+import json
+import pytest
+from record_writer import RecordWriter, iter_records
+
+
+RECORDS = [
+    {'サービス名': '児童手当', '金額': 15000, '対象': ['3歳未満', '中学生'], '備考': None},
+    {'サービス名': '粗大ごみ', '金額': 1.5e3, '詳細': {'窓口': '清掃課', '電話': '03-1234-5678'}, '有料': True},
+    [],
+    {},
+    12345678901234567890,
+    '改行\nを含む文字列',
+]
+
+
+def read(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+@pytest.mark.parametrize('indent', [4, 2, None, '\t'])
+@pytest.mark.parametrize('records', [RECORDS, []])
+def test_json_matches_json_dump(tmp_path, records, indent):
+    path = str(tmp_path / 'out.json')
+    with RecordWriter(path, indent=indent) as writer:
+        for record in records:
+            writer.write(record)
+    assert read(path) == json.dumps(records, ensure_ascii=False, indent=indent)
+    assert list(iter_records(path)) == records
+
+
+def test_jsonl(tmp_path):
+    path = str(tmp_path / 'out.jsonl')
+    with RecordWriter(path) as writer:
+        for record in RECORDS:
+            writer.write(record)
+    assert read(path) == ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in RECORDS)
+    assert list(iter_records(path)) == RECORDS
+
+
+@pytest.mark.parametrize('output_format', ['json', 'jsonl'])
+def test_iter_records_across_chunks(tmp_path, output_format):
+    # チャンクの境界でレコードや数値が切れる場合も、全体をjson.loadした結果と同じになる
+    records = [{'id': i, 'text': '項目' * (i % 7)} for i in range(200)] + [123456789, 0.125, 'end']
+    path = str(tmp_path / f'out.{output_format}')
+    with RecordWriter(path, output_format) as writer:
+        for record in records:
+            writer.write(record)
+    for chunk_size in (1, 3, 16, 1 << 16):
+        assert list(iter_records(path, chunk_size=chunk_size)) == records
+
+
+def test_abort_keeps_previous_output(tmp_path):
+    path = str(tmp_path / 'out.json')
+    with RecordWriter(path) as writer:
+        writer.write({'id': 1})
+    with pytest.raises(RuntimeError):
+        with RecordWriter(path) as writer:
+            writer.write({'id': 2})
+            raise RuntimeError('failed')
+    assert list(iter_records(path)) == [{'id': 1}]
+    assert not (tmp_path / 'out.json.tmp').exists()
+
+
+def test_iter_records_rejects_broken_array(tmp_path):
+    path = tmp_path / 'out.json'
+    path.write_text('{"id": 1}', encoding='utf-8')
+    with pytest.raises(ValueError):
+        list(iter_records(str(path)))
+    path.write_text('[{"id": 1},', encoding='utf-8')
+    with pytest.raises(ValueError):
+        list(iter_records(str(path)))
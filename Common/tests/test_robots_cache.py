@@ -0,0 +1,71 @@
+import pytest
+
+pytest.importorskip('requests')
+import robots_cache
+from robots_cache import RobotsCache
+
+
+ROBOTS_TXT = "User-agent: *\nDisallow: /private/\nCrawl-delay: 3\n"
+
+
+class Response:
+    def __init__(self, status_code, text=''):
+        self.status_code = status_code
+        self.content = text.encode('utf-8')
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    """robots.txtの取得をURLごとに記録し、statusesの値（既定は200）で応答する"""
+    calls = []
+    statuses = {}
+
+    def get(url, headers=None, timeout=None):
+        calls.append(url)
+        return Response(statuses.get(url, 200), ROBOTS_TXT)
+
+    monkeypatch.setattr(robots_cache.requests, 'get', get)
+    return calls, statuses
+
+
+def test_robots_txt_is_fetched_once_per_host(fetched):
+    calls, _ = fetched
+    cache = RobotsCache('test')
+    assert cache.can_fetch('https://example.jp/a.html')
+    assert not cache.can_fetch('https://example.jp/private/b.html')
+    assert cache.crawl_delay('https://example.jp/c.html') == 3.0
+    assert cache.can_fetch('https://other.jp/a.html')
+    assert calls == ['https://example.jp/robots.txt', 'https://other.jp/robots.txt']
+
+
+def test_expired_entry_is_fetched_again(fetched, monkeypatch):
+    calls, _ = fetched
+    cache = RobotsCache('test', ttl=60)
+    cache.can_fetch('https://example.jp/')
+    now = robots_cache.time.time()
+    monkeypatch.setattr(robots_cache.time, 'time', lambda: now + 61)
+    cache.can_fetch('https://example.jp/')
+    assert len(calls) == 2
+
+
+def test_cache_file_is_reused_on_restart(fetched, tmp_path):
+    calls, _ = fetched
+    cache_file = str(tmp_path / 'progress.robots.json')
+    cache = RobotsCache('test', cache_file)
+    cache.can_fetch('https://example.jp/')
+    cache.save()
+    restarted = RobotsCache('test', cache_file)
+    assert not restarted.can_fetch('https://example.jp/private/')
+    assert len(calls) == 1
+
+
+def test_status_codes_follow_robotparser(fetched):
+    _, statuses = fetched
+    statuses['https://missing.jp/robots.txt'] = 404
+    statuses['https://forbidden.jp/robots.txt'] = 403
+    statuses['https://down.jp/robots.txt'] = 503
+    cache = RobotsCache('test')
+    assert cache.can_fetch('https://missing.jp/private/')
+    assert not cache.can_fetch('https://forbidden.jp/')
+    # 取得できるまではクロールを控える
+    assert not cache.can_fetch('https://down.jp/')
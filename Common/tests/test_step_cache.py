@@ -0,0 +1,94 @@
+import sys
+import importlib
+import pytest
+from step_factory import StepFactory
+from step_scheduler import StepScheduler
+from step_cache import StepCache, imported_names, project_sources
+
+
+STEP_SOURCE = '''
+from cache_test_helper import SUFFIX
+
+
+class CacheTestStep:
+    runs = 0
+
+    def __init__(self, step_config):
+        self.step_config = step_config
+
+    def execute(self):
+        CacheTestStep.runs += 1
+        with open(self.step_config['inputs'][0]) as src, open(self.step_config['outputs'][0], 'w') as dst:
+            dst.write(src.read() + SUFFIX)
+'''
+
+
+@pytest.fixture
+def step_module(tmp_path, monkeypatch):
+    """ステップ本体と、そこからimportする部品をtmp_pathに置いて登録する"""
+    (tmp_path / 'cache_test_step.py').write_text(STEP_SOURCE)
+    (tmp_path / 'cache_test_helper.py').write_text("SUFFIX = '!'\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    for name in ('cache_test_step', 'cache_test_helper'):
+        sys.modules.pop(name, None)
+    module = importlib.import_module('cache_test_step')
+    StepFactory.register_step('cache_test_step', module.CacheTestStep)
+    (tmp_path / 'input.txt').write_text('data')
+    yield module.CacheTestStep
+    for name in ('cache_test_step', 'cache_test_helper'):
+        sys.modules.pop(name, None)
+
+
+def run(config, cache_file='step_cache.json'):
+    StepScheduler([dict(config)], cache=StepCache(cache_file)).run()
+
+
+def config(**options):
+    return dict(name='copy', type='cache_test_step', inputs=['input.txt'], outputs=['output.txt'], **options)
+
+
+def test_imported_names():
+    names = imported_names("import a.b\nfrom lib import htag_node\nfrom . import local\ndef f():\n    import lazy\n")
+    assert {'a.b', 'lib', 'lib.htag_node', 'lazy'} <= names
+    assert 'local' not in names
+
+
+def test_project_sources_include_imported_components(step_module):
+    assert [name for name, _ in project_sources('cache_test_step')] == ['cache_test_helper', 'cache_test_step']
+
+
+def test_unchanged_step_is_skipped(step_module):
+    run(config())
+    run(config())
+    assert step_module.runs == 1
+
+
+def test_input_change_reruns_step(step_module, tmp_path):
+    run(config())
+    (tmp_path / 'input.txt').write_text('changed')
+    run(config())
+    assert step_module.runs == 2
+    assert (tmp_path / 'output.txt').read_text() == 'changed!'
+
+
+def test_config_change_and_missing_output_rerun_step(step_module, tmp_path):
+    run(config())
+    run(config(option=1))
+    assert step_module.runs == 2
+    (tmp_path / 'output.txt').unlink()
+    run(config(option=1))
+    assert step_module.runs == 3
+
+
+def test_imported_component_change_reruns_step(step_module, tmp_path):
+    run(config())
+    (tmp_path / 'cache_test_helper.py').write_text("SUFFIX = '?'\n")
+    run(config())
+    assert step_module.runs == 2
+
+
+def test_cache_no_always_runs(step_module):
+    run(config(cache=False))
+    run(config(cache=False))
+    assert step_module.runs == 2
@@ -0,0 +1,90 @@
+import threading
+import pytest
+from step_factory import StepFactory
+from step_scheduler import StepScheduler, to_list
+
+
+events = []
+lock = threading.Lock()
+
+
+class RecordingStep:
+    def __init__(self, step_config):
+        self.name = step_config['name']
+
+    def execute(self):
+        with lock:
+            events.append(self.name)
+
+
+class FailingStep(RecordingStep):
+    def execute(self):
+        raise RuntimeError(f"{self.name} failed")
+
+
+StepFactory.register_step('test_recording_step', RecordingStep)
+StepFactory.register_step('test_failing_step', FailingStep)
+
+
+@pytest.fixture(autouse=True)
+def clear_events():
+    events.clear()
+
+
+def step(name, step_type='test_recording_step', **options):
+    return dict(name=name, type=step_type, **options)
+
+
+def test_to_list():
+    assert to_list(None) == []
+    assert to_list("a, b,,c") == ['a', 'b', 'c']
+    assert to_list(['a']) == ['a']
+
+
+def test_dependencies_from_inputs_and_outputs():
+    steps = [
+        step('fetch', outputs=['./raw']),
+        step('parse_a', inputs=['./raw'], outputs=['./a.json']),
+        step('parse_b', inputs='./raw', outputs='./b.json'),
+        step('merge', inputs=['./a.json', './b.json'], outputs=['./merged.json']),
+    ]
+    scheduler = StepScheduler(steps, max_workers=4)
+    assert scheduler.dependencies == {
+        'fetch': set(),
+        'parse_a': {'fetch'},
+        'parse_b': {'fetch'},
+        'merge': {'parse_a', 'parse_b'},
+    }
+    scheduler.run()
+    assert events[0] == 'fetch'
+    assert events[-1] == 'merge'
+    assert sorted(events[1:3]) == ['parse_a', 'parse_b']
+
+
+def test_undeclared_step_waits_for_all_previous_steps():
+    steps = [step('a', outputs=['./a']), step('b', outputs=['./b']), step('legacy'), step('c', depends_on=['legacy'])]
+    scheduler = StepScheduler(steps, max_workers=4)
+    assert scheduler.dependencies['legacy'] == {'a', 'b'}
+    scheduler.run()
+    assert events.index('legacy') > max(events.index('a'), events.index('b'))
+    assert events[-1] == 'c'
+
+
+def test_skipped_dependency_is_treated_as_done():
+    steps = [step('a', skip_flg=True), step('b', depends_on=['a'])]
+    StepScheduler(steps).run()
+    assert events == ['b']
+
+
+def test_cycle_and_unknown_dependency_are_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        StepScheduler([step('a', depends_on=['b']), step('b', depends_on=['a'])])
+    with pytest.raises(ValueError, match="unknown"):
+        StepScheduler([step('a', depends_on=['missing'])])
+
+
+def test_failure_stops_dependent_steps():
+    steps = [step('a', 'test_failing_step', outputs=['./a']), step('b', inputs=['./a'])]
+    with pytest.raises(RuntimeError, match="a failed"):
+        StepScheduler(steps, max_workers=2).run()
+    assert events == []
@@ -0,0 +1,43 @@
+from url_frontier import UrlFrontier, normalize_url
+
+
+def test_normalize_url():
+    assert normalize_url('HTTPS://Example.JP:443/a/?b=2&a=1#top') == 'https://example.jp/a?a=1&b=2'
+    assert normalize_url('http://example.jp') == 'http://example.jp/'
+    assert normalize_url('http://example.jp:8080/') == 'http://example.jp:8080/'
+
+
+def test_duplicates_are_queued_once():
+    frontier = UrlFrontier()
+    assert frontier.push('https://example.jp/a.html#top') == 'https://example.jp/a.html'
+    assert frontier.push('https://EXAMPLE.jp/a.html') is None
+    assert frontier.push('https://example.jp/b.html', 1) == 'https://example.jp/b.html'
+    assert len(frontier) == 2
+    assert frontier.pop() == ('https://example.jp/a.html', 0)
+    # 取り出した後も既出として扱う
+    assert frontier.push('https://example.jp/a.html') is None
+
+
+def test_mark_seen_skips_visited_urls():
+    frontier = UrlFrontier()
+    frontier.mark_seen('https://example.jp/a.html')
+    assert frontier.push('https://example.jp/a.html/') is None
+    assert not frontier
+
+
+def test_prioritize_depth_pops_shallow_urls_in_insertion_order():
+    frontier = UrlFrontier(prioritize_depth=True)
+    for url, depth in (('https://example.jp/deep', 2), ('https://example.jp/b', 1), ('https://example.jp/c', 1)):
+        frontier.push(url, depth)
+    assert [frontier.pop() for _ in range(3)] == [('https://example.jp/b', 1), ('https://example.jp/c', 1),
+                                                  ('https://example.jp/deep', 2)]
+
+
+def test_progress_round_trip():
+    frontier = UrlFrontier()
+    frontier.push('https://example.jp/a', 0)
+    frontier.push('https://example.jp/b', 2)
+    urls, depths = frontier.to_progress()
+    restored = UrlFrontier()
+    restored.load_progress(urls, depths)
+    assert restored.to_progress() == (urls, depths) == (['https://example.jp/a', 'https://example.jp/b'], [0, 2])
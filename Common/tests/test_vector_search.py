@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from vector_store import save_vectors
+from vector_search import IVFIndex, VectorIndex, load_index, top_k
+
+
+def clustered(count=2000, dim=16, centers=20, seed=0):
+    """概要のベクトルを模した、いくつかの話題のまわりに集まるベクトル"""
+    rng = np.random.default_rng(seed)
+    base = rng.standard_normal((centers, dim))
+    return (base[rng.integers(centers, size=count)] + 0.3 * rng.standard_normal((count, dim))).astype(np.float32)
+
+
+def brute_force(embeddings, queries, k):
+    """従来の方法（1件ずつコサイン類似度を計算して並べ替える）"""
+    results = []
+    for query in queries:
+        scores = [float(np.dot(query, vector) / (np.linalg.norm(query) * np.linalg.norm(vector))) for vector in embeddings]
+        results.append(sorted(range(len(scores)), key=lambda i: -scores[i])[:k])
+    return results
+
+
+def test_top_k_is_sorted_and_exact():
+    scores = np.random.default_rng(0).random((5, 50)).astype(np.float32)
+    for k in (1, 10, 50, 80):
+        indices, values = top_k(scores, k)
+        assert indices.shape == (5, min(k, 50))
+        np.testing.assert_array_equal(values, -np.sort(-scores, axis=1)[:, :min(k, 50)])
+        np.testing.assert_array_equal(np.take_along_axis(scores, indices, axis=1), values)
+    assert top_k(scores, 0)[0].shape == (5, 0)
+
+
+def test_vector_index_matches_brute_force():
+    embeddings = clustered(300)
+    queries = clustered(20, seed=1)
+    index = VectorIndex(embeddings, batch_size=7)
+    indices, scores = index.search_batch(queries, k=5)
+    assert indices.tolist() == brute_force(embeddings, queries, 5)
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+
+def test_entries_and_zero_vectors():
+    entries = [{'formal_name': name} for name in ('児童手当', '粗大ごみ', '保育園')]
+    index = VectorIndex(np.array([[1, 0], [0, 1], [0, 0]], dtype=np.float32), entries)
+    results = index.search([2, 0.1], k=2)
+    assert [entry['formal_name'] for entry, _ in results] == ['児童手当', '粗大ごみ']
+    assert index.search_batch(np.zeros((0, 2)), k=2)[0].shape == (0, 2)
+
+
+def test_ivf_recall():
+    embeddings = clustered()
+    queries = clustered(50, seed=1)
+    exact, _ = VectorIndex(embeddings).search_batch(queries, k=10)
+    approximate, scores = IVFIndex(embeddings, n_probe=8).search_batch(queries, k=10)
+    recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(exact, approximate)])
+    assert recall >= 0.9
+    assert np.all(np.diff(scores, axis=1) <= 0)
+    # 全クラスタを比較すれば全件検索と同じ結果になる
+    ivf = IVFIndex(embeddings, n_lists=10, n_probe=10)
+    np.testing.assert_array_equal(ivf.search_batch(queries, k=10)[0], exact)
+
+
+def test_ivf_fills_k_from_small_lists():
+    # クラスタが小さく、n_probe個のクラスタではk件に満たない場合も、次に近いクラスタからk件を集める
+    embeddings = clustered(100, centers=50)
+    index = IVFIndex(embeddings, n_lists=50, n_probe=1)
+    indices, _ = index.search_batch(clustered(10, seed=1), k=20)
+    assert indices.shape == (10, 20)
+    assert all(len(set(row)) == 20 for row in indices.tolist())
+
+
+@pytest.mark.parametrize('approximate', [False, True])
+def test_load_index(tmp_path, approximate):
+    embeddings = clustered(200)
+    entries = [{'url': f'https://example.jp/{i}.html'} for i in range(200)]
+    path = save_vectors(str(tmp_path / 'catalog.npy'), embeddings, entries)
+    index = load_index(path, approximate)
+    assert isinstance(index, IVFIndex) == approximate
+    (entry, score), = index.search(embeddings[42], k=1)
+    assert entry == entries[42] and score == pytest.approx(1.0, abs=1e-5)
@@ -0,0 +1,79 @@
+import os
+import shutil
+import numpy as np
+import pytest
+from vector_store import VectorStore, load_vectors, save_vectors, vector_paths
+
+
+ENTRIES = [{'overview': f'概要{i}', 'formal_name': f'サービス{i}', 'url': f'https://example.jp/{i}.html'} for i in range(5)]
+
+
+@pytest.fixture
+def embeddings():
+    return np.random.default_rng(0).standard_normal((5, 8)).astype(np.float32)
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_npy_round_trip(tmp_path, embeddings, mmap):
+    path = str(tmp_path / 'vectors' / 'catalog.json')
+    # 拡張子が.jsonでも、指定すればnpyで保存できる
+    matrix_path = save_vectors(path, embeddings, ENTRIES, 'npy')
+    assert matrix_path == str(tmp_path / 'vectors' / 'catalog.npy')
+    for name in (path, matrix_path):
+        store = load_vectors(name, mmap=mmap, verify=True)
+        np.testing.assert_array_equal(store.embeddings, embeddings)
+        assert store.entries == ENTRIES and len(store) == 5 and store.dim == 8
+        assert isinstance(store.embeddings, np.memmap) == mmap
+
+
+def test_legacy_json_round_trip(tmp_path, embeddings):
+    path = str(tmp_path / 'catalog.json')
+    save_vectors(path, embeddings, ENTRIES)
+    assert not os.path.exists(vector_paths(path)[0])
+    store = load_vectors(path)
+    np.testing.assert_allclose(store.embeddings, embeddings)
+    assert store.entries == ENTRIES
+
+
+def test_float16(tmp_path, embeddings):
+    path = save_vectors(str(tmp_path / 'catalog.npy'), embeddings, ENTRIES, dtype='float16')
+    store = load_vectors(path)
+    assert store.embeddings.dtype == np.float16
+    np.testing.assert_allclose(store.embeddings, embeddings, rtol=1e-3, atol=1e-3)
+
+
+def test_matrix_from_another_run_is_detected(tmp_path, embeddings):
+    path = str(tmp_path / 'catalog.npy')
+    save_vectors(path, embeddings, ENTRIES)
+    entries_path = vector_paths(path)[1]
+    shutil.copy(entries_path, str(tmp_path / 'old.entries.json'))
+    # 別の回の保存で行列だけが置き換わった場合（形が同じでも内容の違いを更新時刻から検出する）
+    save_vectors(path, embeddings[::-1], ENTRIES)
+    shutil.copy(str(tmp_path / 'old.entries.json'), entries_path)
+    with pytest.raises(ValueError, match='different run'):
+        load_vectors(path, verify=True)
+    # 更新時刻の分解能が粗いファイルシステムでも記録と違う時刻になるようにする
+    os.utime(path, ns=(1, 1))
+    with pytest.raises(ValueError, match='different run'):
+        load_vectors(path)
+    # 形が違う場合
+    save_vectors(path, embeddings[:3], ENTRIES[:3])
+    shutil.copy(str(tmp_path / 'old.entries.json'), entries_path)
+    with pytest.raises(ValueError, match='shape'):
+        load_vectors(path)
+
+
+def test_copied_files_are_verified_by_digest(tmp_path, embeddings):
+    path = save_vectors(str(tmp_path / 'a' / 'catalog.npy'), embeddings, ENTRIES)
+    os.makedirs(tmp_path / 'b')
+    for source in vector_paths(path):
+        shutil.copy(source, str(tmp_path / 'b'))
+    copied = str(tmp_path / 'b' / 'catalog.npy')
+    # コピーで更新時刻が変わっても、内容が同じなら読み込める
+    os.utime(copied, ns=(1, 1))
+    np.testing.assert_array_equal(load_vectors(copied).embeddings, embeddings)
+
+
+def test_length_mismatch_raises(embeddings):
+    with pytest.raises(ValueError):
+        VectorStore(embeddings, ENTRIES[:2])
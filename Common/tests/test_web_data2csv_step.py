@@ -0,0 +1,52 @@
+import random
+import pytest
+from bs4 import BeautifulSoup
+from web_data2csv_step import PageProcessor
+
+
+def legacy_should_process(soup, include_keywords, exclude_keywords):
+    """従来の方法（見出しごとのfind_all_nextを連結したテキストでキーワードを調べる）"""
+    headers = soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+    if not headers:
+        return False
+    relevant_content = ''.join(str(sibling) for header in headers for sibling in header.find_all_next(string=True))
+    include_matches = [keyword for keyword in include_keywords if keyword in relevant_content]
+    exclude_matches = [keyword for keyword in exclude_keywords if keyword in relevant_content]
+    return bool(include_matches) and not bool(exclude_matches)
+
+
+def random_page(rng, alphabet):
+    parts = []
+    for _ in range(rng.randint(0, 6)):
+        text = ''.join(rng.choices(alphabet, k=rng.randint(0, 4)))
+        tag = rng.choice(['h2', 'h3', 'p', 'li', 'span'])
+        parts.append(f'<{tag}>{text}</{tag}>')
+    return BeautifulSoup(f'<html><body>{"".join(parts)}</body></html>', 'html.parser')
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_should_process_matches_legacy(seed):
+    rng = random.Random(seed)
+    # 少ない文字種の短いページで、見出しの接尾辞の継ぎ目をまたぐキーワードを多く作る
+    alphabet = list('手当税申請')
+    for _ in range(200):
+        include_keywords = [''.join(rng.choices(alphabet, k=rng.randint(1, 4))) for _ in range(rng.randint(0, 3))]
+        exclude_keywords = [''.join(rng.choices(alphabet, k=rng.randint(1, 4))) for _ in range(rng.randint(0, 2))]
+        processor = PageProcessor(None, include_keywords, exclude_keywords)
+        soup = random_page(rng, alphabet)
+        assert processor.should_process(soup) == legacy_should_process(soup, include_keywords, exclude_keywords), str(soup)
+
+
+def test_keyword_across_headings():
+    # 「税申請」は最後の文字列「税」と、2つ目の見出し以降の先頭「申請」の継ぎ目にだけ現れる
+    soup = BeautifulSoup('<h2>手当</h2><h3>申請</h3><p>税</p>', 'html.parser')
+    assert legacy_should_process(soup, ['税申請'], [])
+    assert PageProcessor(None, ['税申請'], []).should_process(soup)
+    assert not PageProcessor(None, ['税申請'], ['手当']).should_process(soup)
+
+
+def test_page_without_headings_or_include_keywords():
+    soup = BeautifulSoup('<p>手当の申請</p>', 'html.parser')
+    assert not PageProcessor(None, ['手当'], []).should_process(soup)
+    soup = BeautifulSoup('<h2>手当の申請</h2>', 'html.parser')
+    assert not PageProcessor(None, [], ['税']).should_process(soup)
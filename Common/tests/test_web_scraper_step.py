@@ -0,0 +1,146 @@
+import sys
+import json
+import types
+import pytest
+
+pytest.importorskip('requests')
+import web_scraper_step
+from robots_cache import RobotsCache
+from web_scraper_step import WebScraperStep
+
+
+START_URL = 'https://example.jp/'
+
+# URL -> (本文, ETag)
+SITE = {
+    'https://example.jp/': ('<a href="/a.html">a</a><a href="/b.html">b</a><a href="https://other.jp/">x</a>', '"root"'),
+    'https://example.jp/a.html': ('<a href="/b.html">b</a><a href="/c.html#top">c</a>', '"a"'),
+    'https://example.jp/b.html': ('<a href="/">top</a>', '"b"'),
+    'https://example.jp/c.html': ('<p>子育て支援</p>', '"c"'),
+}
+
+
+class FakeSite:
+    """SITEの内容を返す。If-None-MatchがETagと一致すれば304を返す"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+
+    def respond(self, url, headers):
+        self.requests.append((url, dict(headers or {})))
+        if url not in self.pages:
+            return 404, {}, b''
+        text, etag = self.pages[url]
+        if (headers or {}).get('If-None-Match') == etag:
+            return 304, {'ETag': etag}, b''
+        return 200, {'Content-Type': 'text/html; charset=utf-8', 'ETag': etag}, text.encode('utf-8')
+
+
+def sync_session(site):
+    class Response:
+        def __init__(self, url, headers):
+            self.status_code, self.headers, self.content = site.respond(url, headers)
+
+    class Session:
+        def __init__(self):
+            self.headers = {}
+
+        def get(self, url, headers=None, timeout=None):
+            return Response(url, headers)
+
+    return Session
+
+
+def fake_aiohttp(site):
+    """scrape_site_asyncが使うaiohttpの部分だけを持つモジュール"""
+
+    class Response:
+        def __init__(self, url, headers):
+            self.status, self.headers, self.body = site.respond(url, headers)
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *args):
+            return False
+
+        async def read(self):
+            return self.body
+
+    class ClientSession:
+        def __init__(self, **options):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *args):
+            return False
+
+        def get(self, url, headers=None):
+            return Response(url, headers)
+
+    return types.SimpleNamespace(TCPConnector=lambda **options: None, ClientTimeout=lambda **options: None,
+                                 ClientSession=ClientSession)
+
+
+@pytest.fixture
+def crawl(tmp_path, monkeypatch):
+    """FakeSiteに対してWebScraperStepを実行し、ステップを返す関数"""
+    output_dir = tmp_path / 'output'
+    monkeypatch.setenv('OUTPUT_DIR', str(output_dir))
+    monkeypatch.setattr(web_scraper_step.time, 'sleep', lambda seconds: None)
+    # robots.txtは404（すべて許可）とする
+    monkeypatch.setattr(RobotsCache, 'fetch', lambda self, url: {'status': 404, 'text': '', 'fetched_at': 0})
+
+    def run(site, crawl_mode='sync', **options):
+        monkeypatch.setattr(web_scraper_step.requests, 'Session', sync_session(site))
+        monkeypatch.setitem(sys.modules, 'aiohttp', fake_aiohttp(site))
+        step = WebScraperStep(dict(start_url=START_URL, user_agent='test', output_dir=str(output_dir),
+                                   progress_file=str(tmp_path / 'progress.json'), save_every=2,
+                                   crawl_mode=crawl_mode, request_delay=0, **options))
+        step.execute()
+        return step
+
+    return run
+
+
+@pytest.mark.parametrize('crawl_mode', ['sync', 'async'])
+def test_crawl_visits_each_same_host_page_once(crawl, crawl_mode):
+    site = FakeSite(SITE)
+    step = crawl(site, crawl_mode)
+    assert sorted(step.visited) == sorted(SITE)
+    assert sorted(url for url, _ in site.requests) == sorted(SITE)
+    with open(step.visited['https://example.jp/c.html'], encoding='utf-8') as file:
+        assert file.read() == SITE['https://example.jp/c.html'][0]
+
+
+def test_async_crawl_matches_sync_crawl(crawl, tmp_path):
+    sync_step = crawl(FakeSite(SITE), 'sync')
+    with open(tmp_path / 'progress.json') as file:
+        sync_progress = json.load(file)
+    (tmp_path / 'progress.json').unlink()
+    async_step = crawl(FakeSite(SITE), 'async', concurrency=3)
+    with open(tmp_path / 'progress.json') as file:
+        async_progress = json.load(file)
+    assert async_step.visited == sync_step.visited
+    assert async_progress['to_visit'] == sync_progress['to_visit'] == []
+    assert async_progress['validators'] == sync_progress['validators']
+
+
+@pytest.mark.parametrize('crawl_mode', ['sync', 'async'])
+def test_recrawl_uses_conditional_requests(crawl, tmp_path, crawl_mode):
+    crawl(FakeSite(SITE), crawl_mode)
+    pages = dict(SITE)
+    pages['https://example.jp/a.html'] = ('<a href="/b.html">b</a><p>更新</p>', '"a2"')
+    site = FakeSite(pages)
+    step = crawl(site, crawl_mode, recrawl=True)
+
+    sent = dict(site.requests)
+    assert sent['https://example.jp/b.html'] == {'If-None-Match': '"b"'}
+    assert sorted(step.visited) == ['https://example.jp/', 'https://example.jp/a.html', 'https://example.jp/b.html']
+    with open(tmp_path / 'progress.changed.json', encoding='utf-8') as file:
+        manifest = json.load(file)
+    # 変更されたページと、リンクが無くなって取得されなかったページ
+    assert manifest == {'changed': ['https://example.jp/a.html'], 'removed': ['https://example.jp/c.html']}
@@ -2,6 +2,7 @@ import MeCab
 import json
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.cluster import KMeans
+from record_writer import RecordWriter, iter_records
 
 japanese_stop_words = ['の', 'に', 'は', 'を', 'た', 'が']
 
@@ -10,33 +11,33 @@ class ExperimentalStepA:
         self.json_file_path = step_config.get('input_json_path', "./service.bk.json")
         self.output_json_path = step_config.get('output_json_path', "./service.json")
         self.n_clusters = step_config.get('n_clusters', 5)
+        # 出力形式（json / jsonl、省略時は拡張子から判断）と、書き出したサービスを標準出力にも表示するかどうか
+        self.output_format = step_config.get('output_format')
+        self.debug_print = step_config.get('debug_print', False) == True
 
     def mecab_tokenizer(self, text):
         m = MeCab.Tagger()
         return [token.split('\t')[0] for token in m.parse(text).split('\n') if token.strip() != 'EOS' and token.strip() != '']
 
     def execute_service_cluster(self):
-        self.data = self.load_json_data()
-        self.services = [item['service'] for item in self.data]
+        self.services = [item['service'] for item in self.load_json_data()]
         self.cluster_services(self.n_clusters)
         self.save_clustered_data_to_json(self.output_json_path)
 
     def execute(self):
-        self.data = self.load_json_data()
+        # クラスタリングに必要なテキストだけをメモリに持ち、サービス情報は書き出す際に読み直す
         self.details_texts = self.prepare_details_texts()
-        self.services = [item['service'] for item in self.data]
         self.cluster_services_based_on_details(self.n_clusters)
         self.save_clustered_data_to_json(self.output_json_path)
 
     def load_json_data(self):
-        """JSONファイルを読み込む"""
-        with open(self.json_file_path, 'r', encoding='utf-8') as file:
-            return json.load(file)
+        """JSONファイルからサービスを1件ずつ読み込む"""
+        return iter_records(self.json_file_path)
 
     def prepare_details_texts(self):
         """detailsからテキストデータを準備する"""
         details_texts = []
-        for item in self.data:
+        for item in self.load_json_data():
             details_text = ''
             for detail in item['details']:
                 if isinstance(detail, dict):
@@ -59,9 +60,8 @@ class ExperimentalStepA:
         
         clusters = model.predict(X)
         
-        # 元のデータにクラスタIDを追加
-        for item, cluster_id in zip(self.data, clusters):
-            item['cluster_id'] = int(cluster_id)
+        # 元のデータに追加するクラスタID（サービスの順）
+        self.cluster_ids = [int(cluster_id) for cluster_id in clusters]
     
     def cluster_services(self, n_clusters=5):
         """サービスをクラスタリングし、結果を元のデータに追加する"""
@@ -74,21 +74,25 @@ class ExperimentalStepA:
         
         clusters = model.predict(X)
         
-        # 元のデータにクラスタIDを追加
-        for item, cluster_id in zip(self.data, clusters):
-            item['cluster_id'] = int(cluster_id)
+        # 元のデータに追加するクラスタID（サービスの順）
+        self.cluster_ids = [int(cluster_id) for cluster_id in clusters]
 
     def save_clustered_data_to_json(self, output_json_path):
         """クラスタリング結果を含むデータをクラスター番号順にソートしてJSONファイルに保存する"""
-        sorted_data = sorted(self.data, key=lambda x: x['cluster_id'])
-        
-        with open(output_json_path, 'w', encoding='utf-8') as f:
-            json.dump(sorted_data, f, ensure_ascii=False, indent=4)
+        # 全件をメモリに持たずに並べ替えるため、クラスターごとに入力を読み直し、同じクラスター内は元の順で書き出す
+        with RecordWriter(output_json_path, self.output_format, indent=4, echo=self.debug_print) as writer:
+            for cluster_id in sorted(set(self.cluster_ids)):
+                for item, item_cluster_id in zip(self.load_json_data(), self.cluster_ids):
+                    if item_cluster_id == cluster_id:
+                        item['cluster_id'] = item_cluster_id
+                        writer.write(item)
     
     def save_clustered_data_to_json_bk(self, output_json_path):
         """クラスタリング結果を含むデータをJSONファイルに保存する"""
-        with open(output_json_path, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=4)
+        with RecordWriter(output_json_path, self.output_format, indent=4, echo=self.debug_print) as writer:
+            for item, cluster_id in zip(self.load_json_data(), self.cluster_ids):
+                item['cluster_id'] = cluster_id
+                writer.write(item)
 
     
 
@@ -2,6 +2,7 @@ import MeCab
 import json
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.cluster import KMeans
+from record_writer import RecordWriter, iter_records
 
 japanese_stop_words = ['の', 'に', 'は', 'を', 'た', 'が']
 
@@ -10,20 +11,22 @@ class ExperimentalStepB:
         self.json_file_path = step_config.get('input_json_path', "./service.bk.json")
         self.output_json_path = step_config.get('output_json_path', "./service.json")
         self.n_clusters = step_config.get('n_clusters', 5)
+        # 出力形式（json / jsonl、省略時は拡張子から判断）と、書き出したサービスを標準出力にも表示するかどうか
+        self.output_format = step_config.get('output_format')
+        self.debug_print = step_config.get('debug_print', False) == True
 
     def mecab_tokenizer(self, text):
         m = MeCab.Tagger()
         return [token.split('\t')[0] for token in m.parse(text).split('\n') if token.strip() != 'EOS' and token.strip() != '']
     def execute(self):
-        self.data = self.load_json_data()
-        self.services = [item['service'] for item in self.data]
+        # クラスタリングに必要なサービス名だけをメモリに持ち、サービス情報は書き出す際に読み直す
+        self.services = [item['service'] for item in self.load_json_data()]
         self.cluster_services(self.n_clusters)
         self.save_clustered_data_to_json(self.output_json_path)
 
     def load_json_data(self):
-        """JSONファイルを読み込む"""
-        with open(self.json_file_path, 'r', encoding='utf-8') as file:
-            return json.load(file)
+        """JSONファイルからサービスを1件ずつ読み込む"""
+        return iter_records(self.json_file_path)
     
     def cluster_services(self, n_clusters=5):
         """サービスをクラスタリングし、結果を元のデータに追加する"""
@@ -36,14 +39,15 @@ class ExperimentalStepB:
         
         clusters = model.predict(X)
         
-        # 元のデータにクラスタIDを追加
-        for item, cluster_id in zip(self.data, clusters):
-            item['cluster_id'] = int(cluster_id)
+        # 元のデータに追加するクラスタID（サービスの順）
+        self.cluster_ids = [int(cluster_id) for cluster_id in clusters]
     
     def save_clustered_data_to_json(self, output_json_path):
         """クラスタリング結果を含むデータをJSONファイルに保存する"""
-        with open(output_json_path, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=4)
+        with RecordWriter(output_json_path, self.output_format, indent=4, echo=self.debug_print) as writer:
+            for item, cluster_id in zip(self.load_json_data(), self.cluster_ids):
+                item['cluster_id'] = cluster_id
+                writer.write(item)
 
     
 
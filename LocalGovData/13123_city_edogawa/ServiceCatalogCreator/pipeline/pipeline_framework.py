@@ -1,5 +1,7 @@
 import sys
 from step_factory import StepFactory
+from step_scheduler import StepScheduler
+from step_cache import StepCache
 import yaml
 
 
@@ -29,14 +31,18 @@ def execute_pipeline(pipeline_config_path):
     with open(pipeline_config_path, 'r') as file:
         pipeline_config = yaml.safe_load(file)
 
-    for step_config in pipeline_config.get('steps', []):
-        # skip_flgがtrueとして評価されるかどうかをチェック
-        if step_config.get('skip_flg', False) == True:
-            print(f"Skipping step: {step_config['name']}")
-            continue
-
-        step = StepFactory.create_step(step_config['type'], step_config)
-        step.execute()
+    # outputsを宣言したステップは、設定・コード・入力ファイルに変更がなければ実行を省略する
+    cache_file = pipeline_config.get('step_cache', './.pipeline_cache.json')
+    cache = StepCache(cache_file) if cache_file else None
+
+    # 依存関係のないステップはmax_workersの範囲で並列に実行する（既定は1 = 従来どおりの逐次実行）
+    scheduler = StepScheduler(
+        pipeline_config.get('steps', []),
+        max_workers=pipeline_config.get('max_workers', 1),
+        executor=pipeline_config.get('executor', 'thread'),
+        cache=cache,
+    )
+    scheduler.run()
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
@@ -2,14 +2,25 @@ import os
 import json
 import yaml
 import hashlib
+from itertools import accumulate
 import pandas as pd
 from bs4 import BeautifulSoup
+from progress_journal import load_progress
+from page_executor import PageExecutor
+from keyword_matcher import KeywordMatcher
+
+# PageProcessor.keyword_matcherのラベル番号
+INCLUDE = 0
+EXCLUDE = 1
+
 
 class ColumnManager:
     def __init__(self, yaml_path):
         self.column_config = {}
         self.special_columns = {'名称': None}  # 特殊カラムの初期設定
         self.load_yaml(yaml_path)
+        # 列名ごとのキーワードを1つのオートマトンにまとめておく
+        self.column_matcher = KeywordMatcher(self.column_config)
 
     def load_yaml(self, yaml_path):
         try:
@@ -25,10 +36,8 @@ class ColumnManager:
         return any(text in values for values in self.column_config.values())
 
     def get_column_name(self, text):
-        for column, identifiers in self.column_config.items():
-            if any(identifier in text for identifier in identifiers):
-                return column
-        return None
+        # キーワードが部分一致した列のうち、columns.yamlで先に定義された列を返す
+        return self.column_matcher.first(text)
 
     def validate_table(self, table):
         found_columns = set(table.keys())
@@ -139,6 +148,117 @@ class HtmlConverter:
 
 
 
+class PageProcessor:
+    """
+    1ページ分の処理（読み込み → 解析 → キーワードチェック → HtmlConverter）
+    PageExecutorでワーカープロセスに渡せるよう、pickle可能なクラスにしている
+    """
+    def __init__(self, column_manager, include_keywords, exclude_keywords):
+        self.column_manager = column_manager
+        self.include_keywords = include_keywords
+        self.exclude_keywords = exclude_keywords
+        # include / exclude のキーワードをまとめて1回の走査で照合する（ラベル番号は INCLUDE / EXCLUDE）
+        self.keyword_matcher = KeywordMatcher({'include': include_keywords, 'exclude': exclude_keywords})
+
+    def __call__(self, url, filepath):
+        with open(filepath, 'r', encoding='utf-8') as file:
+            html_content = file.read()
+
+        soup = BeautifulSoup(html_content, 'html.parser')
+        # キーワードチェック
+        if not self.should_process(soup):
+            print(f'処理対象の単語がふくまれていません')
+            return None
+
+        try:
+            extractor = HtmlConverter(soup, url, self.column_manager)
+            extractor.display_tree()
+
+            #service_json = extractor.extract_tables()
+            #table_hash = self.generate_hash(service_json)
+            #if table_hash not in unique_hashes:
+            #    unique_hashes.add(table_hash)
+            #    unique_tables.append(service_json)
+        except ValueError as e:
+            print(f"Failed to parse table: {e}")
+            print(f"  error URL : {url}")
+        except IndexError as e:
+            print(f"Table format error: {e}")
+            print(f"  error URL : {url}")
+        return None
+
+    def should_process(self, soup):
+        headers = soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+
+        if not headers:
+            # 見出しタグがない場合、処理をおこなわない
+            return False
+        if not self.include_keywords:
+            # includeのキーワードがなければ必ず対象外になるため、テキストを見る必要はない
+            return False
+
+        # excludeのキーワードが見つかった時点で対象外として打ち切る
+        # excludeのキーワードがなければ、includeのキーワードが見つかった時点で打ち切る
+        include = False
+        for label_id in self.scan_relevant_content(headers):
+            if label_id == EXCLUDE:
+                return False
+            include = True
+            if not self.exclude_keywords:
+                break
+        return include
+
+    def scan_relevant_content(self, headers):
+        """
+        見出しごとに header.find_all_next(string=True) を連結したテキスト（従来のrelevant_content）について、
+        マッチしたキーワードのラベル番号を返すジェネレータ
+
+        従来のrelevant_contentは、最初の見出し以降のテキストTの接尾辞を見出しの数だけ連結したもので、
+        見出し数 × ページの長さの文字列になる。
+        接尾辞の中のマッチはTの中のマッチと同じため、Tを1回走査し、あとは接尾辞の継ぎ目の前後
+        （最長のキーワード長 - 1文字ずつ）だけを照合すれば、連結したテキストと同じキーワードが見つかる。
+        """
+        strings = headers[0].find_all_next(string=True)
+        texts = [str(string) for string in strings]
+        lengths = [0]
+        lengths.extend(accumulate(map(len, texts)))
+        text = ''.join(texts)
+        yield from self.keyword_matcher.scan(text)
+
+        width = self.keyword_matcher.max_length - 1
+        if width <= 0 or len(headers) == 1:
+            return
+
+        # 各見出しの後ろの文字列がTの何文字目から始まるかを、最初の見出し以降を1回たどって求める
+        string_ids = {id(string) for string in strings}
+        header_ids = {id(header) for header in headers[1:]}
+        offsets = [0]
+        count = 0
+        for element in headers[0].next_elements:
+            if id(element) in header_ids:
+                offsets.append(lengths[count])
+            elif id(element) in string_ids:
+                count += 1
+
+        # 継ぎ目の直前の width 文字（それまでの接尾辞の末尾）と直後の width 文字（以降の接尾辞の先頭）
+        size = len(text)
+        tails = []
+        tail = ''
+        for offset in offsets:
+            tail = (tail + text[max(offset, size - width):])[-width:]
+            tails.append(tail)
+        heads = [''] * len(offsets)
+        head = ''
+        for index in range(len(offsets) - 1, -1, -1):
+            offset = offsets[index]
+            head = (text[offset:offset + width] + head)[:width]
+            heads[index] = head
+
+        # 末尾が空の見出しが続く場合などは同じ範囲になるため、重複を除いて照合する
+        for window in dict.fromkeys(tails[index] + heads[index + 1] for index in range(len(offsets) - 1)):
+            yield from self.keyword_matcher.scan(window)
+
+
 class WebDataToCSVConvertStep:
     def __init__(self, step_config):
         self.progress_json_path = step_config['progress_file']
@@ -157,10 +277,14 @@ class WebDataToCSVConvertStep:
         self.exclude_keywords = [keyword.strip() for keyword in exclude_keywords.split(",")] if exclude_keywords else []
         print(f"include / exclude : {self.include_keywords} / {self.exclude_keywords}")
 
+        self.page_processor = PageProcessor(self.column_manager, self.include_keywords, self.exclude_keywords)
+        # workersを2以上にすると、ページ単位の処理をプロセスプールで並列に実行する
+        self.page_executor = PageExecutor(step_config.get('workers', 1), step_config.get('chunk_size', 32))
+
 
     def load_mapping(self):
-        with open(self.progress_json_path, 'r') as file:
-            data = json.load(file)
+        # progress.jsonと追記ジャーナルの両方から取得済みページを読み込む
+        data = load_progress(self.progress_json_path)
         return data.get("visited", {})
 
     def generate_hash(self, details):
@@ -177,65 +301,58 @@ class WebDataToCSVConvertStep:
         return hashlib.sha256(details_str.encode('utf-8')).hexdigest()
 
     def execute(self):
-        unique_hashes = set()
-        unique_tables = []
-        service_json = None
-
-        for url, filepath in self.url_mapping.items():
-            if filepath.endswith('.html'):
-                with open(filepath, 'r', encoding='utf-8') as file:
-                    html_content = file.read()
-
-                soup = BeautifulSoup(html_content, 'html.parser')
-                # キーワードチェック
-                if self.should_process(soup):
-                    try:
-                        extractor = HtmlConverter(soup, url, self.column_manager)
-                        extractor.display_tree()
-
-                        #service_json = extractor.extract_tables()
-                        #table_hash = self.generate_hash(service_json)
-                        #if table_hash not in unique_hashes:
-                        #    unique_hashes.add(table_hash)
-                        #    unique_tables.append(service_json)
-                    except ValueError as e:
-                        print(f"Failed to parse table: {e}")
-                        print(f"  error URL : {url}")
-                    except IndexError as e:
-                        print(f"Table format error: {e}")
-                        print(f"  error URL : {url}")
-                else:
-                    print(f'処理対象の単語がふくまれていません')
-                
-                    
+        pages = [(url, filepath) for url, filepath in self.url_mapping.items() if filepath.endswith('.html')]
+        # 結果（と各ページの出力）はページの順に返る
+        for result in self.page_executor.map(self.page_processor, pages):
+            pass
 
         #self.unique_services = unique_tables
         #self.save_table_to_json(self.output_json_dir)
 
-    def should_process(self, soup):
-        headers = soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
-
-        if headers:
-            # 最初の見出しタグの次の兄弟要素から終わりまでの内容を抽出
-            relevant_content = ''.join(str(sibling) for header in headers for sibling in header.find_all_next(string=True))
-        else:
-            # 見出しタグがない場合、すべてのコンテンツを評価
-            #relevant_content = content
-            # 見出しタグがない場合、処理をおこなわない
-            return False
-
-        include_matches = [keyword for keyword in self.include_keywords if keyword in relevant_content]
-        exclude_matches = [keyword for keyword in self.exclude_keywords if keyword in relevant_content]
-
-        include = bool(include_matches)
-        exclude = bool(exclude_matches)
-
-        matched_keywords = {'include': include_matches, 'exclude': exclude_matches}
-        #print(f"matched keywords : {matched_keywords}")
-
-        return include and not exclude
-
     def save_table_to_json(self, file_path):
         with open(f'{file_path}/service_catalog.json', "w", encoding="utf-8") as f:
             json.dump(self.unique_services, f, ensure_ascii=False, indent=4)
 
+
+
+# 保存済みページを対象に、従来のshould_process（見出しごとにfind_all_nextで集めたテキストを連結）と判定結果・処理時間を比較する
+#   python web_data2csv_step.py <ページを保存したディレクトリ> <include_keywords> [exclude_keywords]
+if __name__ == "__main__":
+    import sys
+    import time
+
+    def legacy_should_process(soup, include_keywords, exclude_keywords):
+        headers = soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+        if not headers:
+            return False
+        relevant_content = ''.join(str(sibling) for header in headers for sibling in header.find_all_next(string=True))
+        include_matches = [keyword for keyword in include_keywords if keyword in relevant_content]
+        exclude_matches = [keyword for keyword in exclude_keywords if keyword in relevant_content]
+        return bool(include_matches) and not bool(exclude_matches)
+
+    include_keywords = [keyword.strip() for keyword in sys.argv[2].split(",")] if len(sys.argv) > 2 and sys.argv[2] else []
+    exclude_keywords = [keyword.strip() for keyword in sys.argv[3].split(",")] if len(sys.argv) > 3 and sys.argv[3] else []
+    page_processor = PageProcessor(None, include_keywords, exclude_keywords)
+
+    soups = []
+    for root, _, names in os.walk(sys.argv[1]):
+        for name in names:
+            if name.endswith('.html'):
+                with open(os.path.join(root, name), 'r', encoding='utf-8') as file:
+                    soups.append((os.path.join(root, name), BeautifulSoup(file.read(), 'html.parser')))
+
+    start = time.perf_counter()
+    baseline = [legacy_should_process(soup, include_keywords, exclude_keywords) for _, soup in soups]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [page_processor.should_process(soup) for _, soup in soups]
+    linear_time = time.perf_counter() - start
+
+    mismatches = [path for (path, _), expected, actual in zip(soups, baseline, results) if expected != actual]
+    for path in mismatches:
+        print(f"differs: {path}")
+    print(f"pages       : {len(soups)} (processed {sum(results)})")
+    print(f"legacy      : {legacy_time:.3f}s")
+    print(f"linear      : {linear_time:.3f}s")
+    print(f"differs from legacy: {len(mismatches)}")
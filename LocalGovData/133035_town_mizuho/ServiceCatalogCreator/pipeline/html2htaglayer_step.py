@@ -6,6 +6,9 @@ import pandas as pd
 from bs4 import BeautifulSoup
 from lib.column_manager import ColumnManager
 from lib.htag_node import  HTagNode as Node
+from progress_journal import load_progress
+from page_executor import PageExecutor
+from keyword_matcher import KeywordMatcher
 
 
 class HtmlConverter:
@@ -46,6 +49,70 @@ class HtmlConverter:
 
 
 
+class PageProcessor:
+    """
+    1ページ分の処理（読み込み → 解析 → キーワードチェック → HtmlConverter）
+    PageExecutorでワーカープロセスに渡せるよう、pickle可能なクラスにしている
+    """
+    def __init__(self, include_keywords, exclude_keywords):
+        self.include_keywords = include_keywords
+        self.exclude_keywords = exclude_keywords
+        # include / exclude のキーワードをまとめて1回の走査で照合する
+        self.keyword_matcher = KeywordMatcher(include_keywords + exclude_keywords)
+
+    def __call__(self, url, filepath):
+        with open(filepath, 'r', encoding='utf-8') as file:
+            html_content = file.read()
+
+        soup = BeautifulSoup(html_content, 'html.parser')
+        # キーワードチェック
+        if not self.should_process(soup):
+            print(f'処理対象の単語がふくまれていません')
+            return None
+
+        try:
+            #extractor = HtmlConverter(soup, url, self.column_manager)
+            extractor = HtmlConverter(soup, url)
+            extractor.display_tree()
+
+            #service_json = extractor.extract_tables()
+            #table_hash = self.generate_hash(service_json)
+            #if table_hash not in unique_hashes:
+            #    unique_hashes.add(table_hash)
+            #    unique_tables.append(service_json)
+        except ValueError as e:
+            print(f"Failed to parse table: {e}")
+            print(f"  error URL : {url}")
+        except IndexError as e:
+            print(f"Table format error: {e}")
+            print(f"  error URL : {url}")
+        return None
+
+    def should_process(self, soup):
+        headers = soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+
+        if headers:
+            # 最初の見出しタグの次の兄弟要素から終わりまでの内容を抽出
+            relevant_content = ''.join(str(sibling) for header in headers for sibling in header.find_all_next(string=True))
+        else:
+            # 見出しタグがない場合、すべてのコンテンツを評価
+            #relevant_content = content
+            # 見出しタグがない場合、処理をおこなわない
+            return False
+
+        found = set(self.keyword_matcher.search(relevant_content))
+        include_matches = [keyword for keyword in self.include_keywords if keyword in found]
+        exclude_matches = [keyword for keyword in self.exclude_keywords if keyword in found]
+
+        include = bool(include_matches)
+        exclude = bool(exclude_matches)
+
+        matched_keywords = {'include': include_matches, 'exclude': exclude_matches}
+        #print(f"matched keywords : {matched_keywords}")
+
+        return include and not exclude
+
+
 class Html2HtagLayerStep:
     def __init__(self, step_config):
         self.progress_json_path = step_config['progress_file']
@@ -64,10 +131,14 @@ class Html2HtagLayerStep:
         self.exclude_keywords = [keyword.strip() for keyword in exclude_keywords.split(",")] if exclude_keywords else []
         print(f"include / exclude : {self.include_keywords} / {self.exclude_keywords}")
 
+        self.page_processor = PageProcessor(self.include_keywords, self.exclude_keywords)
+        # workersを2以上にすると、ページ単位の処理をプロセスプールで並列に実行する
+        self.page_executor = PageExecutor(step_config.get('workers', 1), step_config.get('chunk_size', 32))
+
 
     def load_mapping(self):
-        with open(self.progress_json_path, 'r') as file:
-            data = json.load(file)
+        # progress.jsonと追記ジャーナルの両方から取得済みページを読み込む
+        data = load_progress(self.progress_json_path)
         return data.get("visited", {})
 
     def generate_hash(self, details):
@@ -84,65 +155,14 @@ class Html2HtagLayerStep:
         return hashlib.sha256(details_str.encode('utf-8')).hexdigest()
 
     def execute(self):
-        unique_hashes = set()
-        unique_tables = []
-        service_json = None
-
-        for url, filepath in self.url_mapping.items():
-            if filepath.endswith('.html'):
-                with open(filepath, 'r', encoding='utf-8') as file:
-                    html_content = file.read()
-
-                soup = BeautifulSoup(html_content, 'html.parser')
-                # キーワードチェック
-                if self.should_process(soup):
-                    try:
-                        #extractor = HtmlConverter(soup, url, self.column_manager)
-                        extractor = HtmlConverter(soup, url)
-                        extractor.display_tree()
-
-                        #service_json = extractor.extract_tables()
-                        #table_hash = self.generate_hash(service_json)
-                        #if table_hash not in unique_hashes:
-                        #    unique_hashes.add(table_hash)
-                        #    unique_tables.append(service_json)
-                    except ValueError as e:
-                        print(f"Failed to parse table: {e}")
-                        print(f"  error URL : {url}")
-                    except IndexError as e:
-                        print(f"Table format error: {e}")
-                        print(f"  error URL : {url}")
-                else:
-                    print(f'処理対象の単語がふくまれていません')
-                
-                    
+        pages = [(url, filepath) for url, filepath in self.url_mapping.items() if filepath.endswith('.html')]
+        # 結果（と各ページの出力）はページの順に返る
+        for result in self.page_executor.map(self.page_processor, pages):
+            pass
 
         #self.unique_services = unique_tables
         #self.save_table_to_json(self.output_json_dir)
 
-    def should_process(self, soup):
-        headers = soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
-
-        if headers:
-            # 最初の見出しタグの次の兄弟要素から終わりまでの内容を抽出
-            relevant_content = ''.join(str(sibling) for header in headers for sibling in header.find_all_next(string=True))
-        else:
-            # 見出しタグがない場合、すべてのコンテンツを評価
-            #relevant_content = content
-            # 見出しタグがない場合、処理をおこなわない
-            return False
-
-        include_matches = [keyword for keyword in self.include_keywords if keyword in relevant_content]
-        exclude_matches = [keyword for keyword in self.exclude_keywords if keyword in relevant_content]
-
-        include = bool(include_matches)
-        exclude = bool(exclude_matches)
-
-        matched_keywords = {'include': include_matches, 'exclude': exclude_matches}
-        #print(f"matched keywords : {matched_keywords}")
-
-        return include and not exclude
-
     def save_table_to_json(self, file_path):
         with open(f'{file_path}/service_catalog.json', "w", encoding="utf-8") as f:
             json.dump(self.unique_services, f, ensure_ascii=False, indent=4)
@@ -1,9 +1,9 @@
 import os
 import json
-import torch        
-from transformers import BertTokenizer, BertModel 
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
+from model_registry import create_embedder
+from embedding_cache import EmbeddingCache
+from vector_store import save_vectors
 
 import logging  # ログ出力のために追加
 
@@ -17,8 +17,16 @@ class EmbeddingStep:
     def __init__(self, step_config):
         self.service_catalog_file = step_config['service_catalog_json']
         self.embeddings_file = step_config['embeddings_file']
-        self.tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
-        self.model = BertModel.from_pretrained('bert-base-uncased')
+        # ベクトルの保存形式（npy / json）。省略時はembeddings_fileの拡張子が.jsonなら従来のJSON、それ以外はnpy
+        self.vector_format = step_config.get('vector_format')
+        self.vector_dtype = step_config.get('vector_dtype', 'float32')
+        # BERTモデルは、ベクトル化するテキストが最初に渡されたときに読み込む（同じプロセスの他のステップと共有する）
+        # embedding_workerを指定した場合は、常駐するワーカーでベクトル化する
+        self.engine = create_embedder('bert-base-uncased', step_config)
+        # 前回の実行から変わらない概要は、embedding_cacheに保存したベクトルを使う
+        cache_dir = step_config.get('embedding_cache')
+        self.embedding_cache = EmbeddingCache(cache_dir, self.engine.name, step_config.get('cache_retain_runs', 1),
+                                              step_config.get('cache_max_mb')) if cache_dir else None
 
     # service catalog jsonの読み込み
     def load_json_data(self, file_path):
@@ -26,39 +34,29 @@ class EmbeddingStep:
         with open(file_path, 'r', encoding='utf-8') as f:
             return json.load(f)
 
-    # service catalog
-    def save_embeddings_to_file(self, embeddings, entries, output_file):
-        """ベクトルデータをJSONファイルに保存する"""
-        data = {
-            'embeddings': embeddings.tolist(),
-            'entries': entries
-        }
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f)
-
     # vector化した概要と対応するサービス情報をファイルに保存
     def save_embeddings_to_file(self, embeddings, entries, output_file):
-        """ベクトルデータをJSONファイルに保存する"""
-        data = {
-            'embeddings': embeddings.tolist(),
-            'entries': entries
-        }
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f)
+        """ベクトルデータを保存する（npyの場合は、行列を.npy、サービス情報を.entries.jsonに保存する）"""
+        save_vectors(output_file, embeddings, entries, self.vector_format, self.vector_dtype)
+
 
+    def embed_texts(self, texts):
+        """テキストをまとめてベクトル化する（embedding_cacheを指定した場合は、キャッシュに無いものだけをモデルに通す）"""
+        if self.embedding_cache is None:
+            return self.engine.embed(texts)
+        embeddings = self.embedding_cache.embed(texts, self.engine)
+        self.embedding_cache.save()
+        return embeddings
 
     # 渡されたtextをベクトル化
     def get_embedding(self, text):
         """テキストをベクトル化する"""
-        inputs = self.tokenizer(text, return_tensors='pt', max_length=512, truncation=True)
-        outputs = self.model(**inputs)
-        embedding = outputs.last_hidden_state.mean(dim=1)
-        return embedding.detach().numpy()
+        return self.engine.embed([text])
 
     # service catalog中の全概要をvector化
     def get_overview_embeddings(self, service_catalog):
         """全ての概要をベクトル化する"""
-        overview_embeddings = []
+        overviews = []
         entries = []
 
         for service in service_catalog:
@@ -73,8 +71,7 @@ class EmbeddingStep:
                 continue  # 不正な形式はスキップ
 
             if overview:
-                embedding = self.get_embedding(overview)
-                overview_embeddings.append(embedding)
+                overviews.append(overview)
 
                 formal_name_data = service.get("正式名称")
                 if isinstance(formal_name_data, dict) and "items" in formal_name_data:
@@ -95,7 +92,8 @@ class EmbeddingStep:
                 }
                 entries.append(entry)
 
-        return np.vstack(overview_embeddings), entries
+        # 概要を集めてから、まとめてベクトル化する
+        return self.embed_texts(overviews), entries
 
     def execute(self):
         self.service_catalog = self.load_json_data(self.service_catalog_file)
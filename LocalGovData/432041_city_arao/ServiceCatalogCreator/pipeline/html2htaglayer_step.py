@@ -1,33 +1,94 @@
 import os
 import json
 import yaml
-import hashlib
 import pandas as pd
-import torch
 import numpy as np
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
 from lib.column_manager import ColumnManager
 from lib.htag_node import  HTagNode as Node
-from transformers import BertTokenizer, BertModel
+from keyword_matcher import KeywordMatcher
+from progress_journal import load_progress
+from page_executor import PageExecutor
+from record_writer import RecordWriter
+from record_fingerprint import Deduplicator, record_signature
+from page_template import TemplateSet
+from parser_selector import select_parser
+from model_registry import create_embedder
+from embedding_cache import EmbeddingCache
+from vector_store import save_vectors
+
+
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+TREE_TAGS = HEADING_TAGS + ('p', 'table', 'span', 'li')
+
+
+def scan_page(soup, template=None, main_id='contents'):
+    """
+    bodyを1回だけ走査し、(本文内の見出しタグのリスト, 階層化の対象タグのリスト) を返す
+    どちらも文書順で、本文が見つからない場合の見出しタグのリストはNone
+    （従来の should_process の find_all と parse_html_to_tree の find_all をまとめたもの）
+
+    template : ページのホストのPageTemplate。指定した場合はテンプレートのブロック（ヘッダー・フッターなど）を
+               部分木ごと読み飛ばす。div#main_idが無いページは、残りの部分全体を本文とする
+    main_id  : 本文とみなすdivのid（templateを指定した場合も、このdivがあればキーワードの判定はその中の見出しで行う）
+    """
+    root = soup.body or soup
+    memo = {}
+    headers = None
+    # テンプレートのブロック以外の見出し（templateを指定し、div#main_idが無い場合に使う）
+    region_headers = [] if template is not None else None
+    tags = []
+    # (タグ, 本文内かどうか) のスタックで前順に走査する
+    stack = [(child, False) for child in reversed(root.contents) if isinstance(child, Tag)]
+    while stack:
+        tag, in_main = stack.pop()
+        name = tag.name
+        if template is not None and template.is_template_block(tag, memo):
+            continue
+        if name in TREE_TAGS:
+            tags.append(tag)
+            if name in HEADING_TAGS:
+                if in_main:
+                    headers.append(tag)
+                if region_headers is not None:
+                    region_headers.append(tag)
+        elif name == 'div' and headers is None and tag.get('id') == main_id:
+            # 最初に見つかったdiv#main_idのみを対象にする（soup.findと同じ）
+            headers = []
+            in_main = True
+        stack.extend((child, in_main) for child in reversed(tag.contents) if isinstance(child, Tag))
+    return (headers if headers is not None else region_headers), tags
 
 
 class HtmlConverter:
-    def __init__(self, soup, url, columns):
+    def __init__(self, soup, url, column_matcher, tags=None, template=None, cut_prefixes=()):
         self.soup = soup
         self.url = url
+        # get_contentを打ち切る要素の接頭語（フッターの定型文など）
+        self.cut_prefixes = tuple(cut_prefixes)
         self.root = Node('Root', level=0)
         self.current_node = self.root
-        self.columns = columns
-        self.parse_html_to_tree(self.soup.body)
+        # columns.yamlのキーワードから作ったKeywordMatcher（ラベルが列名）
+        self.column_matcher = column_matcher
+        if tags is None and template is not None:
+            # テンプレートのブロックを除いてから木を作る
+            self.build_tree(scan_page(self.soup, template)[1])
+        elif tags is None:
+            self.parse_html_to_tree(self.soup.body)
+        else:
+            # scan_pageで収集済みのタグから木を作る
+            self.build_tree(tags)
         self.item_level = 6
         self.title = None
         self.sub_title = None
         self.summary = None
 
     def parse_html_to_tree(self, soup):
-        tags = soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'table', 'span', 'li'], recursive=True)
+        self.build_tree(soup.find_all(list(TREE_TAGS), recursive=True))
+
+    def build_tree(self, tags):
         for tag in tags:
-            if tag.name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
+            if tag.name in HEADING_TAGS:
                 level = int(tag.name[1])  # h1 -> 1, h2 -> 2, ...
                 #print(f'[node dump] {str(tag)}')
                 new_node = Node(tag.get_text(strip=True), level)
@@ -48,9 +109,8 @@ class HtmlConverter:
     def display_tree(self, node=None, indent=0):
         if node is None:
             node = self.root
-        print(' ' * indent + repr(node))
-        for child in node.children:
-            self.display_tree(child, indent + 2)
+        for child, depth in node.iter_nodes():
+            print(' ' * (indent + depth * 2) + repr(child))
 
     def collect_data_from_nodes(self, node=None, collected_data=None):
         if node is None:
@@ -58,20 +118,16 @@ class HtmlConverter:
         if collected_data is None:
             collected_data = {}
 
-        # キーワードにマッチするかどうか確認し、マッチしたらJSONデータを集める
-        for key, keywords in self.columns.items():
-            if node.matches_keywords(keywords):
-                if node.level < self.item_level:
-                    self.item_level = node.level
+        # 子ノードも含めて前順に、タイトルがキーワードに前方一致するかどうか確認し、マッチしたらJSONデータを集める
+        for child, _ in node.iter_nodes():
+            for key in self.column_matcher.match_prefix(child.title):
+                if child.level < self.item_level:
+                    self.item_level = child.level
                 collected_data[key] = {
-                    'items': node.get_content()
+                    'items': child.get_content(cut_prefixes=self.cut_prefixes)
                 }
                 #print(f'match collected_data={str(collected_data[key])}')
 
-        # 子ノードも再帰的に処理
-        for child in node.children:
-            self.collect_data_from_nodes(child, collected_data)
-
         return collected_data
 
 
@@ -88,7 +144,7 @@ class HtmlConverter:
                 return
             self.title = []
             self.title.append(node.title)
-            self.summary = node.get_content(th=self.item_level)
+            self.summary = node.get_content(th=self.item_level, cut_prefixes=self.cut_prefixes)
 
         # 子ノードも再帰的に処理
         for child in node.children:
@@ -97,32 +153,69 @@ class HtmlConverter:
 
 
 
-class Html2HtagLayerStep:
-    def __init__(self, step_config):
-        self.progress_json_path = step_config['progress_file']
-        self.output_json_dir = step_config['output_json_dir']
-        self.columns_yaml = step_config['columns_yaml']
-        self.url_mapping = self.load_mapping()
-        # BERTモデルとトークナイザーの初期化
-        self.tokenizer = BertTokenizer.from_pretrained('cl-tohoku/bert-base-japanese-v3')
-        self.model = BertModel.from_pretrained('cl-tohoku/bert-base-japanese-v3')
-        os.makedirs(self.output_json_dir, exist_ok=True)
-
-        self.column_manager = ColumnManager(self.columns_yaml)
-
-        # キーワードリストを適切に処理する
-        include_keywords = step_config.get('include_keywords', '')
-        self.include_keywords = [keyword.strip() for keyword in include_keywords.split(",")] if include_keywords else []
-
-        exclude_keywords = step_config.get('exclude_keywords', '')
-        self.exclude_keywords = [keyword.strip() for keyword in exclude_keywords.split(",")] if exclude_keywords else []
-        print(f"include / exclude : {self.include_keywords} / {self.exclude_keywords}")
-
-
-    def load_mapping(self):
-        with open(self.progress_json_path, 'r') as file:
-            data = json.load(file)
-        return data.get("visited", {})
+class PageProcessor:
+    """
+    1ページ分の処理（読み込み → 解析 → キーワードチェック → HtmlConverter → collect_data_from_nodes）
+    PageExecutorでワーカープロセスに渡せるよう、BERTモデルなどを持たないpickle可能なクラスにしている
+    """
+    def __init__(self, html_parser, column_matcher, include_keywords, exclude_keywords, dedup_mode='exact',
+                 templates=None, main_id='contents', cut_prefixes=(), exclude_titles=()):
+        self.html_parser = html_parser
+        self.dedup_mode = dedup_mode
+        # ホストごとのテンプレート（TemplateSet）。学習していないホストのページは従来どおりmain_idで本文を探す
+        self.templates = templates
+        self.main_id = main_id
+        # get_contentを打ち切る要素の接頭語と、サービスとして扱わないタイトル（サイトごとにpipeline.yamlで指定する）
+        self.cut_prefixes = tuple(prefix for prefix in cut_prefixes if prefix)
+        self.exclude_titles = [[title] for title in exclude_titles]
+        self.column_matcher = column_matcher
+        self.include_keywords = include_keywords
+        self.exclude_keywords = exclude_keywords
+        # include / exclude のキーワードをまとめて1回の走査で照合する
+        self.keyword_matcher = KeywordMatcher(include_keywords + exclude_keywords)
+
+    def __call__(self, url, filepath):
+        """処理対象のページであれば (サービス情報, 重複判定用のシグネチャ) を、それ以外はNoneを返す"""
+        with open(filepath, 'r', encoding='utf-8') as file:
+            html_content = file.read()
+
+        soup = BeautifulSoup(html_content, self.html_parser)
+        template = self.templates.get(url) if self.templates is not None else None
+        # キーワードチェックと木の作成に使うタグを1回の走査で集める
+        headers, tags = scan_page(soup, template, self.main_id)
+        if not self.should_process(headers):
+            print(f'処理対象の単語がふくまれていません')
+            return None
+
+        try:
+            extractor = HtmlConverter(soup, url, self.column_matcher, tags, cut_prefixes=self.cut_prefixes)
+            service_info = extractor.collect_data_from_nodes()
+            # 空の要素は飛ばす
+            if len(service_info) == 0:
+                return None
+            if not self.result_check(extractor):
+                return None
+            extractor.create_title()
+            # get_contentを使い終えたので、ノードに保存した結果を破棄する
+            extractor.root.clear_content_cache()
+            service_info['正式名称'] = {
+                'items': extractor.title
+            }
+            service_info['概要'] = {
+                'items': extractor.summary
+            }
+            service_info['URL'] = {
+                'items': url
+            }
+
+            return service_info, self.generate_hash(service_info)
+        except ValueError as e:
+            print(f"Failed to parse html: {e}")
+            print(f"  error URL : {url}")
+        except IndexError as e:
+            print(f"Table format error: {e}")
+            print(f"  error URL : {url}")
+        return None
 
     def generate_hash(self, details):
         if isinstance(details, pd.DataFrame):
@@ -133,71 +226,20 @@ class Html2HtagLayerStep:
         else:
             details_dict_list = details
 
-        # JSON 形式でシリアライズするためには、リスト全体をダンプする
-        details_str = json.dumps(details_dict_list, sort_keys=True)
-        return hashlib.sha256(details_str.encode('utf-8')).hexdigest()
+        # JSON文字列を作らずに入れ子構造のままハッシュ化する（nearの場合は、ページごとに違うURLを除いた内容のSimHashも求める）
+        return record_signature(details_dict_list, self.dedup_mode, ignore_keys=('URL',))
 
     def result_check(self, html_converter):
-        if html_converter.title == ["利用者別に探す"]:
-            print(f'result_check: false(利用者別に探す)')
+        if html_converter.title in self.exclude_titles:
+            print(f'result_check: false({html_converter.title[0]})')
             return False
         else:
             print(f'result_check: OK')
             return True
-    def execute(self):
-        unique_hashes = set()
-        unique_tables = []
-        service_json = None
-
-        for url, filepath in self.url_mapping.items():
-            if filepath.endswith('.html'):
-                with open(filepath, 'r', encoding='utf-8') as file:
-                    html_content = file.read()
-
-                soup = BeautifulSoup(html_content, 'html.parser')
-                # キーワードチェック
-                if self.should_process(soup):
-                    try:
-                        extractor = HtmlConverter(soup, url, self.column_manager.get_column_config())
-                        service_info = extractor.collect_data_from_nodes()
-                        # 空の要素は飛ばす
-                        if len(service_info) == 0:
-                            continue
-                        if not self.result_check(extractor):
-                            continue
-                        extractor.create_title()
-                        service_info['正式名称'] = {
-                            'items': extractor.title
-                        }
-                        service_info['概要'] = {
-                            'items': extractor.summary
-                        }
-                        service_info['URL'] = {
-                            'items': url
-                        }
-
-                        service_json = json.dumps(service_info, ensure_ascii=False, indent=4)
-                        service_hash = self.generate_hash(service_json)
-                        if service_hash not in unique_hashes:
-                            unique_hashes.add(service_hash)
-                            unique_tables.append(service_info)
-                    except ValueError as e:
-                        print(f"Failed to parse html: {e}")
-                        print(f"  error URL : {url}")
-                    except IndexError as e:
-                        print(f"Table format error: {e}")
-                        print(f"  error URL : {url}")
-                else:
-                    print(f'処理対象の単語がふくまれていません')
 
-        self.save_json(unique_tables, self.output_json_dir)
-        self.save_embedding(unique_tables, self.output_json_dir)
-
-    def should_process(self, soup):
-        main_div = soup.find('div', id='contents')
-        if main_div:
-            headers = main_div.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
-        else:
+    def should_process(self, headers):
+        # headers: scan_pageで集めた本文内の見出しタグ（本文が見つからない場合はNone）
+        if headers is None:
             print(f'not found main')
             return False
 
@@ -211,8 +253,9 @@ class Html2HtagLayerStep:
             # 見出しタグがない場合、処理をおこなわない
             return False
 
-        include_matches = [keyword for keyword in self.include_keywords if keyword in relevant_content]
-        exclude_matches = [keyword for keyword in self.exclude_keywords if keyword in relevant_content]
+        found = set(self.keyword_matcher.search(relevant_content))
+        include_matches = [keyword for keyword in self.include_keywords if keyword in found]
+        exclude_matches = [keyword for keyword in self.exclude_keywords if keyword in found]
 
         include = bool(include_matches)
         exclude = bool(exclude_matches)
@@ -223,58 +266,147 @@ class Html2HtagLayerStep:
 
         return include and not exclude
 
+
+class Html2HtagLayerStep:
+    def __init__(self, step_config):
+        self.progress_json_path = step_config['progress_file']
+        self.output_json_dir = step_config['output_json_dir']
+        self.columns_yaml = step_config['columns_yaml']
+        self.url_mapping = self.load_mapping()
+        # BERTモデルは、ベクトル化するテキストが最初に渡されたときに読み込む（同じプロセスの他のステップと共有する）
+        # embedding_workerを指定した場合は、常駐するワーカーでベクトル化する
+        self.engine = create_embedder('cl-tohoku/bert-base-japanese-v3', step_config)
+        # 前回の実行から変わらない概要は、embedding_cacheに保存したベクトルを使う
+        cache_dir = step_config.get('embedding_cache')
+        self.embedding_cache = EmbeddingCache(cache_dir, self.engine.name, step_config.get('cache_retain_runs', 1),
+                                              step_config.get('cache_max_mb')) if cache_dir else None
+        os.makedirs(self.output_json_dir, exist_ok=True)
+        self.html_parser = select_parser(step_config.get('html_parser'))
+
+        self.column_manager = ColumnManager(self.columns_yaml)
+
+        # キーワードリストを適切に処理する
+        include_keywords = step_config.get('include_keywords', '')
+        self.include_keywords = [keyword.strip() for keyword in include_keywords.split(",")] if include_keywords else []
+
+        exclude_keywords = step_config.get('exclude_keywords', '')
+        self.exclude_keywords = [keyword.strip() for keyword in exclude_keywords.split(",")] if exclude_keywords else []
+        print(f"include / exclude : {self.include_keywords} / {self.exclude_keywords}")
+
+        # 重複除去の方法（exact: 内容が同じサービスのみ、near: 定型文だけが違うようなほぼ同じサービスも除く）
+        self.dedup_mode = step_config.get('dedup_mode', 'exact')
+        self.dedup_distance = step_config.get('dedup_distance', 3)
+
+        # template_learning_stepで学習したサイト共通のブロック（指定した場合は木を作る前に除く）
+        template_file = step_config.get('template_file')
+        templates = TemplateSet.load(template_file) if template_file and os.path.exists(template_file) else None
+        if template_file and templates is None:
+            print(f"Warning: template file '{template_file}' does not exist, using div#{step_config.get('main_id', 'contents')}")
+        cut_prefixes = step_config.get('cut_prefixes', '')
+        exclude_titles = step_config.get('exclude_titles', '')
+
+        self.page_processor = PageProcessor(self.html_parser, self.column_manager.get_column_matcher(),
+                                            self.include_keywords, self.exclude_keywords, self.dedup_mode,
+                                            templates, step_config.get('main_id', 'contents'),
+                                            [prefix.strip() for prefix in cut_prefixes.split(",")] if cut_prefixes else [],
+                                            [title.strip() for title in exclude_titles.split(",")] if exclude_titles else [])
+        # workersを2以上にすると、ページ単位の処理をプロセスプールで並列に実行する
+        self.page_executor = PageExecutor(step_config.get('workers', 1), step_config.get('chunk_size', 32))
+        # service_catalogの出力形式（json / jsonl）と、書き出したサービスを標準出力にも表示するかどうか
+        self.output_format = step_config.get('output_format', 'json')
+        self.debug_print = step_config.get('debug_print', False) == True
+        # 概要のベクトルの保存形式（npy: .npyの行列と.entries.json / json: 従来のJSON）と、npyの場合の要素の型
+        self.vector_format = step_config.get('vector_format', 'npy')
+        self.vector_dtype = step_config.get('vector_dtype', 'float32')
+
+
+    def load_mapping(self):
+        # progress.jsonと追記ジャーナルの両方から取得済みページを読み込む
+        data = load_progress(self.progress_json_path)
+        return data.get("visited", {})
+
+    def execute(self):
+        deduplicator = Deduplicator(self.dedup_mode, self.dedup_distance)
+        # 概要のベクトル化に使う部分だけを残し、サービス情報そのものは見つけた時点で書き出す
+        embedding_entries = []
+
+        pages = [(url, filepath) for url, filepath in self.url_mapping.items() if filepath.endswith('.html')]
+        with self.open_writer(self.output_json_dir) as writer:
+            # 結果はページの順に返るため、重複除去の結果は順次実行と同じになる
+            for result in self.page_executor.map(self.page_processor, pages):
+                if result is None:
+                    continue
+                service_info, service_hash = result
+                if deduplicator.add(service_hash):
+                    writer.write(service_info)
+                    entry = self.create_embedding_entry(service_info)
+                    if entry is not None:
+                        embedding_entries.append(entry)
+
+        self.save_embedding(embedding_entries, self.output_json_dir)
+
     def save_table_to_json(self, file_path):
         with open(f'{file_path}/service_catalog.json', "w", encoding="utf-8") as f:
             json.dump(self.unique_services, f, ensure_ascii=False, indent=4)
 
+    def open_writer(self, file_path):
+        # output_formatがjsonlの場合は service_catalog.jsonl に1行1サービスで書き出す
+        extension = 'jsonl' if self.output_format == 'jsonl' else 'json'
+        return RecordWriter(f'{file_path}/service_catalog.{extension}', self.output_format, indent=4, echo=self.debug_print)
+
     def save_json(self, data, file_path):
-        with open(f'{file_path}/service_catalog.json', "w", encoding="utf-8") as f:
-            json_str = json.dumps(data, ensure_ascii=False, indent=4)
-            # print(str(data))
-            # print('---------')
-            print(json_str)
-            f.write(json_str)
-        #self.read_and_print_json('{file_path}/service_catalog.json')
+        with self.open_writer(file_path) as writer:
+            for service in data:
+                writer.write(service)
 
     def read_and_print_json(self,file_path):
         with open(file_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
             print(data)
 
-    def save_embedding(self, data, file_path):
+    def create_embedding_entry(self, service):
+        """
+        サービス情報から、ベクトル化する概要テキストと付随する情報を取り出す
+        :param service: サービス情報
+        :return: 概要テキストが空、または不正な形式の場合はNone
         """
-        サービス情報の概要テキストをベクトル化し、JSONファイルに保存する
-        :param data: サービス情報のリスト
+        # 概要テキストを取得
+        overview_items = service.get('概要', {}).get('items', [])
+        if isinstance(overview_items, list):
+            overview = " ".join(overview_items)
+        elif isinstance(overview_items, str):
+            overview = overview_items
+        else:
+            print(f"Invalid format: {overview_items}")
+            return None  # 不正な形式はスキップ
+
+        # テキストが空でない場合のみ処理
+        if not overview:
+            return None
+        return {
+            'overview': overview,
+            'formal_name': service.get('正式名称', {}).get('items', ['N/A'])[0],
+            'url': service.get('URL', {}).get('items', 'N/A')
+        }
+
+    def save_embedding(self, entries, file_path):
+        """
+        サービス情報の概要テキストをベクトル化し、vector_formatの形式で保存する
+        :param entries: create_embedding_entryで取り出した情報のリスト
         :param file_path: 保存先のファイルパス
         """
-        overview_embeddings = []
-        entries = []
-
-        for service in data:
-            # 概要テキストを取得
-            overview_items = service.get('概要', {}).get('items', [])
-            if isinstance(overview_items, list):
-                overview = " ".join(overview_items)
-            elif isinstance(overview_items, str):
-                overview = overview_items
-            else:
-                print(f"Invalid format: {overview_items}")
-                continue  # 不正な形式はスキップ
-
-            # テキストが空でない場合のみ処理
-            if overview:
-                embedding = self.get_embedding(overview)
-                overview_embeddings.append(embedding)
-
-                entry = {
-                    'overview': overview,
-                    'formal_name': service.get('正式名称', {}).get('items', ['N/A'])[0],
-                    'url': service.get('URL', {}).get('items', 'N/A')
-                }
-                entries.append(entry)
+        overview_embeddings = self.embed_texts(entry['overview'] for entry in entries)
+
+        extension = 'json' if self.vector_format == 'json' else 'npy'
+        self.save_embeddings_to_file(overview_embeddings, entries, f'{file_path}/service_catalog_embeddings.{extension}')
 
-        # JSONデータとして保存
-        self.save_embeddings_to_file(overview_embeddings, entries, f'{file_path}/service_catalog_embeddings.json')
+    def embed_texts(self, texts):
+        """テキストをまとめてベクトル化する（embedding_cacheを指定した場合は、キャッシュに無いものだけをモデルに通す）"""
+        if self.embedding_cache is None:
+            return self.engine.embed(texts)
+        embeddings = self.embedding_cache.embed(texts, self.engine)
+        self.embedding_cache.save()
+        return embeddings
 
     def get_embedding(self, text):
         """
@@ -282,21 +414,83 @@ class Html2HtagLayerStep:
         :param text: テキスト
         :return: ベクトルデータ
         """
-        inputs = self.tokenizer(text, return_tensors='pt', max_length=512, truncation=True)
-        outputs = self.model(**inputs)
-        embedding = outputs.last_hidden_state.mean(dim=1)
-        return embedding.squeeze(0).detach().numpy()
+        return self.engine.embed([text])[0]
 
     def save_embeddings_to_file(self, embeddings, entries, output_file):
         """
-        ベクトルデータをJSONファイルに保存する
+        ベクトルデータを保存する（npyの場合は、行列をoutput_file、サービス情報を同名の.entries.jsonに保存する）
         :param embeddings: ベクトルデータのリスト
         :param entries: サービス情報のリスト
         :param output_file: 保存先のファイルパス
         """
-        data = {
-            'embeddings': np.array(embeddings).tolist(),
-            'entries': entries
-        }
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+        save_vectors(output_file, np.asarray(embeddings), entries, self.vector_format, self.vector_dtype)
+
+
+# 保存済みページを対象に、従来の方法（find_allによる2回の走査）と処理時間・結果を比較する
+#   python html2htaglayer_step.py <ページを保存したディレクトリ> [パーサー名（既定: lxml）]
+if __name__ == "__main__":
+    import sys
+    import time
+
+    def dump_tree(node):
+        result = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            result.append((node.level, node.title, list(node.items), [df.to_dict() for df in node.get_table_frames()]))
+            stack.extend(reversed(node.children))
+        return result
+
+    def legacy(html_content, html_parser):
+        soup = BeautifulSoup(html_content, html_parser)
+        main_div = soup.find('div', id='contents')
+        headers = main_div.find_all(list(HEADING_TAGS)) if main_div else None
+        relevant_content = ' '.join(tag.get_text() for tag in headers) if headers is not None else None
+        return relevant_content, dump_tree(HtmlConverter(soup, None, KeywordMatcher()).root)
+
+    def single_pass(html_content, html_parser):
+        soup = BeautifulSoup(html_content, html_parser)
+        headers, tags = scan_page(soup)
+        relevant_content = ' '.join(tag.get_text() for tag in headers) if headers is not None else None
+        return relevant_content, dump_tree(HtmlConverter(soup, None, KeywordMatcher(), tags).root)
+
+    html_parser = select_parser(sys.argv[2] if len(sys.argv) > 2 else None)
+    pages = []
+    for root, _, names in os.walk(sys.argv[1]):
+        for name in names:
+            if name.endswith('.html'):
+                with open(os.path.join(root, name), 'r', encoding='utf-8') as file:
+                    pages.append(file.read())
+
+    start = time.perf_counter()
+    baseline = [legacy(page, html_parser) for page in pages]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [single_pass(page, html_parser) for page in pages]
+    single_pass_time = time.perf_counter() - start
+
+    mismatches = sum(1 for expected, actual in zip(baseline, results) if expected != actual)
+    count = max(len(pages), 1)
+    print(f"pages       : {len(pages)}")
+    print(f"legacy      : {legacy_time:.3f}s ({legacy_time / count * 1000:.2f} ms/page)")
+    print(f"single pass : {single_pass_time:.3f}s ({single_pass_time / count * 1000:.2f} ms/page, {html_parser})")
+    print(f"speedup     : {legacy_time / max(single_pass_time, 1e-9):.1f}x")
+    print(f"differs from legacy: {mismatches}")
+    if html_parser != 'html.parser':
+        # パーサーの違いで出力が変わるページ数（html.parserで作った従来のカタログとの差）
+        reference = [single_pass(page, 'html.parser') for page in pages]
+        print(f"differs from html.parser: {sum(1 for expected, actual in zip(reference, results) if expected != actual)}")
+
+    # 同じページからサイト共通のブロックを学習し、テンプレートで除いた場合の対象タグ数と処理時間を比較する
+    from page_template import TemplateLearner
+    learner = TemplateLearner()
+    for page in pages:
+        learner.add_page('http://localhost/', BeautifulSoup(page, html_parser))
+    template = learner.build().get('http://localhost/')
+    start = time.perf_counter()
+    trimmed = [scan_page(BeautifulSoup(page, html_parser), template)[1] for page in pages]
+    template_time = time.perf_counter() - start
+    full = [scan_page(BeautifulSoup(page, html_parser))[1] for page in pages]
+    print(f"template    : {len(template.blocks) if template else 0} blocks, "
+          f"tags {sum(map(len, full))} -> {sum(map(len, trimmed))}, scan {template_time:.3f}s")
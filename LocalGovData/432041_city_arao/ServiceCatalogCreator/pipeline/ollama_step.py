@@ -6,6 +6,8 @@ import pandas as pd
 from bs4 import BeautifulSoup
 from openai import OpenAI
 import logging
+from progress_journal import load_progress
+from record_writer import RecordWriter, iter_records
 
 # ロギングの設定
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -17,6 +19,9 @@ class OllamaStep:
         self.progress_file_path = step_config['progress_file']
         self.input_json_path = step_config['input_json_file']
         self.output_json_path = step_config['output_json_file']
+        # 出力形式（json / jsonl、省略時は拡張子から判断）と、書き出したエントリを標準出力にも表示するかどうか
+        self.output_format = step_config.get('output_format')
+        self.debug_print = step_config.get('debug_print', False) == True
         self.progress_data = None
         self.url_to_filepath = None
         self.ollama_client = OllamaClient()
@@ -24,10 +29,8 @@ class OllamaStep:
     def load_progress(self):
         """Load the progress JSON file once."""
         if self.progress_data is None:
-            if not os.path.exists(self.progress_file_path):
-                raise FileNotFoundError(f"{self.progress_file_path} does not exist.")
-            with open(self.progress_file_path, "r", encoding="utf-8") as file:
-                self.progress_data = json.load(file)
+            # progress.jsonと追記ジャーナルの両方から読み込む（どちらも無ければFileNotFoundError）
+            self.progress_data = load_progress(self.progress_file_path)
             self.url_to_filepath = self.progress_data.get("visited", {})
 
     def get_file_content(self, url):
@@ -43,18 +46,20 @@ class OllamaStep:
             return None
 
     def load_data(self):
-        """Load the JSON data file."""
+        """Iterate over the entries of the JSON data file one by one."""
         if not os.path.exists(self.input_json_path):
             raise FileNotFoundError(f"{self.input_json_path} does not exist.")
-        with open(self.input_json_path, "r", encoding="utf-8") as file:
-            return json.load(file)
+        return iter_records(self.input_json_path)
 
-    def get_url_content(self):
-        """Replace the '概要' field with a summary from OllamaStep.create_summary()."""
-        data = self.load_data()
-        total_entries = len(data)
+    def count_entries(self):
+        """Count the entries without keeping them in memory (used for the progress percentage)."""
+        return sum(1 for _ in self.load_data())
 
-        for index, entry in enumerate(data):
+    def get_url_content(self):
+        """Replace the '概要' field with a summary from OllamaStep.create_summary() and yield each entry."""
+        # 要約に比べて読み込みは短時間で済むため、先に件数だけを数えておく
+        total_entries = self.count_entries()
+        for index, entry in enumerate(self.load_data()):
             url = entry.get("URL", {}).get("items")
             if url:
                 html_content = self.get_file_content(url)
@@ -66,18 +71,16 @@ class OllamaStep:
             # 進捗の割合を計算して画面に表示する
             progress = (index + 1) / total_entries * 100
             logging.info(f"Progress: {progress:.2f}% ({index + 1}/{total_entries})")
-        return data
+            yield entry
 
     def execute(self):
-        data = self.get_url_content()
-        
-        # 変更点：概要フィールドの形式を修正し、itemsとしてリストで保持
-        for entry in data:
-            if "概要" in entry:
-                entry["概要"] = {"items": entry["概要"]}
-
-        with open(self.output_json_path, "w", encoding="utf-8") as file:
-            json.dump(data, file, ensure_ascii=False, indent=2)
+        # 要約したエントリから順に書き出し、メモリには1件分だけを持つ
+        with RecordWriter(self.output_json_path, self.output_format, indent=2, echo=self.debug_print) as writer:
+            for entry in self.get_url_content():
+                # 変更点：概要フィールドの形式を修正し、itemsとしてリストで保持
+                if "概要" in entry:
+                    entry["概要"] = {"items": entry["概要"]}
+                writer.write(entry)
 
 
 class OllamaClient:
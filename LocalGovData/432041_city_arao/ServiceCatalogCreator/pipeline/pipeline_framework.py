@@ -1,5 +1,7 @@
 import sys
 from step_factory import StepFactory
+from step_scheduler import StepScheduler
+from step_cache import StepCache
 import yaml
 
 
@@ -8,6 +10,7 @@ from download_step import DownloadStep
 from data_extraction_step import DataExtractionStep
 from attribution_processing_step import AttributionProcStep
 from web_scraper_step import WebScraperStep
+from template_learning_step import TemplateLearningStep
 from html2htaglayer_step import Html2HtagLayerStep
 from ollama_step import OllamaStep
 from embedding_step import EmbeddingStep
@@ -21,6 +24,7 @@ StepFactory.register_step('download_step', DownloadStep)
 StepFactory.register_step('data_extraction_step', DataExtractionStep)
 StepFactory.register_step('attribution_step', AttributionProcStep)
 StepFactory.register_step('web_scraper_step', WebScraperStep)
+StepFactory.register_step('template_learning_step', TemplateLearningStep)
 StepFactory.register_step('html2htaglayer_step', Html2HtagLayerStep)
 StepFactory.register_step('ollama_step', OllamaStep)
 StepFactory.register_step('embedding_step', EmbeddingStep)
@@ -33,14 +37,18 @@ def execute_pipeline(pipeline_config_path):
     with open(pipeline_config_path, 'r') as file:
         pipeline_config = yaml.safe_load(file)
 
-    for step_config in pipeline_config.get('steps', []):
-        # skip_flgがtrueとして評価されるかどうかをチェック
-        if step_config.get('skip_flg', False) == True:
-            print(f"Skipping step: {step_config['name']}")
-            continue
-
-        step = StepFactory.create_step(step_config['type'], step_config)
-        step.execute()
+    # outputsを宣言したステップは、設定・コード・入力ファイルに変更がなければ実行を省略する
+    cache_file = pipeline_config.get('step_cache', './.pipeline_cache.json')
+    cache = StepCache(cache_file) if cache_file else None
+
+    # 依存関係のないステップはmax_workersの範囲で並列に実行する（既定は1 = 従来どおりの逐次実行）
+    scheduler = StepScheduler(
+        pipeline_config.get('steps', []),
+        max_workers=pipeline_config.get('max_workers', 1),
+        executor=pipeline_config.get('executor', 'thread'),
+        cache=cache,
+    )
+    scheduler.run()
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
@@ -1,7 +1,9 @@
 from bs4 import BeautifulSoup
 import json
 import os
-import hashlib
+from progress_journal import load_progress
+from record_writer import RecordWriter
+from record_fingerprint import Deduplicator, record_signature
 
 
 
@@ -71,38 +73,36 @@ class ServiceCatalogCreatorStep:
         self.progress_json_path = step_config['progress_file']
         self.output_json_path = step_config['output_json_path']
         self.url_mapping = self.load_mapping()
-        self.services = []
+        # 出力形式（json / jsonl、省略時は拡張子から判断）と、書き出したサービスを標準出力にも表示するかどうか
+        self.output_format = step_config.get('output_format')
+        self.debug_print = step_config.get('debug_print', False) == True
+        # 重複除去の方法（exact: detailsが同じサービスのみ、near: 定型文だけが違うようなほぼ同じサービスも除く）
+        self.dedup_mode = step_config.get('dedup_mode', 'exact')
+        self.dedup_distance = step_config.get('dedup_distance', 3)
 
     def load_mapping(self):
         """マッピング情報を読み込む"""
-        with open(self.progress_json_path, 'r') as file:
-            data = json.load(file)
+        # progress.jsonと追記ジャーナルの両方から取得済みページを読み込む
+        data = load_progress(self.progress_json_path)
         return data.get("visited", {})
 
     def generate_hash(self, details):
-        # detailsをJSON文字列に変換し、そのハッシュ値を生成
-        details_str = json.dumps(details, sort_keys=True)
-        return hashlib.sha256(details_str.encode('utf-8')).hexdigest()
+        # detailsの入れ子構造をJSON文字列に変換せずにハッシュ化する
+        return record_signature(details, self.dedup_mode)
 
     def execute(self):
-        unique_hashes = set()  # 生成されたハッシュ値を保持するセット
-        unique_services = []
-
-        for url, filepath in self.url_mapping.items():
-            if filepath.endswith('.html'):
-                with open(filepath, 'r', encoding='utf-8') as file:
-                    html_content = file.read()
-                creator = CatalogCreator(html_content, url)
-                for service in creator.get_services():
-                    service_hash = self.generate_hash(service['details'])
-                    if service_hash not in unique_hashes:
-                        unique_hashes.add(service_hash)
-                        unique_services.append(service)
-        self.services = unique_services
-        self.save_services_to_json(self.output_json_path)
-
-    def save_services_to_json(self, file_path):
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(self.services, f, ensure_ascii=False, indent=4)
+        deduplicator = Deduplicator(self.dedup_mode, self.dedup_distance)  # 出力したサービスのハッシュ値を保持する
+
+        # 重複していないサービスは見つけた時点で書き出し、メモリには1ページ分だけを持つ
+        with RecordWriter(self.output_json_path, self.output_format, indent=4, echo=self.debug_print) as writer:
+            for url, filepath in self.url_mapping.items():
+                if filepath.endswith('.html'):
+                    with open(filepath, 'r', encoding='utf-8') as file:
+                        html_content = file.read()
+                    creator = CatalogCreator(html_content, url)
+                    for service in creator.get_services():
+                        service_hash = self.generate_hash(service['details'])
+                        if deduplicator.add(service_hash):
+                            writer.write(service)
 
 
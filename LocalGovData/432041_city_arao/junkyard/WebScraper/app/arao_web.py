@@ -19,12 +19,18 @@ class WebScraper:
         self.visited = self.load_progress()
         self.counter = 0
         self.save_every = 100
+        self.robots_parsers = {}  # host -> (RobotFileParser, 取得時刻)
+        self.robots_ttl = 86400
 
-    # 対象がスクレイピングOKか確認
+    # 対象がスクレイピングOKか確認（robots.txtはホストごとにrobots_ttl秒キャッシュする）
     def is_allowed_url(self, url):
-        parser = urllib.robotparser.RobotFileParser()
-        parser.set_url(urllib.parse.urljoin(url, '/robots.txt'))
-        parser.read()
+        host = urlparse(url).netloc
+        parser, fetched_at = self.robots_parsers.get(host, (None, 0))
+        if parser is None or time.time() - fetched_at > self.robots_ttl:
+            parser = urllib.robotparser.RobotFileParser()
+            parser.set_url(urllib.parse.urljoin(url, '/robots.txt'))
+            parser.read()
+            self.robots_parsers[host] = (parser, time.time())
         return parser.can_fetch(self.user_agent, url)
    
     # 進行状況を保存 
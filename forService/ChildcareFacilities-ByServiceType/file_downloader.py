@@ -1,17 +1,65 @@
 import requests
 import os
+import sys
 import json
+import time
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
-def download_file(url, save_path):
-    try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        with open(save_path, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                file.write(chunk)
-        return True
-    except requests.RequestException:
-        return False
+MAX_WORKERS = 8  # 同時にダウンロードするファイル数
+RETRIES = 3  # 通信エラー時の再試行回数
+BACKOFF = 1.0  # 再試行までの待ち時間（秒、再試行ごとに倍）
+CACHE_DIR = './.download_cache'  # ダウンロードしたファイルのキャッシュ
+CACHE_MAX_SIZE_MB = 1024  # キャッシュの上限（MB、超えた場合は最後に使われた時刻が古いものから削除する）
+COMPONENT_DIR = os.path.dirname(os.path.abspath(__file__))  # 共通部品（componentsの各ファイル）の保存先
+
+def create_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def download_file(url, save_path, session=requests, cache=None, sha256=None):
+    if cache is not None:
+        # 確認済み（またはオフライン）であればキャッシュから取り出す
+        if cache.is_fresh(url, sha256) and cache.copy_to(url, save_path):
+            cache.touch(url)
+            return True
+        if cache.offline:
+            return False
+
+    # 途中まで取得済みの.partファイルがあれば続きから取得し、完了後にリネームする（共通部品のpart_download.py）
+    from part_download import fetch_to_part_file, complete_part_file
+    part_path = save_path + '.part'
+    for attempt in range(RETRIES + 1):
+        try:
+            headers = cache.conditional_headers(url) if cache is not None else {}
+            status, headers = fetch_to_part_file(session, url, part_path, headers)
+            if status == 304:
+                # 前回から変更なし
+                if cache.copy_to(url, save_path):
+                    cache.touch(url, headers)
+                    return True
+                continue
+            complete_part_file(part_path)
+            if cache is None:
+                os.replace(part_path, save_path)
+                return True
+            cache.store(url, part_path, headers, sha256)
+            if cache.copy_to(url, save_path):
+                return True
+            # 他のスレッドの保存で追い出された場合は取得し直す
+        except ValueError as e:
+            print(e)
+            return False
+        except requests.RequestException as e:
+            status = e.response.status_code if e.response is not None else None
+            if attempt == RETRIES or (status is not None and status < 500 and status != 429):
+                return False
+            time.sleep(BACKOFF * (2 ** attempt))
+    return False
 
 def main():
     config_file = "download_config.json"
@@ -19,7 +67,60 @@ def main():
     download(config_file, 'files', download_dir)
     download(config_file, 'converters', download_dir)
 
-def download(config_file, target, download_dir):
+def download_item(item, download_dir, session, cache):
+    download_url = item.get('url')
+    default_url = item.get('cache_url')
+    filename = item.get('filename')
+
+    save_path = os.path.join(download_dir, filename)
+
+    # ファイルのダウンロード
+    if download_file(download_url, save_path, session, cache, item.get('sha256')):
+        return
+    if not default_url:
+        print(f"Failed to download from {download_url}.")
+        return
+    # 別のURLの途中までのデータと連結しないよう、.partを消してから取得する
+    from part_download import remove_part_file
+    remove_part_file(save_path + '.part')
+    print(f"Failed to download from {download_url}. Trying default URL...")
+    if not download_file(default_url, save_path, session, cache, item.get('sha256')):
+        print(f"Failed to download from default URL {default_url} as well.")
+
+def fetch_component(url, path):
+    # 共通部品はpart_download.pyより前に必要になるため、1回のGETで取得する
+    try:
+        response = requests.get(url, timeout=60)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"Failed to download component from {url}: {e}")
+        return False
+    with open(path + '.tmp', 'wb') as file:
+        file.write(response.content)
+    os.replace(path + '.tmp', path)
+    return True
+
+def load_components(config):
+    """download_configのcomponentsに定義した共通部品（part_download.py / artifact_cache.py）を取得し、importできるようにする"""
+    for component in config.get('components', []):
+        path = os.path.join(COMPONENT_DIR, component['filename'])
+        if not os.path.exists(path):
+            fetch_component(component['url'], path)
+    if COMPONENT_DIR not in sys.path:
+        sys.path.insert(0, COMPONENT_DIR)
+
+def load_artifact_cache():
+    """
+    共通部品のArtifactCacheを返す（load_componentsの後に呼ぶ）
+    取得できない場合はNone（キャッシュを使わずにダウンロードする）
+    """
+    try:
+        return importlib.import_module('artifact_cache').ArtifactCache
+    except ImportError:
+        print("Warning: artifact_cache.py is not available, downloading without cache")
+        return None
+
+def download(config_file, target, download_dir, cache_dir=CACHE_DIR, offline=False, cache_max_size_mb=CACHE_MAX_SIZE_MB):
     # JSONファイルの読み込み
     print("download config : " + config_file)
     with open(config_file, 'r') as f:
@@ -29,19 +130,19 @@ def download(config_file, target, download_dir):
     if not os.path.exists(download_dir):
         os.makedirs(download_dir)
 
-    for item in config.get(target, []):
-        download_url = item.get('url')
-        default_url = item.get('cache_url')
-        filename = item.get('filename')
+    # 変更のないファイルはキャッシュから取り出す（offline=Trueの場合はネットワークに接続しない）
+    offline = offline or os.environ.get('DOWNLOAD_OFFLINE') == '1'
+    load_components(config)
+    artifact_cache = load_artifact_cache() if cache_dir else None
+    cache = None
+    if artifact_cache is not None:
+        max_size = cache_max_size_mb * 1024 * 1024 if cache_max_size_mb else None
+        cache = artifact_cache(cache_dir, max_size=max_size, offline=offline)
 
-        save_path = os.path.join(download_dir, filename)
-
-        # ファイルのダウンロード
-        if not download_file(download_url, save_path):
-            print(f"Failed to download from {download_url}. Trying default URL...")
-            if not download_file(default_url, save_path):
-                print(f"Failed to download from default URL {default_url} as well.")
+    # 接続プールを共有し、MAX_WORKERS件まで並行してダウンロードする
+    session = create_session()
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        list(executor.map(lambda item: download_item(item, download_dir, session, cache), config.get(target, [])))
 
 if __name__ == "__main__":
     main()
-
@@ -37,8 +37,11 @@ def execute_pipeline(yaml_file):
     for step in pipeline['steps']:
         if step['type'] == 'download':
             merge_module = load_module_from_path("download", "file_downloader.py")
-            merge_module.download(step['download_config'], "files", step['download_dir'])
-            merge_module.download(step['download_config'], "converters", "./")
+            cache_dir = step.get('cache_dir', merge_module.CACHE_DIR)
+            offline = step.get('offline', False)
+            max_size_mb = step.get('cache_max_size_mb', merge_module.CACHE_MAX_SIZE_MB)
+            merge_module.download(step['download_config'], "files", step['download_dir'], cache_dir, offline, max_size_mb)
+            merge_module.download(step['download_config'], "converters", "./", cache_dir, offline, max_size_mb)
     
         elif step['type'] == 'merge':
             merge_module = load_module_from_path("merge", "datanorm.py")